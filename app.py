@@ -1,105 +1,125 @@
 import streamlit as st
 import requests
 import json
-import sqlite3
 import time
+import uuid
 from datetime import datetime
 from pathlib import Path
 import base64
+import functools
+import html
+
+import migrations
+import result_cache
+import storage
 
 # ----------------- Configuration -----------------
-DB_PATH = Path(__file__).parent / "memory.db"
+APP_DIR = Path(__file__).parent
+PIPELINE_IMAGE = APP_DIR / "pipeline.png"
+HERO_IMAGE = APP_DIR / "static" / "hero.webp"  # downscaled grayscale pipeline.png
 N8N_WEBHOOK_URL_PROD = "http://localhost:5678/webhook/paper-search"
 N8N_WEBHOOK_URL_TEST = "http://localhost:5678/webhook-test/paper-search"
 CURRENT_WEBHOOK = N8N_WEBHOOK_URL_PROD
+MEMORY_API_URL = "http://127.0.0.1:8000"
+SYNC_TIMEOUT = 25  # seconds to wait for n8n to log the search
+ENGINES = {
+    "n8n": "🕸️ n8n workflow (webhook)",
+    "python": "🐍 Python engine (memory API /search)",
+}
+SEARCH_MODES = {
+    "live": "🌐 Live providers",
+    "blend": "🧬 Live + stored papers",
+    "local": "💾 Stored papers only",
+}
+HISTORY_PAGE_SIZE = 20
+RESULTS_PAGE_SIZE = 20  # cards per page of a deep search
+CARD_CACHE_SIZE = 4096  # rendered card bodies kept per process (see _card_body)
 
 # ----------------- Database -----------------
-def get_conn():
-    # Adding timeout to prevent 'database is locked' errors during n8n writes
-    conn = sqlite3.connect(DB_PATH, timeout=20.0, check_same_thread=False)
-    return conn
+# All access goes through the shared WAL-mode connection pool in storage.py,
+# so reads here never block the memory API's /log_search writes.
 
-def get_latest_search_from_db(min_id=0):
-    """Fetch the most recent search log from the DB, ensuring it is newer than min_id."""
+def get_search_by_request_id(request_id):
+    """Fetch the search logged for this UI request (indexed point lookup)."""
     try:
-        conn = get_conn()
-        cur = conn.cursor()
-        cur.execute(
-            """
-            SELECT id, query, search_query, top_results, created_at
-            FROM search_history
-            WHERE id > ?
-            ORDER BY id DESC
-            LIMIT 1
-            """, (min_id,)
-        )
-        row = cur.fetchone()
-        conn.close()
-        if row:
-            return {
-                "id": row[0],
-                "query": row[1],
-                "search_query": row[2],
-                "top_results": json.loads(row[3]) if row[3] else [],
-                "created_at": row[4],
-            }
+        with storage.connection() as conn:
+            return storage.get_search(conn, request_id=request_id)
     except Exception:
-        pass
-    return None
+        return None
+
+@st.cache_resource
+def get_result_cache():
+    """Process-wide result cache policy and hit/miss counters."""
+    return result_cache.ResultCache()
 
-def get_max_id():
-    """Get the current maximum ID in the search_history table."""
+def get_cached_result(query, profile=result_cache.DEFAULT_PROFILE):
+    """Answer a repeated query from search_history, if the result cache has it under these settings."""
+    cache = get_result_cache()
     try:
-        conn = get_conn()
-        cur = conn.cursor()
-        cur.execute("SELECT MAX(id) FROM search_history")
-        row = cur.fetchone()
-        conn.close()
-        return row[0] if row and row[0] else 0
-    except:
-        return 0
+        with storage.connection() as conn:
+            search_id = cache.lookup(conn, query, profile)
+            cached = storage.get_search(conn, search_id=search_id) if search_id is not None else None
+    except Exception:
+        return None
+    if cached is not None:
+        # The LRU stamp is a write: its own short transaction, after the read
+        try:
+            with storage.transaction() as conn:
+                cache.touch(conn)
+        except Exception:
+            pass
+    return cached
 
-def init_db():
+def load_results_page(search_id, offset):
+    """One page of a logged search's ranked papers (deep searches keep them all)."""
+    with storage.connection() as conn:
+        return storage.search_results_page(conn, search_id, offset, RESULTS_PAGE_SIZE)[0]
+
+def wait_for_search_result(request_id, timeout=SYNC_TIMEOUT):
+    """Block on the memory API until the search tagged with request_id is logged."""
     try:
-        conn = get_conn()
-        cur = conn.cursor()
-        cur.execute("CREATE TABLE IF NOT EXISTS search_history (id INTEGER PRIMARY KEY AUTOINCREMENT, query TEXT, search_query TEXT, top_results TEXT, created_at TEXT)")
-        cur.execute("CREATE TABLE IF NOT EXISTS favorites (title TEXT, link TEXT UNIQUE, added_at TEXT, paper_json TEXT)")
-        
-        # Check for missing columns to handle migrations
-        cur.execute("PRAGMA table_info(favorites)")
-        cols = [c[1] for c in cur.fetchall()]
-        
-        if "added_at" not in cols:
-            cur.execute("ALTER TABLE favorites ADD COLUMN added_at TEXT")
-        if "paper_json" not in cols:
-            cur.execute("ALTER TABLE favorites ADD COLUMN paper_json TEXT")
-            
-        conn.commit()
-        conn.close()
-    except Exception as e:
-        print(f"DB Init Error: {e}")
+        resp = requests.get(
+            f"{MEMORY_API_URL}/wait_search/{request_id}",
+            params={"timeout": timeout},
+            timeout=timeout + 5,
+        )
+        if resp.status_code == 200:
+            return resp.json()
+    except requests.RequestException:
+        pass
+    return None
+
+@st.cache_resource
+def init_db():
+    """Apply pending schema migrations; cached, so it runs once per process."""
+    return migrations.ensure_schema()
 
-def get_favorites():
+def get_favorites(search=None):
+    """The collection, newest first; `search` filters it through the papers full-text index."""
+    match = storage.fts_query(search)
+    where = "WHERE f.paper_id IN (SELECT rowid FROM papers_fts WHERE papers_fts MATCH ?)" if match else ""
     try:
-        conn = get_conn()
-        cur = conn.cursor()
-        cur.execute("SELECT title, link, added_at, paper_json FROM favorites ORDER BY added_at DESC")
-        rows = cur.fetchall()
-        conn.close()
+        with storage.connection() as conn:
+            rows = conn.execute(f"""
+                SELECT f.title, f.link, f.added_at, p.paper_key, {", ".join("p." + c for c in storage.PAPER_COLUMNS)}
+                FROM favorites f
+                LEFT JOIN papers p ON p.id = f.paper_id
+                {where}
+                ORDER BY f.added_at DESC
+            """, (match,) if match else ()).fetchall()
         
         favs = []
         for r in rows:
-            # If we have paper_json, use it; otherwise construct from title/link
-            if len(r) > 3 and r[3]:
-                try:
-                    paper = json.loads(r[3])
-                except:
-                    paper = {"title": r[0], "link": r[1]}
+            # Joined paper record if we have one; otherwise construct from title/link
+            if r[3] is not None:
+                paper = storage.paper_from_row(r[4:])
             else:
                 paper = {"title": r[0], "link": r[1]}
             
+            # Removal is keyed on the favorites row link
+            paper["link"] = r[1]
             paper["added_at"] = r[2]
+            paper["paper_key"] = r[3]
             favs.append(paper)
         return favs
     except Exception as e:
@@ -116,12 +136,11 @@ def add_to_favorites(paper_data):
         link = f"#{int(time.time())}_{title[:20]}"
 
     try:
-        conn = get_conn()
-        cur = conn.cursor()
-        cur.execute("INSERT OR IGNORE INTO favorites (title, link, added_at, paper_json) VALUES (?, ?, ?, ?)", 
-                    (title, link, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), json.dumps(paper_data)))
-        conn.commit()
-        conn.close()
+        with storage.transaction() as conn:
+            paper_id = storage.upsert_paper(conn, paper_data)
+            conn.execute("INSERT OR IGNORE INTO favorites (title, link, added_at, paper_id) VALUES (?, ?, ?, ?)", 
+                         (title, link, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), paper_id))
+        get_collection_keys().add(storage.paper_key(paper_data))
         return True
     except Exception as e:
         st.error(f"Database Error: {e}")
@@ -129,25 +148,69 @@ def add_to_favorites(paper_data):
 
 def remove_from_favorites(link):
     try:
-        conn = get_conn()
-        cur = conn.cursor()
-        cur.execute("DELETE FROM favorites WHERE link = ?", (link,))
-        conn.commit()
-        conn.close()
+        with storage.transaction() as conn:
+            row = conn.execute(
+                "SELECT p.paper_key FROM favorites f JOIN papers p ON p.id = f.paper_id WHERE f.link = ?", (link,)
+            ).fetchone()
+            conn.execute("DELETE FROM favorites WHERE link = ?", (link,))
+        if row:
+            get_collection_keys().discard(row[0])
     except:
         pass
 
-def get_history(limit=50):
+def get_collection_keys():
+    """Paper keys in the collection, loaded once per session and then updated in place."""
+    if 'collection_keys' not in st.session_state:
+        try:
+            with storage.connection() as conn:
+                rows = conn.execute("SELECT p.paper_key FROM favorites f JOIN papers p ON p.id = f.paper_id").fetchall()
+        except Exception:
+            rows = []
+        st.session_state['collection_keys'] = {r[0] for r in rows}
+    return st.session_state['collection_keys']
+
+def get_history_page(before_id=None):
+    """One keyset page of history headers (no results) plus the cursor for the next page."""
+    try:
+        with storage.connection() as conn:
+            return storage.history_page(conn, before_id, HISTORY_PAGE_SIZE)
+    except:
+        return [], None
+
+def search_history_entries(text):
     try:
-        conn = get_conn()
-        cur = conn.cursor()
-        cur.execute("SELECT query, search_query, created_at FROM search_history ORDER BY id DESC LIMIT ?", (limit,))
-        rows = cur.fetchall()
-        conn.close()
-        return [{"query": r[0], "search_query": r[1], "created_at": r[2]} for r in rows]
+        with storage.connection() as conn:
+            return storage.search_history(conn, text)
     except:
         return []
 
+def get_saved_results(search_id):
+    try:
+        with storage.connection() as conn:
+            return storage.load_search_results(conn, [search_id])[search_id]
+    except:
+        return []
+
+# ----------------- Static Assets -----------------
+@st.cache_resource
+def hero_image_html():
+    """<img> tag for the hero overlay, built once per process.
+
+    Prefers the small WebP from Streamlit's static file server, which the
+    browser caches; otherwise inlines it (or pipeline.png) as a data URI.
+    """
+    if HERO_IMAGE.exists() and st.get_option("server.enableStaticServing"):
+        return f'<img src="app/static/{HERO_IMAGE.name}" class="hero-bg-img" />'
+    for path, mime in ((HERO_IMAGE, "image/webp"), (PIPELINE_IMAGE, "image/png")):
+        if path.exists():
+            b64_img = base64.b64encode(path.read_bytes()).decode()
+            return f'<img src="data:{mime};base64,{b64_img}" class="hero-bg-img" />'
+    return ""  # Fallback if image missing
+
+@st.cache_resource
+def load_asset(path):
+    return Path(path).read_bytes()
+
 # ----------------- UI & CSS -----------------
 st.set_page_config(page_title="Paper Search Agent", page_icon="🔬", layout="wide")
 
@@ -329,6 +392,18 @@ st.markdown("""
         gap: 8px;
     }
     
+    /* One grid per page of cards (render_card_grid) */
+    .card-grid {
+        display: grid;
+        grid-template-columns: repeat(2, minmax(0, 1fr));
+        gap: 24px;
+        margin-bottom: 1.5rem;
+    }
+
+    @media (max-width: 900px) {
+        .card-grid { grid-template-columns: minmax(0, 1fr); }
+    }
+    
     /* --- Hide Streamlit Chrome --- */
     #MainMenu {visibility: hidden;}
     footer {visibility: hidden;}
@@ -342,8 +417,11 @@ st.markdown("""
 def main():
     global CURRENT_WEBHOOK
     
-    # Initialize DB tables
-    init_db()
+    # Initialize DB tables (first run in this process only)
+    try:
+        init_db()
+    except Exception as e:
+        st.error(f"DB Init Error: {e}")
 
     
     # Main Tab Navigation
@@ -370,15 +448,8 @@ def main():
 
     # --- TAB 1: SEARCH ---
     with tab_search:
-        # Load Pipeline Image for Background
-        try:
-            import base64
-            with open("pipeline.png", "rb") as f:
-                img_data = f.read()
-            b64_img = base64.b64encode(img_data).decode()
-            bg_image_html = f'<img src="data:image/png;base64,{b64_img}" class="hero-bg-img" />'
-        except:
-            bg_image_html = "" # Fallback if image missing
+        # Pipeline Image for Background (cached, not re-encoded per rerun)
+        bg_image_html = hero_image_html()
 
         # Hero Section with Background Overlay
         st.markdown(f"""
@@ -421,6 +492,7 @@ def main():
                 st.session_state['auto_run_search'] = True
 
             run_search = st.button("🔎 Search Papers", type="primary", width="stretch")
+            force_refresh = st.checkbox("🔄 Force refresh", key="force_refresh", help="Skip the local result cache and re-run the full pipeline")
             
         # Execute search
         should_search = False
@@ -434,7 +506,7 @@ def main():
         if should_search:
             # IMMEDIATELY clear results from view so user doesn't see old data
             st.session_state['active_results'] = None
-            res = handle_search(query_input)
+            res = handle_search(query_input, force_refresh=force_refresh)
             if res:
                 st.session_state['active_results'] = res
             st.rerun()
@@ -444,6 +516,11 @@ def main():
             res = st.session_state['active_results']
             st.divider()
             st.markdown(f"### 🎯 Results for: *{res['query']}*")
+            if res.get('from_cache'):
+                st.caption(f"⚡ From local cache — originally searched {res['created_at']}. Tick **Force refresh** to re-run the pipeline.")
+            if res.get('partial'):
+                late = [f"{n} ({i['status']})" for n, i in res['sources'].items() if n not in ("ollama", "enrichment", "embeddings") and i.get('status') != "ok"]
+                st.caption(f"⏱️ Partial results — missing {', '.join(late)}.")
             
             display_structured_results(res, res['query'])
             
@@ -494,7 +571,37 @@ def main():
 
     with tab_settings:
         st.header("⚙️ Engine & Config")
-        st.image("pipeline.png", caption="System Architecture Pipeline Analysis")
+        st.image(load_asset(PIPELINE_IMAGE), caption="System Architecture Pipeline Analysis")
+        st.radio(
+            "Search engine",
+            list(ENGINES),
+            format_func=ENGINES.get,
+            key="engine_mode",
+            horizontal=True,
+            help="The Python engine runs the same stages as the n8n workflow inside the memory API.",
+        )
+        if st.session_state.get("engine_mode") == "python":
+            st.radio(
+                "Results from",
+                list(SEARCH_MODES),
+                format_func=SEARCH_MODES.get,
+                key="search_mode",
+                horizontal=True,
+                help="Stored papers are every paper ever logged to memory.db, ranked with BM25F. "
+                     "\"Stored papers only\" answers instantly without calling any provider.",
+            )
+            st.checkbox(
+                "🧭 Semantic re-rank",
+                key="semantic_rerank",
+                help="Also rank by meaning, with a local Ollama embedding model (OLLAMA_EMBED_MODEL), "
+                     "so papers that use different words for the same idea are found too.",
+            )
+            st.checkbox(
+                "🔭 Deep search",
+                key="deep_search",
+                help="Page through every provider until it runs dry or its new pages stop improving the "
+                     "ranking (DEEP_CANDIDATES per provider). Slower; all ranked papers are kept and paged.",
+            )
         st.markdown("Configure which n8n backend this app talks to.")
 
         # Load current value into session
@@ -521,71 +628,139 @@ def main():
                 CURRENT_WEBHOOK = N8N_WEBHOOK_URL_PROD
                 st.info("Reset to default production webhook.")
 
-def render_paper_card(result):
-    """Renders a Bold, Graphical Grid Card."""
-    title = result.get('title', 'Untitled Result')
+        st.markdown("---")
+        st.subheader("⚡ Result Cache")
+        st.markdown("Repeated queries are answered from `memory.db` instead of re-running the n8n pipeline.")
+        cache = get_result_cache()
+        stats = cache.stats()
+        m1, m2, m3 = st.columns(3)
+        m1.metric("Hits", stats["hits"])
+        m2.metric("Misses", stats["misses"])
+        m3.metric("Hit rate", f"{stats['hit_rate']:.0%}")
+
+        ttl_minutes = st.number_input(
+            "Cache TTL (minutes)",
+            min_value=0,
+            value=int(cache.ttl // 60),
+            step=30,
+            help="Results older than this are re-fetched. 0 disables the cache.",
+        )
+        cache.ttl = ttl_minutes * 60
+
+        if st.button("🧹 Clear Result Cache"):
+            with storage.transaction() as conn:
+                cache.clear(conn)
+            st.success("Result cache cleared.")
+
+def render_paper_card(result, number=None, badge="", footer=""):
+    """Renders a Bold, Graphical Grid Card (HTML) around the memoized body from _card_body."""
     link = result.get('link', '#')
-    source = result.get('source', 'WEB').upper().replace('_', ' ')
-    year = result.get('year', 'N/A')
-    cited = result.get('cited_by', '0')
-    snippet = result.get('snippet', 'No detailed abstract available for this paper.')
-    
+    # Merged near-duplicates (engine dedup) keep every provider's link
+    others = tuple(
+        (l.get('link'), str(l.get('source') or 'web')) for l in result.get('links') or [] if l.get('link') != link
+    )
+    # Semantic re-rank (engine) adds the embedding similarity to the query
+    similarity = result.get('similarity')
+    head, tail = _card_body(
+        str(result.get('title', 'Untitled Result')), str(link), str(result.get('source', 'WEB')),
+        str(result.get('year', 'N/A')), str(result.get('cited_by', '0')),
+        str(result.get('snippet', 'No detailed abstract available for this paper.')), others,
+        similarity if isinstance(similarity, (int, float)) else None,
+    )
+    # Position, collection state and footer change between pages and clicks; the paper's own HTML does not
+    return "".join((
+        '<div class="paper-card"><div class="card-type">',
+        f"#{number} · " if number is not None else "",
+        head,
+        f'<div class="metric-pill">{badge}</div>' if badge else "",
+        tail,
+        f'<div style="font-size: 0.8rem; color: #94A3B8; margin-top: 10px;">{footer}</div>' if footer else "",
+        '</div>',
+    ))
+
+@functools.lru_cache(maxsize=CARD_CACHE_SIZE)
+def _card_body(title, link, source, year, cited, snippet, others, similarity):
+    """A card's HTML up to its metric pills and after them, keyed by everything the paper shows.
+
+    A paper seen again (rerun, next search, history, collection) is not rebuilt.
+    """
+    # Provider text goes into one HTML block: a blank line would end Markdown's
+    # HTML passthrough and a stray tag would break the rest of the grid
+    def text(value):
+        return html.escape(" ".join(value.split()))
+
+    title, year, cited = text(title), text(year), text(cited)
+    snippet = text(snippet[:200])
+    link = html.escape(link, quote=True)
+    source = text(source.upper().replace('_', ' '))
+
     # Graphic Icon based on source
     icon = "📄"
     if "arxiv" in source.lower(): icon = "⚛️"
     elif "scholar" in source.lower(): icon = "🎓"
-    
-    # COMPACT HTML to avoid Markdown code-block interpretation
-    return f"""
-    <div class="paper-card">
-        <div class="card-type">{icon} {source}</div>
-        <a href="{link}" target="_blank" class="card-title">{title}</a>
-        <div class="metrics-row">
-            <div class="metric-pill">📅 {year}</div>
-            <div class="metric-pill">💬 {cited} Citations</div>
-        </div>
-        <div style="font-size: 0.9rem; color: #64748B; line-height: 1.5; flex-grow: 1;">
-            {snippet[:200]}...
-        </div>
-        <a href="{link}" target="_blank" style="display: block; margin-top: 16px; text-align: center; background: #EFF6FF; color: #2563EB; padding: 8px; border-radius: 8px; text-decoration: none; font-weight: 600; font-size: 0.9rem;">
-            Read Full Paper →
-        </a>
-    </div>
-    """.replace('\n', '').replace('    ', '')
 
+    also_on = ""
+    if others:
+        anchors = " · ".join(
+            f'<a href="{html.escape(str(href), quote=True)}" target="_blank">{text(name.replace("_", " ").title())}</a>'
+            for href, name in others
+        )
+        also_on = f'<div style="font-size: 0.8rem; color: #64748B; margin-bottom: 8px;">🔗 Also on: {anchors}</div>'
+
+    pills = f'<div class="metric-pill">📅 {year}</div><div class="metric-pill">💬 {cited} Citations</div>'
+    if similarity is not None:
+        pills += f'<div class="metric-pill">🧭 {max(similarity, 0):.0%} match</div>'
+
+    # One line: a newline or indentation inside the block would end Markdown's HTML passthrough
+    head = (
+        f'{icon} {source}</div>'
+        f'<a href="{link}" target="_blank" class="card-title">{title}</a>'
+        f'<div class="metrics-row">{pills}'
+    )
+    tail = (
+        f'</div>{also_on}'
+        f'<div style="font-size: 0.9rem; color: #64748B; line-height: 1.5; flex-grow: 1;">{snippet}...</div>'
+        f'<a href="{link}" target="_blank" style="display: block; margin-top: 16px; text-align: center; '
+        f'background: #EFF6FF; color: #2563EB; padding: 8px; border-radius: 8px; text-decoration: none; '
+        f'font-weight: 600; font-size: 0.9rem;">Read Full Paper →</a>'
+    )
+    return head, tail
 
-def handle_search(query):
-    # --- GET PRE-SEARCH ANCHOR ---
-    # We find the current max ID in the DB so we only look for IDs > this one.
-    # This is the ONLY way to guarantee we don't pick up old cached results.
+def handle_search(query, force_refresh=False):
     if not query or query.strip() == "[object Object]" or query.strip().lower() == "object":
         st.error("Blocked corrupted query metadata. Please type a fresh search.")
         return
-    anchor_id = None
-    try:
-        conn = get_conn()
-        cur = conn.cursor()
-        cur.execute("SELECT MAX(id) FROM search_history")
-        row = cur.fetchone()
-        anchor_id = row[0] if (row and row[0] is not None) else 0
-        conn.close()
-    except Exception as e:
-        st.error(f"❌ Database Access Error: {e}. Please ensure memory_api.py is not locking the file.")
-        return 
 
-    if anchor_id is None:
-        anchor_id = 0
+    python_engine = st.session_state.get("engine_mode") == "python"
+    deep = python_engine and st.session_state.get("deep_search", False)
+
+    # Repeated queries are answered from memory.db without invoking n8n
+    # (a deep search asks for more than any cached answer holds)
+    if not force_refresh and not deep:
+        cached = get_cached_result(query, result_cache.profile(
+            st.session_state.get("engine_mode"),
+            st.session_state.get("search_mode", "live"),
+            st.session_state.get("semantic_rerank", False),
+        ))
+        if cached:
+            cached["from_cache"] = True
+            st.toast(f"⚡ Served from local cache (search #{cached['id']})")
+            return cached
         
     st.markdown(f"### 🔎 Analyzing: *{query}*")
     search_start_time = datetime.utcnow().isoformat()
+
+    if python_engine:
+        return run_python_engine(query)
     
     with st.status("🚀 Launching Agents...", expanded=True) as status:
         st.write("📡 Connecting to Neural Backend...")
         try:
             target_url = st.session_state.get("engine_url", CURRENT_WEBHOOK)
+            request_id = f"req_{uuid.uuid4().hex}"
             payload = {
                 "query": query,
-                "request_id": f"req_{int(time.time())}",
+                "request_id": request_id,
                 "timestamp": search_start_time
             }
             response = requests.post(target_url, json=payload, timeout=90)
@@ -597,41 +772,12 @@ def handle_search(query):
             if response.status_code == 200:
                 st.write(f"✅ Search complete. Analyzing results...")
                 
-                # Poll DB for the specific record created after anchor_id
-                found_result = None
-                polling_place = st.empty() # Placeholder for status updates
-                
+                # The memory API pushes the record to us as soon as /log_search commits it
                 with st.spinner("⏳ Wait! Syncing search results..."):
-                    for i in range(25):  # up to ~25s
-                        time.sleep(1)
-                        try:
-                            conn = get_conn()
-                            cur = conn.cursor()
-                            cur.execute("""
-                                SELECT id, query, search_query, top_results, created_at
-                                FROM search_history
-                                WHERE id > ?
-                                ORDER BY id ASC
-                                LIMIT 1
-                            """, (anchor_id,))
-                            row = cur.fetchone()
-                            conn.close()
-
-                            if row:
-                                papers_data = json.loads(row[3]) if row[3] else []
-                                found_result = {
-                                    "id": row[0],
-                                    "query": row[1],
-                                    "search_query": row[2],
-                                    "top_results": papers_data,
-                                    "created_at": row[4],
-                                }
-                                break
-                            else:
-                                if i % 5 == 0:
-                                    polling_place.info(f"⏳ Polling DB (attempt {i+1}/25) — no new rows > {anchor_id} yet")
-                        except Exception as e:
-                            polling_place.write(f"⚠️ DB poll error: {e}")
+                    found_result = wait_for_search_result(request_id)
+                    if found_result is None:
+                        # Memory API unreachable: look our own row up directly
+                        found_result = get_search_by_request_id(request_id)
                 
                 if found_result:
                     status.update(label=f"Insight Generated (ID: {found_result['id']})", state="complete", expanded=False)
@@ -647,7 +793,67 @@ def handle_search(query):
             st.error(f"Search Interrupted: {str(e)}")
             return None
 
-def display_structured_results(data, query):
+def run_python_engine(query):
+    """Search through the Python engine, drawing cards as each provider answers.
+
+    Reads the NDJSON event stream of the memory API's /search/stream and
+    re-renders the re-ranked preview after every provider; the final
+    interactive grid is drawn from the returned record.
+    """
+    with st.status("🐍 Running Python engine...", expanded=True) as status:
+        preview = st.empty()
+        try:
+            with requests.post(
+                f"{MEMORY_API_URL}/search/stream",
+                json={
+                    "query": query,
+                    "request_id": f"req_{uuid.uuid4().hex}",
+                    "mode": st.session_state.get("search_mode", "live"),
+                    "semantic": st.session_state.get("semantic_rerank", False),
+                    "deep": st.session_state.get("deep_search", False),
+                },
+                timeout=90,
+                stream=True,
+            ) as response:
+                if response.status_code != 200:
+                    st.error(f"Engine error {response.status_code}: {response.text[:200]}")
+                    return None
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    event = json.loads(line)
+                    if event["event"] == "keywords":
+                        status.update(label=f"🐍 Searching for: {event['search_query']}")
+                    elif event["event"] == "source":
+                        name, info = event["source"], event["report"]
+                        if "page" in event and not info.get("stopped"):
+                            # A deep search page; the provider's last report gets its own line
+                            status.update(label=f"🔭 {name}: page {event['page']}, {info['count']} papers")
+                        elif info["status"] == "late":
+                            st.write(f"⏱️ {name}: {info['error']}")
+                        elif info.get("error"):
+                            st.write(f"⚠️ {name}: {info['error'][:120]}")
+                        elif "pages" in info:
+                            st.write(f"✅ {name}: {info['count']} papers in {info['pages']} pages, "
+                                     f"{info['ms']:.0f} ms ({info['stopped']})")
+                        else:
+                            st.write(f"✅ {name}: {info['count']} papers in {info['ms']:.0f} ms")
+                        with preview.container():
+                            display_structured_results({"top_results": event["papers"]}, query, preview=True)
+                    elif event["event"] == "error":
+                        st.error(f"Engine error {event.get('status', '')}: {str(event.get('error'))[:200]}")
+                        return None
+                    elif event["event"] == "done":
+                        preview.empty()
+                        status.update(label=f"Insight Generated (ID: {event['id']})", state="complete", expanded=False)
+                        return event
+            st.error("Engine stream ended before the search finished.")
+            return None
+        except Exception as e:
+            st.error(f"Search Interrupted: {str(e)}")
+            return None
+
+def display_structured_results(data, query, preview=False):
     results = data.get("top_results", [])
     if not results:
         st.warning("No results found.")
@@ -662,80 +868,112 @@ def display_structured_results(data, query):
         year_txt = m.group(0) if m else "that year"
         st.warning(f"No papers found exactly for {year_txt}. Showing closest matches instead.")
     
-    # GRID LAYOUT for cards
-    # We will create rows of 2 columns
-    for i in range(0, len(results), 2):
-        col1, col2 = st.columns(2)
-        
-        # Card 1
-        with col1:
-            st.markdown(render_paper_card(results[i]), unsafe_allow_html=True)
-            if st.button("⭐ Add to Collection", key=f"add_fav_{i}"):
-                if add_to_favorites(results[i]):
-                    st.toast(f"Saved to Collection!")
-                    time.sleep(0.5)
-                    st.rerun()
-            
-        # Card 2 (if exists)
-        if i + 1 < len(results):
-            with col2:
-                st.markdown(render_paper_card(results[i+1]), unsafe_allow_html=True)
-                if st.button("⭐ Add to Collection", key=f"add_fav_{i+1}"):
-                    if add_to_favorites(results[i+1]):
-                        st.toast(f"Saved to Collection!")
-                        time.sleep(0.5)
-                        st.rerun()
+    # Deep searches log every ranked paper; page through them from memory.db
+    total = data.get("total") or len(results)
+    key, offset = "add_fav", 0
+    if total > RESULTS_PAGE_SIZE and data.get("id") is not None:
+        pages = -(-total // RESULTS_PAGE_SIZE)
+        page = st.number_input(
+            f"Page (of {pages}, {total} papers)", min_value=1, max_value=pages, key=f"results_page_{data['id']}"
+        )
+        offset = (page - 1) * RESULTS_PAGE_SIZE
+        results = load_results_page(data["id"], offset)
+        key = f"add_fav_{offset}"
+
+    # GRID LAYOUT for cards: one markdown call per page; results still
+    # streaming in get no action control
+    if preview:
+        card_grid(results)
+    else:
+        render_card_grid(results, key, start=offset)
+
+def save_to_collection(paper):
+    if add_to_favorites(paper):
+        st.toast("Saved to Collection!")
+
+def card_grid(papers, start=0, badges=None, footers=None):
+    """A page of cards as one grid, sent in a single st.markdown call; cards are numbered from start + 1."""
+    cards = "".join(
+        render_paper_card(p, start + i + 1, badges[i] if badges else "", footers[i] if footers else "")
+        for i, p in enumerate(papers)
+    )
+    st.markdown(f'<div class="card-grid">{cards}</div>', unsafe_allow_html=True)
+
+def _card_action(key, action, papers):
+    """on_change of a grid's action control: apply `action` to the picked card, then clear the pick."""
+    picked = st.session_state.get(key)
+    st.session_state[key] = None
+    if picked is None:
+        return
+    paper = papers[picked]
+    collection = get_collection_keys()
+    if action == "save" and storage.paper_key(paper) not in collection:
+        save_to_collection(paper)
+    elif action == "remove" and paper.get("paper_key") in collection:
+        remove_from_favorites(paper['link'])
+        st.toast("Removed from Collection")
+
+# The action control acts through an on_click-style callback: it runs
+# before the fragment re-executes, so the grid redraws with the new state
+# in that same pass.
+@st.fragment
+def render_card_grid(papers, key, action="save", start=0):
+    """A page of cards plus one delegated action control, re-rendered on its own.
+
+    `action` "save" adds the picked paper to the collection, "remove"
+    takes it out (collection page); either way the cards show the result
+    as a badge.
+    """
+    collection = get_collection_keys()
+    if action == "remove":
+        done = [p.get("paper_key") not in collection for p in papers]
+        badges = ["🗑️ Removed" if d else "" for d in done]
+        footers = [f"Added on: {p.get('added_at', 'N/A')}" for p in papers]
+        label, marker = "🗑️ Remove a paper from your collection", "🗑️"
+    else:
+        done = [storage.paper_key(p) in collection for p in papers]
+        badges = ["✅ In Collection" if d else "" for d in done]
+        footers = None
+        label, marker = "⭐ Add a paper to your collection", "✅"
+    card_grid(papers, start, badges, footers)
+    st.selectbox(
+        label, range(len(papers)), index=None, key=key, placeholder=f"{label}…", label_visibility="collapsed",
+        format_func=lambda i: f"{marker if done[i] else ''} #{start + i + 1} {papers[i].get('title', 'Untitled Paper')}".strip(),
+        on_change=_card_action, args=(key, action, papers),
+    )
 
+@st.fragment
 def render_favorites_page():
     st.markdown("### ⭐ Your Research Collection")
-    favs = get_favorites()
-    if not favs:
+    search_text = st.text_input("Search collection", placeholder="🔎 Search titles and abstracts in your collection", label_visibility="collapsed", key="collection_search")
+    favs = get_favorites(search_text)
+    if not favs and search_text:
+        st.info("No papers in your collection match that search.")
+    elif not favs:
         st.info("No favorites yet. Start searching and click the ⭐ to add papers!")
     else:
         st.write(f"You have **{len(favs)}** papers in your collection.")
         # Render favorites in a grid, same as search results
-        for i in range(0, len(favs), 2):
-            col1, col2 = st.columns(2)
-            
-            with col1:
-                st.markdown(render_paper_card(favs[i]), unsafe_allow_html=True)
-                st.caption(f"Added on: {favs[i].get('added_at', 'N/A')}")
-                if st.button("🗑️ Remove", key=f"del_fav_{i}", help="Remove from collection", width="stretch"):
-                    remove_from_favorites(favs[i]['link'])
-                    st.rerun()
-            
-            if i + 1 < len(favs):
-                with col2:
-                    st.markdown(render_paper_card(favs[i+1]), unsafe_allow_html=True)
-                    st.caption(f"Added on: {favs[i+1].get('added_at', 'N/A')}")
-                    if st.button("🗑️ Remove", key=f"del_fav_{i+1}", help="Remove from collection", width="stretch"):
-                        remove_from_favorites(favs[i+1]['link'])
-                        st.rerun()
-            st.divider()
+        render_card_grid(favs, "del_fav", action="remove")
 
 # --- History Logic ---
 def delete_history_item(history_id):
     try:
-        conn = get_conn()
-        cur = conn.cursor()
-        cur.execute("DELETE FROM search_history WHERE id = ?", (history_id,))
-        conn.commit()
-        conn.close()
+        with storage.transaction() as conn:
+            conn.execute("DELETE FROM search_history WHERE id = ?", (history_id,))
         return True
     except:
         return False
 
 def clear_all_history():
     try:
-        conn = get_conn()
-        cur = conn.cursor()
-        cur.execute("DELETE FROM search_history")
-        conn.commit()
-        conn.close()
+        with storage.transaction() as conn:
+            conn.execute("DELETE FROM search_history")
         return True
     except:
         return False
 
+@st.fragment
 def render_history_page():
     st.markdown("### 📜 Research Log")
     
@@ -746,40 +984,39 @@ def render_history_page():
     with col2:
         if st.button("🧹 Clean Corrupted", help="Remove entries with invalid data"):
             try:
-                conn = get_conn()
-                cur = conn.cursor()
-                cur.execute("""
-                    DELETE FROM search_history 
-                    WHERE query LIKE '%object%' 
-                    OR search_query LIKE '%object%'
-                    OR LENGTH(search_query) < 3
-                """)
-                deleted = cur.rowcount
-                conn.commit()
-                conn.close()
+                with storage.transaction() as conn:
+                    deleted = conn.execute("""
+                        DELETE FROM search_history 
+                        WHERE query LIKE '%object%' 
+                        OR search_query LIKE '%object%'
+                        OR LENGTH(search_query) < 3
+                    """).rowcount
+                st.session_state['history_cursors'] = [None]
                 st.success(f"✅ Cleaned {deleted} corrupted entries")
-                st.rerun()
             except Exception as e:
                 st.error(f"Cleanup failed: {e}")
     with col3:
         if st.button("🗑️ Clear All", type="secondary"):
             if clear_all_history():
+                st.session_state['history_cursors'] = [None]
                 st.success("History cleared.")
-                st.rerun()
 
-    # Get FULL history with IDs
-    try:
-        conn = get_conn()
-        cur = conn.cursor()
-        cur.execute("SELECT id, query, search_query, top_results, created_at FROM search_history ORDER BY id DESC")
-        rows = cur.fetchall()
-        conn.close()
-        hist = [{"id": r[0], "query": r[1], "search_query": r[2], "top_results": r[3], "created_at": r[4]} for r in rows]
-    except:
-        hist = []
+    search_text = st.text_input("Search history", placeholder="🔎 Search past queries, keywords and paper titles", label_visibility="collapsed", key="history_search")
+
+    # Keyset pagination: we keep the cursor of every page visited so far
+    cursors = st.session_state.setdefault('history_cursors', [None])
+    if search_text:
+        hist, next_cursor = search_history_entries(search_text), None
+    else:
+        hist, next_cursor = get_history_page(cursors[-1])
+
+        if not hist and len(cursors) > 1:
+            # Page emptied by deletions: start over from the newest entries
+            cursors[:] = [None]
+            hist, next_cursor = get_history_page(None)
 
     if not hist:
-        st.info("No search history found.")
+        st.info("No matching searches found." if search_text else "No search history found.")
         return
 
     for h in hist:
@@ -804,15 +1041,17 @@ def render_history_page():
         display_query = raw_q if raw_q else "⚠️ Corrupted Search Entry (Bad Metadata)"
         clean_keywords = raw_k if raw_k else "❌ CORRUPTED TOKENS"
         
-        # Parse Results
-        try:
-            saved_results = json.loads(h.get('top_results', '[]')) if isinstance(h.get('top_results'), str) else h.get('top_results', [])
-        except:
-            saved_results = []
-        
-        result_count = len(saved_results)
-        
-        with st.expander(f"📅 {h['created_at']} — {display_query} ({result_count} results)", expanded=False):
+        expander = st.expander(
+            f"📅 {h['created_at']} — {display_query} ({h['result_count']} results)",
+            expanded=False,
+            key=f"hist_exp_{h['id']}",
+            on_change="rerun",
+        )
+        with expander:
+            # Lazy body: nothing below is built or queried while collapsed
+            if not expander.open:
+                continue
+
             if is_corrupted:
                 st.error("🚨 **System Alert**: This entry contains dead metadata ('object Object'). This usually happens when the n8n backend is outdated or misconfigured.")
                 st.info("💡 **Fix**: Use the **☢️ Nuclear Reset** button in the sidebar to wipe this corrupted history.")
@@ -829,9 +1068,7 @@ def render_history_page():
                 else:
                     st.button("🔄 Rerun Search", key=f"rerun_{h['id']}", disabled=True)
             with c2:
-                if st.button("🗑️ Delete Log", key=f"del_{h['id']}"):
-                    delete_history_item(h['id'])
-                    st.rerun()
+                st.button("🗑️ Delete Log", key=f"del_{h['id']}", on_click=delete_history_item, args=(h['id'],))
             
             st.divider()
             
@@ -851,25 +1088,24 @@ def render_history_page():
                  st.markdown(f"**🗣️ Original Input:** *{raw_q}*")
             
             # Show the saved results
+            saved_results = get_saved_results(h['id'])
             if saved_results:
                 st.markdown("### 📄 Paper Collection Snapshot:")
-                for i in range(0, len(saved_results), 2):
-                    col1, col2 = st.columns(2)
-                    with col1:
-                        st.markdown(render_paper_card(saved_results[i]), unsafe_allow_html=True)
-                        if st.button("⭐ Save", key=f"hist_fav_{h['id']}_{i}"):
-                            if add_to_favorites(saved_results[i]):
-                                st.toast("Saved to Collection!")
-                                time.sleep(0.5)
-                                st.rerun()
-                    if i + 1 < len(saved_results):
-                        with col2:
-                            st.markdown(render_paper_card(saved_results[i+1]), unsafe_allow_html=True)
-                            if st.button("⭐ Save", key=f"hist_fav_{h['id']}_{i+1}"):
-                                add_to_favorites(saved_results[i+1].get('title'), saved_results[i+1].get('link'))
-                                st.toast("Saved to Collection!")
+                render_card_grid(saved_results, f"hist_fav_{h['id']}")
             else:
                 st.info("No papers were indexed for this specific session.")
 
+    # Page navigation
+    if search_text:
+        return
+    nav1, nav2, nav3 = st.columns([1, 4, 1])
+    with nav1:
+        st.button("⬅️ Newer", key="hist_newer", disabled=len(cursors) == 1, on_click=cursors.pop)
+    with nav2:
+        st.caption(f"Page {len(cursors)}")
+    with nav3:
+        st.button("Older ➡️", key="hist_older", disabled=next_cursor is None,
+                  on_click=cursors.append, args=(next_cursor,))
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
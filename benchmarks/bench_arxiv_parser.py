@@ -0,0 +1,118 @@
+"""arXiv Atom parsing: streaming parser vs the n8n node's regex approach.
+
+    python benchmarks/bench_arxiv_parser.py [--repeat 20] [--feed recorded.xml ...]
+
+Runs both parsers on 40-, 200- and 1000-entry feeds (synthetic, laid out
+like export.arxiv.org responses) plus any recorded feeds passed with
+--feed. Reports time per feed, peak traced memory while parsing, and
+whether both agree on the fields the node produced. The streaming parser
+is fed in 16 KB chunks, as it is when reading a live response, so its
+working set is one chunk plus one entry whatever the feed size.
+"""
+import argparse
+import re
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import fake_providers  # noqa: E402
+import sources  # noqa: E402
+
+CHUNK = 16 * 1024
+NODE_FIELDS = ("title", "authors_venue_year", "year", "snippet", "link", "date")
+
+
+def regex_parse(xml):
+    """Line-for-line port of the "Parse ArXiv XML" node (the baseline)."""
+    papers = []
+    for m in re.finditer(r"<entry>([\s\S]*?)</entry>", xml):
+        e = m.group(1)
+
+        def get_tag(tag):
+            mm = re.search(rf"<{tag}>([\s\S]*?)</{tag}>", e)
+            return re.sub(r"\s+", " ", mm.group(1)).strip() if mm else ""
+
+        title, summary, published, id_ = get_tag("title"), get_tag("summary"), get_tag("published"), get_tag("id")
+        authors = ", ".join(a.strip() for a in re.findall(r"<author>[\s\S]*?<name>(.*?)</name>[\s\S]*?</author>", e))
+        date = published.split("T")[0] if published else "Unknown date"
+        papers.append({
+            "source": "arxiv",
+            "title": title or "No title",
+            "authors_venue_year": authors or "Unknown authors",
+            "year": date[:4] if date != "Unknown date" else "",
+            "cited_by": None,
+            "snippet": (summary[:240] + "..." if len(summary) > 240 else summary) if summary else "No abstract",
+            "link": id_ or "No link",
+            "date": date,
+        })
+    return papers
+
+
+def stream_parse(data):
+    parser = sources.ArxivFeedParser()
+    papers = []
+    for i in range(0, len(data), CHUNK):
+        papers.extend(parser.feed(data[i:i + CHUNK]))
+    return papers + parser.close()
+
+
+def stream_count(data):
+    """Consume the feed without keeping the papers: the parser's own working set."""
+    parser = sources.ArxivFeedParser()
+    count = 0
+    for i in range(0, len(data), CHUNK):
+        count += len(parser.feed(data[i:i + CHUNK]))
+    return count + len(parser.close())
+
+
+def timed(fn, arg, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(arg)
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def peak_kb(fn, arg):
+    tracemalloc.start()
+    fn(arg)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--feed", action="append", default=[], help="recorded arXiv response to include")
+    args = parser.parse_args()
+
+    feeds = [(f"{n} entries", fake_providers.arxiv_feed(fake_providers.synthetic_papers("graph neural networks", n)))
+             for n in (40, 200, 1000)]
+    feeds += [(Path(f).name, Path(f).read_text(encoding="utf-8")) for f in args.feed]
+
+    print(f"{'feed':<16}{'size':>9}  {'regex ms':>9}{'stream ms':>10}{'speedup':>8}  {'regex KB':>9}{'stream KB':>10}  same")
+    for name, xml in feeds:
+        data = xml.encode("utf-8")
+        old, new = regex_parse(xml), stream_parse(data)
+        same = len(old) == len(new) and all(
+            o[f] == n[f] for o, n in zip(old, new) for f in NODE_FIELDS
+        )
+        t_old, t_new = timed(regex_parse, xml, args.repeat), timed(stream_parse, data, args.repeat)
+        # Working set while parsing, results discarded. The regex parser
+        # needs the whole decoded body, so that counts toward its peak.
+        m_old = peak_kb(lambda b: len(regex_parse(b.decode("utf-8"))), data)
+        m_new = peak_kb(stream_count, data)
+        with_ids = sum(1 for p in new if p.get("arxiv_id"))
+        with_doi = sum(1 for p in new if p.get("doi"))
+        print(f"{name:<16}{len(data) // 1024:>7}KB  {t_old:>9.2f}{t_new:>10.2f}{t_old / t_new:>7.1f}x  "
+              f"{m_old:>9.0f}{m_new:>10.0f}  {'yes' if same else 'NO'}  ({with_ids} arXiv ids, {with_doi} DOIs)")
+
+
+if __name__ == "__main__":
+    main()
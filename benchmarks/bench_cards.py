@@ -0,0 +1,107 @@
+"""Streamlit card rendering (app.py): one element pair per card vs one grid per page.
+
+    python benchmarks/bench_cards.py [--cards 10 100 1000] [--reruns 5]
+
+For each page size, Streamlit's AppTest reruns a script that shows the
+cards the way app.py used to, a fragment per card with its own
+st.markdown and st.button in rows of st.columns, and the way it does now,
+render_card_grid: one st.markdown for the page and one delegated action
+control. Reports the elements each rerun sends and the mean rerun time,
+then the time to build the cards' HTML without and with the memo.
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import fake_providers  # noqa: E402
+
+
+def papers_for(n):
+    return [
+        {
+            "source": ("arxiv", "scholar", "tavily", "semantic_scholar")[i % 4], "title": p["title"],
+            "year": str(p["year"]), "cited_by": p["citations"], "snippet": p["abstract"],
+            "link": f"https://arxiv.org/abs/{p['id']}",
+        }
+        for i, p in enumerate(fake_providers.synthetic_papers("card rendering", n))
+    ]
+
+
+def script(n, layout):
+    import streamlit as st
+
+    import app
+    from bench_cards import papers_for
+
+    papers = papers_for(n)
+    if layout == "per-card":
+        @st.fragment
+        def card(paper, key):
+            st.markdown(app.render_paper_card(paper), unsafe_allow_html=True)
+            st.button("⭐ Add to Collection", key=key)
+
+        for i in range(0, len(papers), 2):
+            for col, j in zip(st.columns(2), (i, i + 1)):
+                if j < len(papers):
+                    with col:
+                        card(papers[j], f"fav_{j}")
+    else:
+        app.render_card_grid(papers, "fav")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cards", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--reruns", type=int, default=5)
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    os.environ["PAPER_SEARCH_DB"] = os.path.join(tmp.name, "memory.db")
+    sys.path.insert(0, str(Path(__file__).resolve().parent))
+    from streamlit.testing.v1 import AppTest  # noqa: E402
+    # AppTest sets each script up outside a script run; that warning is expected here
+    # (a filter, since Streamlit resets its loggers' levels when it loads its config)
+    logging.getLogger("streamlit.runtime.scriptrunner_utils.script_run_context").addFilter(
+        lambda record: "missing ScriptRunContext" not in record.getMessage()
+    )
+
+    import migrations  # noqa: E402
+    import storage  # noqa: E402
+
+    migrations.ensure_schema()
+    print(f"  {'cards':>6}  {'layout':<10}{'elements':>9}{'rerun ms':>10}")
+    for n in args.cards:
+        for layout in ("per-card", "grid"):
+            at = AppTest.from_function(script, args=(n, layout), default_timeout=600)
+            at.run()  # imports app and warms the card memo
+            started = time.perf_counter()
+            for _ in range(args.reruns):
+                at.run()
+            ms = (time.perf_counter() - started) / args.reruns * 1000
+            assert not at.exception, at.exception
+            elements = len(at.markdown) + len(at.button) + len(at.selectbox)
+            print(f"  {n:>6}  {layout:<10}{elements:>9}{ms:>10.1f}")
+
+    import app  # noqa: E402  (already imported by the scripts)
+
+    papers = papers_for(max(args.cards))
+    for name in ("html, cold", "html, memo"):
+        if name.endswith("cold"):
+            app._card_body.cache_clear()
+        started = time.perf_counter()
+        for i, p in enumerate(papers):
+            app.render_paper_card(p, i + 1)
+        ms = (time.perf_counter() - started) * 1000
+        print(f"  {len(papers):>6}  {name:<10}{'':>9}{ms:>10.1f}")
+    storage.get_pool().close()
+    tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""BM25F corpus index: build cost and query latency against the FTS5 lookup.
+
+    python benchmarks/bench_corpus_index.py [--papers 1000 10000 100000] [--queries 50]
+
+Fills a throwaway memory.db with synthetic papers (through upsert_paper, so
+the index triggers fire as they do for /log_search), syncs the index, then
+times corpus_index.search() and storage.search_papers() on the same queries.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import fake_providers  # noqa: E402
+import corpus_index  # noqa: E402
+import migrations  # noqa: E402
+import storage  # noqa: E402
+
+QUERIES = [
+    "graph neural networks",
+    "sparse attention transformer",
+    "quantization inference",
+    "federated learning survey",
+    "diffusion microscopy",
+]
+
+
+def fill(pool, n):
+    papers = fake_providers.synthetic_papers("graph neural networks sparse attention", n, "corpus")
+    started = time.perf_counter()
+    with pool.transaction() as conn:
+        for p in papers:
+            link = f"https://arxiv.org/abs/{p['id']}"
+            storage.upsert_paper(conn, {"title": p["title"], "snippet": p["abstract"][:240], "link": link})
+    inserted = time.perf_counter() - started
+    started = time.perf_counter()
+    with pool.transaction() as conn:
+        corpus_index.sync(conn)
+    return inserted, time.perf_counter() - started
+
+
+def timed(fn, queries):
+    samples = []
+    for q in queries:
+        started = time.perf_counter()
+        fn(q)
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.99) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--papers", type=int, nargs="+", default=[1000, 10_000, 100_000])
+    parser.add_argument("--queries", type=int, default=50)
+    args = parser.parse_args()
+    queries = [QUERIES[i % len(QUERIES)] for i in range(args.queries)]
+
+    print(f"{'papers':>8}{'insert s':>10}{'index s':>9}  {'bm25f p50/p99 ms':>18}  {'fts5 p50/p99 ms':>17}")
+    for n in args.papers:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "memory.db")
+            migrations.ensure_schema(path)
+            pool = storage.get_pool(path)
+            inserted, indexed = fill(pool, n)
+            with pool.connection() as conn:
+                bm25 = timed(lambda q: corpus_index.search(conn, q, 20), queries)
+                fts = timed(lambda q: storage.search_papers(conn, q, 20), queries)
+            pool.close()
+        print(f"{n:>8}{inserted:>10.2f}{indexed:>9.2f}  {bm25[0]:>8.2f} / {bm25[1]:>7.2f}  {fts[0]:>7.2f} / {fts[1]:>7.2f}")
+
+
+if __name__ == "__main__":
+    main()
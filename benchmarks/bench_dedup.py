@@ -0,0 +1,134 @@
+"""Near-duplicate merging (dedup.py) vs exact normalized-title keys.
+
+    python benchmarks/bench_dedup.py [--sizes 1000 10000 100000]
+
+Builds synthetic result sets in which every work appears several times the
+way providers return it: case and punctuation changes, "v2"/"(preprint)"
+markers, typos, added subtitles, arXiv abs/pdf/versioned links and DOIs.
+Reports run time and pairwise precision/recall against the known groups
+for the node's exact-title dedup and for dedup.merge_duplicates().
+"""
+import argparse
+import random
+import string
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import dedup  # noqa: E402
+import storage  # noqa: E402
+
+SUBTITLES = ["A Survey", "Methods and Applications", "Extended Version", "Theory and Practice"]
+
+
+def vocabulary(rng, size=3000):
+    syllables = ["ra", "to", "ne", "mi", "ka", "lo", "ser", "tan", "vi", "gra", "ph", "qu", "ant", "lex", "dor"]
+    return sorted({"".join(rng.choice(syllables) for _ in range(rng.randint(2, 4))) for _ in range(size)})
+
+
+def typo(rng, title):
+    i = rng.randrange(1, len(title) - 1)
+    if rng.random() < 0.5:
+        return title[:i] + title[i + 1:]
+    return title[:i] + rng.choice(string.ascii_lowercase) + title[i + 1:]
+
+
+def variant(rng, work, k):
+    title, arxiv_id, doi, year = work["title"], work["arxiv_id"], work["doi"], work["year"]
+    paper = {"title": title, "year": str(year), "final_score": rng.random(), "cited_by": rng.randint(0, 900)}
+    kind = k % 6
+    if kind == 0:
+        paper["link"] = f"http://arxiv.org/abs/{arxiv_id}v{rng.randint(1, 3)}"
+        paper["source"] = "arxiv"
+    elif kind == 1:
+        paper["title"] = title.upper() + rng.choice([" (v2)", " [preprint]", "."])
+        paper["link"] = f"https://scholar.example.org/c/{rng.getrandbits(40):x}"
+        paper["source"] = "scholar"
+    elif kind == 2:
+        paper["title"] = typo(rng, title)
+        paper["link"] = f"https://site{rng.randint(1, 50)}.example.com/{rng.getrandbits(40):x}"
+        paper["source"] = "tavily"
+    elif kind == 3:
+        paper["title"] = f"{title}: {rng.choice(SUBTITLES)}"
+        paper["link"] = f"https://doi.org/{doi}"
+        paper["source"] = "semantic_scholar"
+    elif kind == 4:
+        paper["link"] = f"https://arxiv.org/pdf/{arxiv_id}"
+        paper["source"] = "tavily"
+    else:
+        paper["title"] = typo(rng, title.lower())
+        paper["link"] = f"https://www.semanticscholar.org/paper/{rng.getrandbits(40):x}"
+        paper["doi"] = doi
+        paper["source"] = "semantic_scholar"
+        paper["year"] = str(year + 1)
+    return paper
+
+
+def near_duplicates(n, seed=0):
+    """n papers and their true group ids; ~3 copies per work on average."""
+    rng = random.Random(seed)
+    vocab = vocabulary(rng)
+    papers, truth, work_id = [], [], 0
+    while len(papers) < n:
+        words = rng.sample(vocab, rng.randint(5, 9))
+        work = {
+            "title": " ".join(words).title(),
+            "arxiv_id": f"{rng.randint(15, 25)}{rng.randint(1, 12):02d}.{rng.randint(10000, 99999)}",
+            "doi": f"10.{rng.randint(1000, 9999)}/{rng.getrandbits(32):x}",
+            "year": rng.randint(2015, 2025),
+        }
+        for k in rng.sample(range(6), rng.randint(1, 5)):
+            papers.append(variant(rng, work, k))
+            truth.append(work_id)
+        work_id += 1
+    order = list(range(len(papers)))
+    rng.shuffle(order)
+    return [papers[i] for i in order[:n]], [truth[i] for i in order[:n]]
+
+
+def exact_groups(papers):
+    """The node's dedup: one group per normalized title."""
+    groups = {}
+    for i, p in enumerate(papers):
+        groups.setdefault(storage.normalize_title(p.get("title")), []).append(i)
+    return list(groups.values())
+
+
+def pair_scores(groups, truth):
+    """Pairwise precision and recall of `groups` against the true group ids."""
+    def pairs(sizes):
+        return sum(s * (s - 1) // 2 for s in sizes)
+
+    predicted = pairs(len(g) for g in groups)
+    correct = pairs(c for g in groups for c in Counter(truth[i] for i in g).values())
+    actual = pairs(Counter(truth).values())
+    return correct / predicted if predicted else 1.0, correct / actual if actual else 1.0
+
+
+def timed(fn, arg):
+    started = time.perf_counter()
+    result = fn(arg)
+    return result, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10_000, 100_000])
+    args = parser.parse_args()
+
+    print(f"{'papers':>8}  {'exact s':>8}{'prec':>7}{'recall':>7}  {'minhash s':>9}{'prec':>7}{'recall':>7}{'merge s':>9}")
+    for n in args.sizes:
+        papers, truth = near_duplicates(n)
+        old, t_old = timed(exact_groups, papers)
+        new, t_new = timed(dedup.duplicate_groups, papers)
+        _, t_merge = timed(dedup.merge_duplicates, papers)
+        p_old, r_old = pair_scores(old, truth)
+        p_new, r_new = pair_scores(new, truth)
+        print(f"{n:>8}  {t_old:>8.2f}{p_old:>7.3f}{r_old:>7.3f}  {t_new:>9.2f}{p_new:>7.3f}{r_new:>7.3f}{t_merge:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
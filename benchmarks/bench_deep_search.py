@@ -0,0 +1,95 @@
+"""Deep search (engine.iter_pages): candidates, requests and time vs a shallow search.
+
+    python benchmarks/bench_deep_search.py [--latency 0.05] [--candidates 300 1000] [--papers 1200] [--page 20]
+
+1. Runs the same query shallow and deep (one run per --candidates budget)
+   against the fake providers, each page answered after --latency seconds;
+   reports ranked papers, provider requests, wall time and why each
+   provider stopped paging.
+2. Ranks --papers synthetic results arriving --page at a time, the way a
+   deep search sees them: a full rank() of everything after every page vs
+   IncrementalRanking, which scores and fingerprints each page once.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import fake_providers  # noqa: E402
+
+QUERY = "graph neural networks sparse attention"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.05, help="simulated seconds per provider page")
+    parser.add_argument("--candidates", type=int, nargs="+", default=[300, 1000])
+    parser.add_argument("--papers", type=int, default=1200)
+    parser.add_argument("--page", type=int, default=20)
+    args = parser.parse_args()
+
+    server, base_url = fake_providers.start(latency=args.latency)
+    os.environ["PROVIDER_BASE_URL"] = base_url
+    os.environ.setdefault("HTTP_CACHE", "off")  # every run pages the providers again
+    tmp = tempfile.TemporaryDirectory()
+    os.environ["PAPER_SEARCH_DB"] = os.path.join(tmp.name, "memory.db")
+    import engine  # noqa: E402  (reads PROVIDER_BASE_URL via sources at import)
+    import migrations  # noqa: E402
+    import storage  # noqa: E402
+
+    migrations.ensure_schema()
+    print(f"{QUERY!r}, {args.latency * 1000:.0f} ms per provider page")
+    print(f"  {'':<12}{'papers':>8}{'requests':>10}{'wall s':>9}  stopped")
+    runs = [("shallow", None)] + [(f"deep {n}", n) for n in args.candidates]
+    for name, candidates in runs:
+        if candidates:
+            engine.DEEP_CANDIDATES = candidates
+        before = sum(server.hits.values())
+        started = time.perf_counter()
+        result = engine.run_search(QUERY, budget=engine.DEEP_SEARCH_BUDGET, deep=candidates is not None)
+        seconds = time.perf_counter() - started
+        stopped = ", ".join(f"{n} {r['stopped']}" for n, r in result["sources"].items() if r.get("stopped"))
+        print(f"  {name:<12}{len(result['papers']):>8}{sum(server.hits.values()) - before:>10}{seconds:>9.2f}"
+              f"  {stopped}")
+    server.shutdown()
+    storage.get_pool().close()
+    tmp.cleanup()
+
+    papers = []
+    for route in ("arxiv", "scholar", "semantic_scholar"):
+        for p in fake_providers.synthetic_papers(QUERY, args.papers // 3, route, fade=True):
+            papers.append({
+                "source": route, "title": p["title"], "snippet": p["abstract"], "year": p["year"],
+                "cited_by": p["citations"], "link": f"https://arxiv.org/abs/{p['id']}",
+            })
+    pages = [papers[i:i + args.page] for i in range(0, len(papers), args.page)]
+    intent = engine.detect_time_intent(QUERY)
+
+    def full():
+        merged = []
+        for page in pages:
+            merged.extend(page)
+            ranked, _ = engine.rank(merged, intent, QUERY)
+        return ranked
+
+    def incremental():
+        ranking = engine.IncrementalRanking(intent, QUERY)
+        for page in pages:
+            ranking.add(page)
+            ranked = ranking.ranked()
+        return ranked
+
+    print(f"ranking {len(papers)} papers arriving {args.page} per page, re-ranked after each of {len(pages)} pages")
+    for name, run in (("full rank()", full), ("incremental", incremental)):
+        started = time.perf_counter()
+        ranked = run()
+        seconds = time.perf_counter() - started
+        print(f"  {name:<12}{seconds:>8.2f} s {seconds / len(pages) * 1000:>8.1f} ms/page  {len(ranked)} ranked")
+
+
+if __name__ == "__main__":
+    main()
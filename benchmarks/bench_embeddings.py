@@ -0,0 +1,108 @@
+"""Embedding store (embeddings.py): batching, reuse and top-k over the mapped matrix.
+
+    python benchmarks/bench_embeddings.py [--texts 500] [--latency 0.02] [--rows 10000 100000] [--dim 768]
+
+1. Embeds --texts synthetic papers through the fake Ollama /api/embed, one
+   text per request vs EMBED_BATCH per request (--latency per request).
+2. Embeds the same texts again: every vector comes from the matrix file,
+   no model call.
+3. Fills throwaway matrices of --rows random --dim vectors and times
+   nearest() (matrix-vector product + argpartition) for the top 50.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import fake_providers  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--texts", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.02, help="simulated seconds per embedding request")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=20)
+    args = parser.parse_args()
+
+    server, base_url = fake_providers.start(latency={"ollama_embed": args.latency})
+    os.environ["PROVIDER_BASE_URL"] = base_url
+    tmp = tempfile.TemporaryDirectory()
+    os.environ["PAPER_SEARCH_DB"] = os.path.join(tmp.name, "memory.db")
+    import embeddings  # noqa: E402
+    import engine  # noqa: E402
+    import migrations  # noqa: E402
+    import sources  # noqa: E402
+    import storage  # noqa: E402
+
+    migrations.ensure_schema()
+    embedder = sources.default_embedder()
+    papers = fake_providers.synthetic_papers("llm quantization sparse attention", args.texts, "embed")
+    texts = [embeddings.embed_text({"title": p["title"], "abstract": p["abstract"]}) for p in papers]
+
+    async def embed_all(batch):
+        embeddings.EMBED_BATCH = batch
+        async with engine.new_client() as client:
+            before = server.hits["ollama_embed"]
+            started = time.perf_counter()
+            await embeddings.vectors_for(texts, embedder, client)
+            return time.perf_counter() - started, server.hits["ollama_embed"] - before
+
+    print(f"{args.texts} texts, {args.latency * 1000:.0f} ms per embedding request")
+    for name, batch in (("batch 1", 1), (f"batch {embeddings.EMBED_BATCH}", embeddings.EMBED_BATCH), ("stored", 64)):
+        seconds, calls = asyncio.run(embed_all(batch))
+        if batch == 1:
+            with storage.transaction() as conn:  # forget them again for the batched run
+                conn.execute("DELETE FROM vector_slots")
+                conn.execute("UPDATE vector_meta SET rows = 0")
+        print(f"  {name:<10}{calls:>6} requests {seconds:>8.2f} s  {args.texts / seconds:>9.0f} texts/s")
+    storage.get_pool().close()
+    server.shutdown()
+
+    print(f"nearest() top 50 over {args.dim}-d float32, {args.queries} queries")
+    rng = np.random.default_rng(0)
+    for rows in args.rows:
+        with tempfile.TemporaryDirectory() as scratch:
+            storage.DB_PATH = Path(scratch) / "memory.db"
+            migrations.ensure_schema(storage.DB_PATH)
+            pool = storage.get_pool(storage.DB_PATH)
+            started = time.perf_counter()
+            with pool.connection() as conn:
+                conn.execute("PRAGMA foreign_keys=OFF")  # rows point at papers that are not there
+                conn.execute("BEGIN IMMEDIATE")
+                for start in range(0, rows, 10_000):
+                    n = min(10_000, rows - start)
+                    keys = [embeddings.text_key(f"text {start + i}") for i in range(n)]
+                    embeddings.store(conn, keys, rng.standard_normal((n, args.dim), dtype=np.float32), "bench")
+                conn.executemany(
+                    "INSERT INTO paper_vectors (paper_id, slot) VALUES (?, ?)", [(i + 1, i) for i in range(rows)]
+                )
+                conn.commit()
+            filled = time.perf_counter() - started
+            samples = []
+            with pool.connection() as conn:
+                for _ in range(args.queries):
+                    query = rng.standard_normal(args.dim, dtype=np.float32)
+                    query /= np.linalg.norm(query)
+                    t = time.perf_counter()
+                    embeddings.nearest(conn, query, "bench", 50)
+                    samples.append((time.perf_counter() - t) * 1000)
+            pool.close()
+            samples.sort()
+            size = embeddings.vector_path().stat().st_size / 2 ** 20
+        print(f"  {rows:>8} rows {size:>7.0f} MB  fill {filled:>6.2f} s  "
+              f"p50 {statistics.median(samples):>7.2f} ms  max {samples[-1]:>7.2f} ms")
+    tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""End-to-end timing of the Python engine against the local provider stand-ins.
+
+    python benchmarks/bench_engine.py [--runs 20] [--latency 0.2]
+    python benchmarks/bench_engine.py --slow semantic_scholar=30 --budget 2
+
+Prints the mean duration of every engine stage and the p50/p99 of whole
+searches, so regressions in parsing, scoring or dedup show up without
+touching the real providers. --slow makes one stand-in hang to show that
+the search budget, not the slowest provider, bounds latency. Keywords are
+remembered in a throwaway memory.db, so only the first run asks Ollama;
+--no-keyword-cache times every run through Ollama. The HTTP cache is off
+unless HTTP_CACHE is set: HTTP_CACHE=offline HTTP_CACHE_PATH=<file> replays
+provider answers recorded there (see bench_http_cache.py) instead.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import fake_providers  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.0, help="simulated provider latency (s)")
+    parser.add_argument("--slow", action="append", default=[], metavar="ROUTE=SECONDS",
+                        help="extra latency for one stand-in, e.g. semantic_scholar=30")
+    parser.add_argument("--budget", type=float, default=None, help="search budget (s), default engine.SEARCH_BUDGET")
+    parser.add_argument("--query", default="Find papers about sparse attention transformer 2024")
+    parser.add_argument("--no-keyword-cache", action="store_true", help="forget extracted keywords between runs")
+    args = parser.parse_args()
+
+    latency = {route: args.latency for route in ("arxiv", "scholar", "tavily", "semantic_scholar", "ollama")}
+    for item in args.slow:
+        route, seconds = item.split("=")
+        latency[route] = float(seconds)
+    server, base_url = fake_providers.start(latency=latency)
+    os.environ["PROVIDER_BASE_URL"] = base_url
+    os.environ.setdefault("HTTP_CACHE", "off")  # time the providers, not the cache
+    tmp = tempfile.TemporaryDirectory()
+    os.environ["PAPER_SEARCH_DB"] = os.path.join(tmp.name, "memory.db")
+    import engine  # noqa: E402  (reads PROVIDER_BASE_URL via sources at import)
+    import keywords  # noqa: E402
+    import migrations  # noqa: E402
+    import storage  # noqa: E402
+
+    migrations.ensure_schema()
+
+    budget = engine.SEARCH_BUDGET if args.budget is None else args.budget
+    samples, totals, partial = {}, [], 0
+
+    async def runs():
+        # One pooled client for all runs, as in the memory API
+        async with engine.new_client() as client:
+            results = []
+            for _ in range(args.runs):
+                if args.no_keyword_cache:
+                    with storage.transaction() as conn:
+                        keywords.memo.clear(conn)
+                started = time.perf_counter()
+                results.append(await engine.search(args.query, client=client, budget=budget))
+                totals.append((time.perf_counter() - started) * 1000)
+            return results
+
+    for result in asyncio.run(runs()):
+        partial += result["partial"]
+        for stage, ms in result["timings"].items():
+            samples.setdefault(stage, []).append(ms)
+    server.shutdown()
+    storage.get_pool().close()
+    tmp.cleanup()
+
+    print(f"{args.runs} runs, {len(result['papers'])} ranked papers, search_query={result['search_query']!r}")
+    for stage, values in samples.items():
+        print(f"  {stage:<20} mean {statistics.mean(values):8.2f} ms   max {max(values):8.2f} ms")
+    totals.sort()
+    p99 = totals[min(len(totals) - 1, int(len(totals) * 0.99))]
+    print(f"  whole search         p50 {totals[len(totals) // 2]:8.2f} ms   p99 {p99:8.2f} ms   budget {budget * 1000:.0f} ms")
+    print(f"  partial results in {partial}/{args.runs} runs: "
+          + ", ".join(f"{n}={r['status']}" for n, r in result["sources"].items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Metadata enrichment (enrichment.py): citation coverage, source balance and batch requests.
+
+    python benchmarks/bench_enrichment.py [--latency 0.1] [--batch 100]
+
+Runs the same searches against the fake providers three times: without
+enrichment, with it on an empty metadata cache ("cold"), and again once
+every paper was seen ("warm"). Reports the share of candidates with a
+citation count, which sources make the top 10, the batch requests sent
+(against the one-lookup-per-paper alternative) and the time the stage adds.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+from collections import Counter
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import fake_providers  # noqa: E402
+
+QUERIES = [
+    "sparse attention transformers", "graph neural networks molecules", "diffusion models microscopy",
+    "federated learning privacy", "llm quantization", "protein structure prediction",
+]
+TOP = 10
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.1, help="simulated seconds per provider answer")
+    parser.add_argument("--batch", type=int, default=100, help="ids per batch request")
+    args = parser.parse_args()
+
+    server, base_url = fake_providers.start(latency=args.latency)
+    os.environ["PROVIDER_BASE_URL"] = base_url
+    os.environ["HTTP_CACHE"] = "off"  # the metadata cache alone decides what is asked again
+    tmp = tempfile.TemporaryDirectory()
+    os.environ["PAPER_SEARCH_DB"] = os.path.join(tmp.name, "memory.db")
+    import engine  # noqa: E402  (reads PROVIDER_BASE_URL via sources at import)
+    import enrichment  # noqa: E402
+    import migrations  # noqa: E402
+    import storage  # noqa: E402
+
+    migrations.ensure_schema()
+    enrichment.BATCH_SIZE = args.batch
+
+    async def replay():
+        async with engine.new_client() as client:
+            return [await engine.search(q, client=client) for q in QUERIES]
+
+    print(f"{len(QUERIES)} searches, {args.latency * 1000:.0f} ms per provider answer, {args.batch} ids per batch")
+    print(f"  {'':<8}{'cited':>7}{'batches':>9}{'per-paper':>11}{'stage ms':>10}  top {TOP} by source")
+    for name, enabled in (("off", False), ("cold", True), ("warm", True)):
+        enrichment.ENABLED = enabled
+        before, counts = server.hits["semantic_scholar/batch"], dict(enrichment.cache.counts)
+        results = asyncio.run(replay())
+        papers = [p for r in results for p in r["papers"]]
+        cited = sum(p.get("cited_by") is not None for p in papers) / max(len(papers), 1)
+        # Providers settle in a different order each run, so break score ties by title
+        top = Counter(p["source"] for r in results
+                      for p in sorted(r["papers"], key=lambda p: (-p["final_score"], p["title"]))[:TOP])
+        asked = enrichment.cache.counts["requested"] - counts["requested"]
+        stage = [r["timings"].get("enrich_metadata", 0.0) for r in results]
+        print(f"  {name:<8}{cited:>7.0%}{server.hits['semantic_scholar/batch'] - before:>9}{asked:>11}"
+              f"{statistics.mean(stage):>10.1f}  {dict(sorted(top.items()))}")
+    print(f"  metadata cache: {enrichment.cache.stats()}")
+    server.shutdown()
+    storage.get_pool().close()
+    tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""HTTP response cache (http_cache.py): cold, warm, revalidated and offline replay.
+
+    python benchmarks/bench_http_cache.py [--searches 40] [--latency 0.2] [--record trace.httpcache]
+
+Runs the same trace of searches (repeated topics) four times against the
+fake providers, each answer taking --latency seconds:
+"cold" starts from an empty cache, "warm" repeats it within the TTL,
+"revalidate" repeats it after every entry went stale (conditional
+requests, answered 304 by the stand-ins' ETags), and "offline" replays it
+with HTTP_CACHE=offline after the stand-ins were shut down. The offline
+rankings must score the same papers as the cold ones.
+
+--record keeps the cache file; replay it into any benchmark with
+HTTP_CACHE=offline HTTP_CACHE_PATH=trace.httpcache.
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import zlib
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import fake_providers  # noqa: E402
+
+TOPICS = [
+    "sparse attention transformers", "graph neural networks molecules", "diffusion models microscopy",
+    "federated learning privacy", "llm quantization", "protein structure prediction",
+    "retrieval augmented generation", "neural radiance fields",
+]
+ROUTES = ("arxiv", "scholar", "tavily", "semantic_scholar")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--searches", type=int, default=40)
+    parser.add_argument("--latency", type=float, default=0.2, help="simulated seconds per provider answer")
+    parser.add_argument("--record", help="keep the cache file here for offline replays")
+    args = parser.parse_args()
+
+    server, base_url = fake_providers.start(latency=args.latency)
+    os.environ["PROVIDER_BASE_URL"] = base_url
+    tmp = tempfile.TemporaryDirectory()
+    os.environ["PAPER_SEARCH_DB"] = os.path.join(tmp.name, "memory.db")
+    os.environ["HTTP_CACHE"] = "on"
+    if args.record:
+        Path(args.record).unlink(missing_ok=True)
+        os.environ["HTTP_CACHE_PATH"] = args.record
+    import engine  # noqa: E402  (reads PROVIDER_BASE_URL via sources at import)
+    import http_cache  # noqa: E402
+    import migrations  # noqa: E402
+    import storage  # noqa: E402
+
+    migrations.ensure_schema()
+    rng = random.Random(0)
+    queries = [rng.choice(TOPICS) for _ in range(args.searches)]
+
+    async def replay():
+        results, samples = [], []
+        async with engine.new_client() as client:
+            for query in queries:
+                started = time.perf_counter()
+                results.append(await engine.search(query, client=client))
+                samples.append((time.perf_counter() - started) * 1000)
+        return results, samples
+
+    print(f"{args.searches} searches over {len(set(queries))} topics, {args.latency * 1000:.0f} ms per provider answer")
+    print(f"  {'':<12}{'requests':>9}{'304':>6}{'failed':>8}{'p50 ms':>9}{'mean ms':>9}")
+    cold = None
+    for name in ("cold", "warm", "revalidate", "offline"):
+        if name == "revalidate":
+            with http_cache.cache._pool().transaction() as conn:
+                conn.execute("UPDATE http_cache SET fetched_at = 0")
+        if name == "offline":
+            server.shutdown()
+            http_cache.cache.mode = "offline"
+        hits, not_modified = sum(server.hits[r] for r in ROUTES), server.not_modified
+        results, samples = asyncio.run(replay())
+        failed = sum(r["status"] != "ok" for result in results for n, r in result["sources"].items() if n in ROUTES)
+        print(f"  {name:<12}{sum(server.hits[r] for r in ROUTES) - hits:>9}{server.not_modified - not_modified:>6}"
+              f"{failed:>8}{statistics.median(samples):>9.1f}{statistics.mean(samples):>9.1f}")
+        # Providers settle in a different order each run, so equal scores may swap places
+        ranking = [sorted((round(p["final_score"], 9), p["title"]) for p in result["papers"]) for result in results]
+        if cold is None:
+            cold = ranking
+        elif name == "offline":
+            print(f"  offline rankings identical to cold: {ranking == cold}")
+
+    stats = http_cache.cache.stats()
+    raw = 0
+    with http_cache.cache._pool().connection() as conn:
+        for (body,) in conn.execute("SELECT body FROM http_cache"):
+            raw += len(zlib.decompress(body))
+    print(f"  {stats['entries']} entries, {stats['bytes'] / 1024:.0f} KB stored for {raw / 1024:.0f} KB of bodies"
+          f" ({raw / max(stats['bytes'], 1):.1f}x)")
+    storage.get_pool().close()
+    storage.get_pool(http_cache.cache_path()).close()
+    tmp.cleanup()
+    if args.record:
+        print(f"  recorded to {args.record}")
+
+
+if __name__ == "__main__":
+    main()
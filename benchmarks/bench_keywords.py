@@ -0,0 +1,112 @@
+"""Keyword extraction with and without the keyword memo (keywords.py).
+
+    python benchmarks/bench_keywords.py [--searches 200] [--concurrency 8] [--latency 0.3]
+
+Replays a trace of searches against the fake Ollama, whose answer takes
+--latency seconds as a small model on CPU would: --concurrency users at a
+time, drawn from a pool of conversational questions (asked repeatedly, as
+users do) and keyword-only queries. "direct" asks Ollama for every search
+as before; "memo" goes through engine.extract_keywords() with a throwaway
+memory.db. Reports Ollama requests sent and per-search latency.
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import fake_providers  # noqa: E402
+
+TOPICS = [
+    "sparse attention transformers", "graph neural networks for molecules", "diffusion models for microscopy",
+    "federated learning privacy", "quantization of large language models", "protein structure prediction",
+    "reinforcement learning from human feedback", "retrieval augmented generation", "neural radiance fields",
+    "speech recognition in noisy environments", "time series forecasting", "mixture of experts routing",
+]
+ASKS = ["Find papers about {}", "Can you show me recent research on {}?", "I need studies on {} from 2023"]
+
+
+def trace(n, seed=0):
+    """n queries: ~75% conversational over a fixed pool, the rest plain keywords."""
+    rng = random.Random(seed)
+    pool = [ask.format(topic) for topic in TOPICS for ask in ASKS]
+    return [rng.choice(pool) if rng.random() < 0.75 else f"{rng.choice(TOPICS)} {rng.randint(2019, 2025)}"
+            for _ in range(n)]
+
+
+async def replay(queries, concurrency, extract):
+    slots = asyncio.Semaphore(concurrency)
+    samples = []
+
+    async def one(query):
+        async with slots:
+            started = time.perf_counter()
+            await extract(query)
+            samples.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(q) for q in queries))
+    return samples, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--searches", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.3, help="simulated Ollama answer time (s)")
+    args = parser.parse_args()
+
+    server, base_url = fake_providers.start(latency={"ollama": args.latency})
+    os.environ["PROVIDER_BASE_URL"] = base_url
+    tmp = tempfile.TemporaryDirectory()
+    os.environ["PAPER_SEARCH_DB"] = os.path.join(tmp.name, "memory.db")
+    import engine  # noqa: E402  (reads PROVIDER_BASE_URL via sources at import)
+    import keywords  # noqa: E402
+    import migrations  # noqa: E402
+    import sources  # noqa: E402
+    import storage  # noqa: E402
+
+    migrations.ensure_schema()
+    queries = trace(args.searches)
+    extractor = sources.default_extractor()
+
+    async def run(name, make):
+        async with engine.new_client() as client:
+            before = server.hits["ollama"]
+            samples, wall = await replay(queries, args.concurrency, make(client))
+        samples.sort()
+        p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+        print(f"  {name:<8}{server.hits['ollama'] - before:>8}{statistics.median(samples):>10.1f}"
+              f"{p99:>10.1f}{wall:>9.2f}")
+
+    def direct(client):
+        async def extract(query):
+            return extractor.parse(await engine._call(client, extractor.build_request(query), extractor.timeout))
+        return extract
+
+    def memoized(client):
+        memo = keywords.KeywordMemo()
+
+        async def extract(query):
+            return await engine.extract_keywords(query, client, extractor, memo=memo)
+        return extract
+
+    print(f"{args.searches} searches, {len(set(queries))} distinct, {args.concurrency} at a time, "
+          f"Ollama answers in {args.latency * 1000:.0f} ms")
+    print(f"  {'':<8}{'ollama':>8}{'p50 ms':>10}{'p99 ms':>10}{'wall s':>9}")
+    asyncio.run(run("direct", direct))
+    asyncio.run(run("memo", memoized))
+    asyncio.run(run("warm", memoized))  # a second session over the same memory.db
+    server.shutdown()
+    storage.get_pool().close()
+    tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Write throughput of search logging: one commit per search vs group commit vs bulk.
+
+    python benchmarks/bench_log_search.py [--searches 2000] [--papers 10] [--threads 16]
+
+Logs synthetic searches (each with --papers results) into a throwaway
+memory.db three ways, through the same code the memory API runs:
+"per search" commits every search on its own, as /log_search did;
+"group commit" has --threads clients calling record_search() at once, as
+concurrent /log_search requests do; "bulk" writes everything in one
+transaction, as /log_search/bulk does.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import fake_providers  # noqa: E402
+
+
+def entries(n, papers, tag):
+    found = fake_providers.synthetic_papers("graph neural networks sparse attention", n * papers, tag)
+    return [
+        {
+            "query": f"{tag} search {i}",
+            "search_query": f"{tag} keywords {i}",
+            "request_id": f"{tag}-{i}",
+            "top_results": [
+                {"title": p["title"], "snippet": p["abstract"][:240], "link": f"https://arxiv.org/abs/{p['id']}",
+                 "year": p["year"], "cited_by": p["citations"], "final_score": 1 - k / papers}
+                for k, p in enumerate(found[i * papers:(i + 1) * papers])
+            ],
+        }
+        for i in range(n)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--searches", type=int, default=2000)
+    parser.add_argument("--papers", type=int, default=10)
+    parser.add_argument("--threads", type=int, default=16)
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    os.environ["PAPER_SEARCH_DB"] = os.path.join(tmp.name, "memory.db")
+    import memory_api  # noqa: E402
+    import migrations  # noqa: E402
+    import storage  # noqa: E402
+
+    migrations.ensure_schema()
+
+    def per_search(batch):
+        for e in batch:
+            memory_api.write_searches([e])
+
+    def group_commit(batch):
+        with ThreadPoolExecutor(args.threads) as pool:
+            list(pool.map(lambda e: memory_api.record_search(
+                e["query"], e["search_query"], e["top_results"], e["request_id"]), batch))
+
+    def bulk(batch):
+        memory_api.write_searches(batch)
+
+    print(f"{args.searches} searches x {args.papers} papers")
+    for name, run in (("per search", per_search), ("group commit", group_commit), ("bulk", bulk)):
+        batch = entries(args.searches, args.papers, name.replace(" ", "-"))
+        started = time.perf_counter()
+        run(batch)
+        seconds = time.perf_counter() - started
+        print(f"  {name:<13}{seconds:>8.2f} s {args.searches / seconds:>9.0f} searches/s")
+    memory_api.committer.close()
+    with storage.connection() as conn:
+        logged = conn.execute("SELECT COUNT(*) FROM search_history").fetchone()[0]
+    print(f"  {logged} searches logged")
+    storage.get_pool().close()
+    tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Outbound scheduler (outbound.py) against rate-limited, flaky provider stand-ins.
+
+    python benchmarks/bench_scheduler.py [--searches 60] [--concurrency 12] [--latency 0.1] [--fail 0.1]
+
+The fake providers enforce per-route rate limits (429 + Retry-After past
+them) and answer --fail of the SerpAPI and Tavily requests with 503. The
+same trace of searches (--concurrency at a time, repeated topics) runs
+"direct", every search firing its own requests as before, and
+"scheduled", through the shared token buckets, coalescing, retries and
+circuit breakers. Reports papers per search, how many searches got every
+provider, what the providers answered, and search latency.
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import fake_providers  # noqa: E402
+
+# (requests per second, burst) each stand-in allows; the engine is told 90% of
+# the rate, the margin a deployment leaves for clock and network jitter
+LIMITS = {"arxiv": (2.0, 1), "scholar": (5.0, 5), "tavily": (3.0, 5), "semantic_scholar": (1.0, 1)}
+TOPICS = [
+    "sparse attention transformers", "graph neural networks molecules", "diffusion models microscopy",
+    "federated learning privacy", "llm quantization", "protein structure prediction",
+    "retrieval augmented generation", "neural radiance fields", "time series forecasting", "mixture of experts",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--searches", type=int, default=60)
+    parser.add_argument("--concurrency", type=int, default=12)
+    parser.add_argument("--latency", type=float, default=0.1, help="simulated seconds per provider answer")
+    parser.add_argument("--fail", type=float, default=0.1, help="share of SerpAPI/Tavily requests answered 503")
+    args = parser.parse_args()
+
+    server, base_url = fake_providers.start(
+        latency=args.latency, limits=LIMITS, errors={"scholar": args.fail, "tavily": args.fail}
+    )
+    os.environ["PROVIDER_BASE_URL"] = base_url
+    os.environ.setdefault("HTTP_CACHE", "off")  # repeated topics must reach the providers
+    os.environ.setdefault("ENRICH_METADATA", "0")  # batch lookups would share Semantic Scholar's bucket
+    for route, (rate, burst) in LIMITS.items():
+        os.environ[f"{route.upper()}_RATE"] = str(rate * 0.9)
+        os.environ[f"{route.upper()}_BURST"] = str(burst)
+    tmp = tempfile.TemporaryDirectory()
+    os.environ["PAPER_SEARCH_DB"] = os.path.join(tmp.name, "memory.db")
+    import engine  # noqa: E402  (reads PROVIDER_BASE_URL via sources at import)
+    import migrations  # noqa: E402
+    import outbound  # noqa: E402
+    import storage  # noqa: E402
+
+    migrations.ensure_schema()
+    rng = random.Random(0)
+    queries = [rng.choice(TOPICS) for _ in range(args.searches)]
+
+    async def replay():
+        slots = asyncio.Semaphore(args.concurrency)
+        results = []
+
+        async def one(query):
+            async with slots:
+                started = time.perf_counter()
+                result = await engine.search(query, client=client)
+                results.append((result, (time.perf_counter() - started) * 1000))
+
+        async with engine.new_client() as client:
+            await asyncio.gather(*(one(q) for q in queries))
+        return results
+
+    print(f"{args.searches} searches over {len(set(queries))} topics, {args.concurrency} at a time; "
+          f"stand-ins allow {', '.join(f'{r} {v[0]:g}/s' for r, v in LIMITS.items())}, "
+          f"{args.fail:.0%} of SerpAPI/Tavily answers are 503")
+    runs = (
+        ("direct", outbound.Scheduler(retries=0, rate_limits=False, coalesce=False, circuit_breakers=False)),
+        ("scheduled", outbound.Scheduler()),
+    )
+    for name, scheduler in runs:
+        outbound.scheduler = scheduler
+        server.buckets.clear()
+        hits, rejected = sum(server.hits[r] for r in LIMITS), sum(server.rejected.values())
+        started = time.perf_counter()
+        results = asyncio.run(replay())
+        wall = time.perf_counter() - started
+        samples = sorted(ms for _, ms in results)
+        statuses = Counter(r["status"] for result, _ in results for n, r in result["sources"].items() if n != "ollama")
+        stats = scheduler.stats().values()
+        print(f"  {name}")
+        print(f"    papers/search {statistics.mean(len(r['papers']) for r, _ in results):>6.1f}   "
+              f"complete {sum(not r['partial'] for r, _ in results)}/{len(results)}   "
+              f"provider answers {dict(statuses)}")
+        print(f"    requests {sum(server.hits[r] for r in LIMITS) - hits:>5} "
+              f"(429/503 {sum(server.rejected.values()) - rejected}, retries {sum(s['retries'] for s in stats)}, "
+              f"coalesced {sum(s['coalesced'] for s in stats)})   p50 {statistics.median(samples):>6.0f} ms   "
+              f"p99 {samples[min(len(samples) - 1, int(len(samples) * 0.99))]:>6.0f} ms   wall {wall:.1f} s")
+    server.shutdown()
+    storage.get_pool().close()
+    tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Batch scoring (scoring.py) vs the per-paper smartScore loop.
+
+    python benchmarks/bench_scoring.py [--sizes 100 10000 100000]
+
+Reports candidates/second for both scalar loops and both vectorized modes
+at each size, on a randomized corpus with edge cases (no citations, year
+filters, empty titles, non-ASCII text, partial-token traps). That the
+vectorized modes reproduce the loops is checked by tests/test_scoring.py,
+against its own copy of the reference loops.
+"""
+import argparse
+import math
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import fake_providers  # noqa: E402
+import engine  # noqa: E402
+import scoring  # noqa: E402
+
+
+def reference_scores(papers, search_query, has_year, requested_year):
+    """The node's loop, per paper (substring matching)."""
+    words = engine.query_words(search_query)
+    max_cite = max([p.get("cited_by") or 0 for p in papers] + [1])
+    out = []
+    for p in papers:
+        content = engine.smart_score(words, p, requested_year)
+        final = content
+        if not has_year and p.get("cited_by") is not None and content > 0:
+            final = 0.85 * content + 0.15 * math.log1p(p["cited_by"]) / math.log1p(max_cite)
+        out.append((content, final))
+    return out
+
+
+def token_reference(papers, search_query, has_year, requested_year):
+    """Same formula with whole-token matching, one paper at a time."""
+    words = scoring.scoring_words(search_query, "token")
+    max_cite = max([p.get("cited_by") or 0 for p in papers] + [1])
+    phrase = f" {' '.join(words)} "
+    out = []
+    for p in papers:
+        title = scoring.normalize_text(p.get("title"))
+        abstract = scoring.normalize_text(p.get("snippet") or p.get("abstract"))
+        t = sum(1 for w in words if f" {w} " in title)
+        a = sum(1 for w in words if f" {w} " in abstract)
+        content = 0.0
+        if words and (t + a) / (len(words) * 2) >= 0.5:
+            content = (t * 3 + a + (0.5 if phrase in title else 0) + (0.2 if phrase in abstract else 0)) / (len(words) * 4)
+            if requested_year and p.get("year") and requested_year in str(p["year"]):
+                content *= 1.5
+        final = content
+        if not has_year and p.get("cited_by") is not None and content > 0:
+            final = 0.85 * content + 0.15 * math.log1p(p["cited_by"]) / math.log1p(max_cite)
+        out.append((content, final))
+    return out
+
+
+def candidates(n, query, seed=0):
+    rng = random.Random(seed)
+    papers = []
+    for i, p in enumerate(fake_providers.synthetic_papers(query, n, str(seed))):
+        papers.append({
+            "title": (p["title"] if i % 50 else "") + (" — Graph—Neural “Networks” für Ärzte" if i % 13 == 0 else ""),
+            "snippet": p["abstract"][:240] + (" paragraphs of graphite" if i % 7 == 0 else ""),
+            "year": str(p["year"]) if i % 11 else "",
+            "cited_by": None if i % 3 == 0 else rng.randint(0, 5000),
+        })
+    return papers
+
+
+def batch(papers, query, has_year, year, match):
+    content = scoring.content_scores(papers, scoring.scoring_words(query, match), year, match)
+    return content, scoring.final_scores(papers, content, has_year)
+
+
+def rate(fn, n, repeat=5):
+    """Best of `repeat` runs, in candidates per second."""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return n / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 10_000, 100_000])
+    args = parser.parse_args()
+
+    query = "sparse attention transformer survey"
+    print(f"throughput (candidates/s), query={query!r}")
+    print(f"{'n':>8}{'loop':>12}{'substring':>12}{'token loop':>12}{'token':>12}")
+    for n in args.sizes:
+        papers = candidates(n, query)
+        loop = rate(lambda: reference_scores(papers, query, False, None), n)
+        sub = rate(lambda: batch(papers, query, False, None, "substring"), n)
+        tok_loop = rate(lambda: token_reference(papers, query, False, None), n)
+        tok = rate(lambda: batch(papers, query, False, None, "token"), n)
+        print(f"{n:>8}{loop:>12,.0f}{sub:>12,.0f}{tok_loop:>12,.0f}{tok:>12,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,381 @@
+"""Local HTTP stand-ins for arXiv, SerpAPI, Tavily, Semantic Scholar (search and batch) and Ollama.
+
+Answers with deterministic synthetic papers built from the query, in each
+provider's real response format, so the Python engine can be benchmarked
+and exercised offline:
+
+    python benchmarks/fake_providers.py --port 8765
+    PROVIDER_BASE_URL=http://127.0.0.1:8765 uvicorn memory_api:app --port 8000
+
+Simulated latency is set per route with start(latency=...) or --latency,
+or per request with a `latency` query parameter (seconds). An `n` query
+parameter overrides the number of papers returned. Providers page like the
+real ones (arXiv start/max_results, SerpAPI start/num, Semantic Scholar
+offset/limit) through RESULTS_PER_QUERY hits whose relevance fades with
+depth, so deep searches have something to page through and to plateau on.
+
+Like the real APIs, a route can enforce a rate limit (start(limits=...) or
+--limit semantic_scholar=1): requests beyond it get 429 with Retry-After.
+start(errors=...) or --fail scholar=0.2 answers that share of requests
+with 503. server.rejected counts both per route. Every answer carries an
+ETag, and a matching If-None-Match gets 304 Not Modified without a body.
+"""
+import math
+import argparse
+import functools
+import hashlib
+import json
+import random
+import textwrap
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from xml.sax.saxutils import escape
+
+VOCAB = (
+    "learning neural quantization transformer language model graph attention sparse "
+    "diffusion retrieval microscopy protein inference robust federated efficient "
+    "benchmark contrastive vision speech reinforcement optimization kernel survey"
+).split()
+
+
+RESULTS_PER_QUERY = 1000
+RELEVANT_DEPTH = 50  # past this rank, ever fewer papers mention the query
+
+
+def synthetic_papers(query, n, seed_extra="", fade=False):
+    """n reproducible papers; about half mention the query words.
+
+    With `fade`, papers past RELEVANT_DEPTH mention them with probability
+    RELEVANT_DEPTH / (2 * rank), like a ranked result list.
+    """
+    seed = int(hashlib.sha1((query + seed_extra).encode("utf-8")).hexdigest()[:8], 16)
+    rng = random.Random(seed)
+    words = [w for w in query.lower().split() if w.isalpha()] or ["research"]
+    papers = []
+    for i in range(n):
+        topical = i % 2 == 0
+        if fade and i >= RELEVANT_DEPTH:
+            topical = rng.random() < RELEVANT_DEPTH / (2 * i)
+        title_words = rng.sample(VOCAB, 4) + (rng.sample(words, min(len(words), 2)) if topical else [])
+        rng.shuffle(title_words)
+        abstract = " ".join(rng.choice(VOCAB) for _ in range(40))
+        if topical:
+            abstract = " ".join(words) + " " + abstract
+        year, month = rng.randint(2015, 2026), rng.randint(1, 12)
+        papers.append({
+            "id": f"{year % 100:02d}{month:02d}.{rng.randint(10000, 99999)}",
+            "title": " ".join(title_words).title(),
+            "abstract": abstract,
+            "authors": [f"Author {rng.randint(1, 500)}" for _ in range(rng.randint(1, 4))],
+            "year": year,
+            "month": month,
+            "venue": rng.choice(["NeurIPS", "ICML", "ICLR", "Nature", "arXiv", "CVPR"]),
+            "citations": rng.randint(0, 5000),
+        })
+    return papers
+
+
+def arxiv_feed(papers):
+    """An Atom feed laid out like export.arxiv.org/api/query responses."""
+    entries = []
+    for i, p in enumerate(papers):
+        abs_url = f"http://arxiv.org/abs/{p['id']}v{1 + i % 3}"
+        authors = "".join(
+            f"\n    <author>\n      <name>{escape(a)}</name>\n"
+            + (f"      <arxiv:affiliation>University {n}</arxiv:affiliation>\n" if n % 3 == 0 else "")
+            + "    </author>"
+            for n, a in enumerate(p["authors"])
+        )
+        doi = f"10.{1000 + i % 9000}/jml.{p['id'].replace('.', '')}"
+        extra = (
+            f'\n    <arxiv:doi>{doi}</arxiv:doi>'
+            f'\n    <link title="doi" href="http://dx.doi.org/{doi}" rel="related"/>'
+            f'\n    <arxiv:journal_ref>{p["venue"]} {p["year"]}</arxiv:journal_ref>'
+            if i % 3 == 0 else ""
+        )
+        title = "\n  ".join(textwrap.wrap(escape(p["title"]), 30))
+        summary = "\n".join(textwrap.wrap(escape(p["abstract"]), 80))
+        entries.append(
+            f"""
+  <entry>
+    <id>{abs_url}</id>
+    <updated>{p['year']}-{p['month']:02d}-03T17:59:59Z</updated>
+    <published>{p['year']}-{p['month']:02d}-01T00:00:00Z</published>
+    <title>{title}</title>
+    <summary>  {summary}
+</summary>{authors}
+    <arxiv:comment xmlns:arxiv="http://arxiv.org/schemas/atom">{10 + i % 20} pages, {i % 7} figures</arxiv:comment>{extra}
+    <link href="{abs_url}" rel="alternate" type="text/html"/>
+    <link title="pdf" href="{abs_url.replace('/abs/', '/pdf/')}" rel="related" type="application/pdf"/>
+    <arxiv:primary_category xmlns:arxiv="http://arxiv.org/schemas/atom" term="cs.LG" scheme="http://arxiv.org/schemas/atom"/>
+    <category term="cs.LG" scheme="http://arxiv.org/schemas/atom"/>
+    <category term="{('cs.CL', 'stat.ML', 'cs.CV')[i % 3]}" scheme="http://arxiv.org/schemas/atom"/>
+  </entry>"""
+        )
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<feed xmlns="http://www.w3.org/2005/Atom" xmlns:arxiv="http://arxiv.org/schemas/atom">\n'
+        '  <link href="http://arxiv.org/api/query" rel="self" type="application/atom+xml"/>\n'
+        '  <title type="html">ArXiv Query: search_query=all:synthetic</title>\n'
+        '  <id>http://arxiv.org/api/synthetic</id>\n'
+        '  <updated>2026-01-01T00:00:00-05:00</updated>\n'
+        f'  <opensearch:totalResults xmlns:opensearch="http://a9.com/-/spec/opensearch/1.1/">{len(papers)}</opensearch:totalResults>\n'
+        '  <opensearch:startIndex xmlns:opensearch="http://a9.com/-/spec/opensearch/1.1/">0</opensearch:startIndex>'
+        + "".join(entries)
+        + "\n</feed>\n"
+    )
+
+
+def scholar_json(papers):
+    return {"organic_results": [
+        {
+            "title": p["title"],
+            "link": f"https://example.org/scholar/{p['id']}",
+            "snippet": p["abstract"],
+            "publication_info": {"summary": f"{', '.join(p['authors'])} - {p['venue']}, {p['year']}"},
+            "inline_links": {"cited_by": {"total": p["citations"]}},
+        }
+        for p in papers
+    ]}
+
+
+def tavily_json(papers):
+    # Half the hits are arXiv PDFs, the rest pages without an identifier
+    return {"results": [
+        {
+            "title": p["title"],
+            "url": f"https://arxiv.org/pdf/{p['id']}" if i % 2 == 0 else f"https://example.org/pdf/{p['id']}.pdf",
+            "content": f"{p['year']} {p['abstract']}",
+        }
+        for i, p in enumerate(papers)
+    ]}
+
+
+def semantic_scholar_json(papers):
+    return {"total": len(papers), "data": [
+        {
+            "paperId": hashlib.sha1(p["id"].encode()).hexdigest(),
+            "title": p["title"],
+            "abstract": p["abstract"],
+            "authors": [{"name": a} for a in p["authors"]],
+            "year": p["year"],
+            "venue": p["venue"],
+            "citationCount": p["citations"],
+            "url": f"https://www.semanticscholar.org/paper/{p['id']}",
+            "externalIds": {"ArXiv": p["id"]},
+        }
+        for p in papers
+    ]}
+
+
+UNKNOWN_SHARE = 0.15  # batch ids the stand-in answers with null, like papers Semantic Scholar lacks
+
+
+def semantic_scholar_batch_json(ids):
+    """One record per "ARXIV:..." / "DOI:..." / "URL:..." id, null for UNKNOWN_SHARE of them."""
+    records = []
+    for paper_id in ids:
+        rng = random.Random(str(paper_id).lower())
+        if rng.random() < UNKNOWN_SHARE:
+            records.append(None)
+            continue
+        kind, _, value = str(paper_id).partition(":")
+        records.append({
+            "paperId": hashlib.sha1(str(paper_id).encode()).hexdigest(),
+            "title": " ".join(rng.sample(VOCAB, 6)).title(),
+            "abstract": " ".join(rng.choice(VOCAB) for _ in range(120)),
+            "year": rng.randint(2015, 2026),
+            "venue": rng.choice(["NeurIPS", "ICML", "ICLR", "Nature", "CVPR"]),
+            "citationCount": int(rng.paretovariate(1.2)) - 1,
+            "externalIds": {"ArXiv": value} if kind.upper() == "ARXIV" else ({"DOI": value} if kind.upper() == "DOI" else {}),
+        })
+    return records
+
+
+def ollama_json(user_text):
+    words = [w for w in user_text.lower().split() if w.isalnum() and w not in ("find", "papers", "about", "on", "in", "for")]
+    return {"message": {"role": "assistant", "content": json.dumps({"search_query": " ".join(words) or "research"})}}
+
+
+# Words the fake embedding model treats as one concept, so that paraphrases
+# ("LLM quantization" / "low-bit weight compression") land close together
+CONCEPTS = {
+    "quantization": "quant", "quantized": "quant", "low-bit": "quant", "compression": "quant", "int8": "quant",
+    "llm": "lm", "llms": "lm", "language": "lm", "gpt": "lm",
+    "attention": "attn", "transformer": "attn", "transformers": "attn",
+    "graph": "graph", "gnn": "graph", "gnns": "graph", "message-passing": "graph",
+    "diffusion": "diffusion", "denoising": "diffusion", "score-based": "diffusion",
+}
+EMBED_DIM = 64
+
+
+@functools.lru_cache(maxsize=65536)
+def _concept_vector(concept):
+    rng = random.Random(hashlib.md5(concept.encode()).hexdigest())
+    return [rng.gauss(0, 1) for _ in range(EMBED_DIM)]
+
+
+def ollama_embed_json(texts):
+    """Bag-of-concepts vectors: each word adds its concept's fixed random direction."""
+    vectors = []
+    for text in texts:
+        vector = [0.0] * EMBED_DIM
+        for word in text.lower().replace(",", " ").replace(".", " ").split():
+            for i, x in enumerate(_concept_vector(CONCEPTS.get(word, word))):
+                vector[i] += x
+        vectors.append(vector)
+    return {"model": "fake-embed", "embeddings": vectors}
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True  # headers and body go out as separate writes
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, body, content_type):
+        data = body.encode("utf-8") if isinstance(body, str) else json.dumps(body).encode("utf-8")
+        etag = '"' + hashlib.sha1(data).hexdigest()[:16] + '"'
+        if self.headers.get("If-None-Match") == etag:
+            with self.server.lock:
+                self.server.not_modified += 1
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _reject(self, status, retry_after=None):
+        data = json.dumps({"message": "Too Many Requests" if status == 429 else "Service Unavailable"}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        if retry_after is not None:
+            self.send_header("Retry-After", str(retry_after))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _admit(self, route):
+        """None if the request may be served, else (status, retry_after) to reject it with."""
+        rate, burst = (self.server.limits or {}).get(route, (None, 1))
+        with self.server.lock:
+            if rate:
+                tokens, stamp = self.server.buckets.get(route, (burst, time.monotonic()))
+                now = time.monotonic()
+                tokens = min(burst, tokens + (now - stamp) * rate)
+                if tokens < 1:
+                    self.server.buckets[route] = (tokens, now)
+                    self.server.rejected[route] += 1
+                    return 429, math.ceil((1 - tokens) / rate)
+                self.server.buckets[route] = (tokens - 1, now)
+            if self.server.rng.random() < (self.server.errors or {}).get(route, 0):
+                self.server.rejected[route] += 1
+                return 503, None
+        return None
+
+    def _handle(self, payload):
+        url = urlparse(self.path)
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        route = url.path.strip("/")
+        with self.server.lock:
+            self.server.hits[route] += 1
+        rejected = self._admit(route)
+        if rejected:
+            return self._reject(*rejected)
+        delay = self.server.latency
+        if isinstance(delay, dict):
+            delay = delay.get(route, 0)
+        time.sleep(float(params.get("latency", delay or 0)))
+
+        if route == "ollama":
+            user = next((m["content"] for m in payload.get("messages", []) if m.get("role") == "user"), "")
+            return self._send(ollama_json(user), "application/json")
+        if route == "ollama_embed":
+            return self._send(ollama_embed_json(payload.get("input") or []), "application/json")
+        if route == "semantic_scholar/batch":
+            return self._send(semantic_scholar_batch_json(payload.get("ids") or []), "application/json")
+
+        query = params.get("q") or params.get("query") or payload.get("query") or params.get("search_query", "")
+        query = query.replace("all:", "").replace(" paper OR journal OR study filetype:pdf", "")
+        default_n = {
+            "arxiv": int(params.get("max_results", 40)),
+            "scholar": int(params.get("num", 10)),
+            "tavily": int(payload.get("max_results", 10)),
+            "semantic_scholar": int(params.get("limit", 5)),
+        }
+        offset = int(params.get("start") or params.get("offset") or 0)
+        n = max(0, min(int(params.get("n", default_n.get(route, 10))), RESULTS_PER_QUERY - offset))
+        papers = synthetic_papers(query, offset + n, route, fade=True)[offset:]
+        if route == "arxiv":
+            return self._send(arxiv_feed(papers), "application/atom+xml")
+        if route == "scholar":
+            return self._send(scholar_json(papers), "application/json")
+        if route == "tavily":
+            return self._send(tavily_json(papers), "application/json")
+        if route == "semantic_scholar":
+            return self._send(semantic_scholar_json(papers), "application/json")
+        self.send_error(404)
+
+    def do_GET(self):
+        self._handle({})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        try:
+            payload = json.loads(body or b"{}")
+        except ValueError:
+            payload = {}
+        self._handle(payload if isinstance(payload, dict) else {})
+
+
+def start(port=0, latency=0.0, limits=None, errors=None):
+    """Serve in a daemon thread; returns (server, base_url). Use port=0 for a free port.
+
+    `latency` is seconds per response, or a {route: seconds} dict.
+    `limits` is {route: (requests per second, burst)}, `errors` is
+    {route: share of requests answered 503}. server.hits counts requests
+    per route, server.rejected the ones answered 429 or 503,
+    server.not_modified the 304s.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    server.latency = latency
+    server.limits = limits
+    server.errors = errors
+    server.buckets = {}
+    server.rng = random.Random(0)
+    server.rejected = Counter()
+    server.not_modified = 0
+    server.hits = Counter()
+    server.lock = threading.Lock()
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per response")
+    parser.add_argument("--limit", nargs="*", default=[], metavar="ROUTE=RATE",
+                        help="answer 429 beyond RATE requests/s (bursts of 1)")
+    parser.add_argument("--fail", nargs="*", default=[], metavar="ROUTE=SHARE", help="answer SHARE of requests 503")
+    args = parser.parse_args()
+    limits = {route: (float(rate), 1) for route, rate in (item.split("=") for item in args.limit)}
+    errors = {route: float(share) for route, share in (item.split("=") for item in args.fail)}
+    server, base_url = start(args.port, args.latency, limits, errors)
+    print(f"Fake providers on {base_url} (set PROVIDER_BASE_URL={base_url})")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,208 @@
+"""Inverted index and BM25F ranking over every paper stored in memory.db.
+
+corpus_postings maps each term to the papers containing it, with separate
+term frequencies and lengths for title and snippet; corpus_docs keeps one
+row per indexed paper and corpus_stats the collection totals. Inserts and edits of
+`papers` queue the paper in corpus_pending (triggers, see migrations.py),
+and sync() re-tokenizes just those, so the index follows every writer:
+/log_search syncs in its own transaction, lookups sync whatever the UI
+added in between.
+
+BM25F: per-field term frequencies are length-normalized and weighted into
+one pseudo-frequency before the usual saturation,
+
+    tf~ = sum_f w_f * tf_f / (1 - b_f + b_f * len_f / avglen_f)
+    score = sum_t idf_t * tf~ / (K1 + tf~)
+
+with title hits weighing 3x snippet hits, as in search_papers().
+"""
+import math
+import re
+from collections import Counter
+
+import numpy as np
+
+import scoring
+import storage
+
+K1 = 1.2
+FIELDS = ("title", "snippet")
+FIELD_WEIGHTS = {"title": 3.0, "snippet": 1.0}
+FIELD_B = {"title": 0.75, "snippet": 0.75}
+SYNC_CHUNK = 500
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text):
+    """Lowercase word tokens, the same units scoring.py matches in token mode."""
+    return _TOKEN_RE.findall(str(text or "").lower())
+
+
+def query_terms(search_query):
+    """Distinct scoring words of a query (>2 chars, no years), in order."""
+    return list(dict.fromkeys(scoring.scoring_words(search_query, "token")))
+
+
+# ----------------- Index maintenance -----------------
+
+def sync(conn):
+    """Index the papers queued in corpus_pending; call inside a write transaction.
+
+    Returns how many papers were (re)indexed.
+    """
+    ids = [r[0] for r in conn.execute("SELECT paper_id FROM corpus_pending ORDER BY paper_id").fetchall()]
+    for start in range(0, len(ids), SYNC_CHUNK):
+        chunk = ids[start:start + SYNC_CHUNK]
+        marks = ", ".join("?" * len(chunk))
+        conn.execute(f"DELETE FROM corpus_postings WHERE paper_id IN ({marks})", chunk)
+        conn.execute(f"DELETE FROM corpus_docs WHERE paper_id IN ({marks})", chunk)
+        docs, postings = [], []
+        for paper_id, title, snippet in conn.execute(
+            f"SELECT id, title, snippet FROM papers WHERE id IN ({marks})", chunk
+        ).fetchall():
+            title_terms, snippet_terms = Counter(tokenize(title)), Counter(tokenize(snippet))
+            lengths = (sum(title_terms.values()), sum(snippet_terms.values()))
+            docs.append((paper_id, *lengths))
+            postings.extend(
+                (term, paper_id, title_terms[term], snippet_terms[term], *lengths)
+                for term in title_terms.keys() | snippet_terms.keys()
+            )
+        conn.executemany("INSERT INTO corpus_docs (paper_id, title_len, snippet_len) VALUES (?, ?, ?)", docs)
+        conn.executemany(
+            """
+            INSERT INTO corpus_postings (term, paper_id, title_tf, snippet_tf, title_len, snippet_len)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            postings,
+        )
+        conn.execute(f"DELETE FROM corpus_pending WHERE paper_id IN ({marks})", chunk)
+    return len(ids)
+
+
+def sync_pending():
+    """Bring the index up to date from its own connection, if anything is queued."""
+    with storage.connection() as conn:
+        if not conn.execute("SELECT 1 FROM corpus_pending LIMIT 1").fetchone():
+            return 0
+    with storage.transaction() as conn:
+        return sync(conn)
+
+
+# ----------------- BM25F -----------------
+
+def collection_stats(conn, terms):
+    """{docs, title_len, snippet_len, df: {term: n}} for the stored corpus (totals, not means)."""
+    docs, title_len, snippet_len = conn.execute(
+        "SELECT docs, title_len, snippet_len FROM corpus_stats WHERE id = 1"
+    ).fetchone() or (0, 0, 0)
+    df = dict.fromkeys(terms, 0)
+    if terms:
+        df.update(conn.execute(
+            f"""
+            SELECT term, COUNT(*) FROM corpus_postings
+            WHERE term IN ({", ".join("?" * len(terms))})
+            GROUP BY term
+            """,
+            terms,
+        ).fetchall())
+    return {"docs": docs, "title_len": title_len, "snippet_len": snippet_len, "df": df}
+
+
+def _idf(docs, df):
+    return math.log(1 + (docs - df + 0.5) / (df + 0.5))
+
+
+def bm25f(tf, lengths, stats, idf):
+    """BM25F of n documents for one term.
+
+    tf and lengths map each field to an array of n values; stats holds the
+    collection totals. Returns a float64 array.
+    """
+    docs = max(stats["docs"], 1)
+    pseudo = 0.0
+    for field in FIELDS:
+        avg = max(stats[f"{field}_len"] / docs, 1.0)
+        norm = 1 - FIELD_B[field] + FIELD_B[field] * lengths[field] / avg
+        pseudo = pseudo + FIELD_WEIGHTS[field] * tf[field] / norm
+    return idf * pseudo / (K1 + pseudo)
+
+
+def search(conn, search_query, limit=20):
+    """Stored papers ranked by BM25F for `search_query`, best first.
+
+    Each paper carries paper_id and its raw `bm25` score. Reads the index
+    as it is; run sync_pending() first to include unsynced papers.
+    """
+    terms = query_terms(search_query)
+    if not terms:
+        return []
+    stats = collection_stats(conn, [])  # df comes with each posting list
+    ids, contribs = [], []
+    for term in terms:
+        rows = conn.execute(
+            "SELECT paper_id, title_tf, snippet_tf, title_len, snippet_len FROM corpus_postings WHERE term = ?",
+            (term,),
+        ).fetchall()
+        if not rows:
+            continue
+        postings = np.array(rows, dtype=float)
+        ids.append(postings[:, 0])
+        contribs.append(bm25f(
+            {"title": postings[:, 1], "snippet": postings[:, 2]},
+            {"title": postings[:, 3], "snippet": postings[:, 4]},
+            stats,
+            _idf(stats["docs"], len(rows)),
+        ))
+    if not ids:
+        return []
+    paper_ids, inverse = np.unique(np.concatenate(ids).astype(np.int64), return_inverse=True)
+    totals = np.bincount(inverse, weights=np.concatenate(contribs))
+    top = np.argsort(-totals, kind="stable")[:limit]
+
+    ids = [int(paper_ids[i]) for i in top]
+    found = {
+        r[0]: storage.paper_from_row(r[1:])
+        for r in conn.execute(
+            f"SELECT id, {', '.join(storage.PAPER_COLUMNS)} FROM papers WHERE id IN ({', '.join('?' * len(ids))})",
+            ids,
+        ).fetchall()
+    }
+    return [dict(found[pid], paper_id=pid, bm25=float(totals[i])) for pid, i in zip(ids, top) if pid in found]
+
+
+def score_candidates(papers, search_query, stats):
+    """BM25F of in-memory papers (e.g. fresh provider results) against the stored corpus.
+
+    Papers without a paper_id are not in memory.db yet and are counted
+    into the collection statistics, so a fresh term is not treated as
+    unseen. Returns a float64 array aligned with `papers`.
+    """
+    terms = query_terms(search_query)
+    n = len(papers)
+    if not n or not terms:
+        return np.zeros(n)
+    counts = {
+        "title": [Counter(tokenize(p.get("title"))) for p in papers],
+        "snippet": [Counter(tokenize(p.get("snippet") or p.get("abstract"))) for p in papers],
+    }
+    lengths = {f: np.array([sum(c.values()) for c in counts[f]], dtype=float) for f in FIELDS}
+
+    fresh = np.array(["paper_id" not in p for p in papers])
+    merged = {
+        "docs": stats["docs"] + int(fresh.sum()),
+        **{f"{f}_len": stats[f"{f}_len"] + lengths[f][fresh].sum() for f in FIELDS},
+    }
+    total = np.zeros(n)
+    for term in terms:
+        tf = {f: np.array([c[term] for c in counts[f]], dtype=float) for f in FIELDS}
+        df = stats["df"].get(term, 0) + int(((tf["title"] + tf["snippet"] > 0) & fresh).sum())
+        total += bm25f(tf, lengths, merged, _idf(merged["docs"], df))
+    return total
+
+
+def lookup(search_query, limit=20):
+    """Sync, then return (stored papers ranked for the query, collection stats for its terms)."""
+    sync_pending()
+    with storage.connection() as conn:
+        return search(conn, search_query, limit), collection_stats(conn, query_terms(search_query))
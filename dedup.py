@@ -0,0 +1,342 @@
+"""Near-duplicate merging for the "Deduplicate papers" stage.
+
+Two results are taken to be the same work when they share an identifier
+(DOI, arXiv id, canonical URL), when their titles agree once version
+markers ("v2", "preprint") are stripped, or when their titles are close by
+MinHash over character 3-gram shingles. A title that only agrees once a
+long enough subtitle is cut off counts like a fuzzy match: it has to pass
+the same year check. LSH
+banding of the signatures proposes candidate pairs, so nothing is compared
+all-pairs; each candidate is confirmed on its estimated similarity.
+
+Every group becomes one record that unions the metadata of its members:
+the best-scored member's fields, the highest citation count, the longest
+real abstract, missing identifiers filled in, and all source links.
+Groups keep the position of their first member, like the node's result
+array. Cost is O(total title length x NUM_HASHES) plus near-linear
+bucketing.
+"""
+import re
+import unicodedata
+
+import numpy as np
+
+import storage
+
+SHINGLE = 3
+NUM_HASHES = 32
+BANDS = 8  # 4 rows per band: pairs above ~0.6 similarity are likely to share a bucket
+SIMILARITY = 0.8  # estimated Jaccard of shingle sets needed to merge a candidate pair
+MAX_YEAR_GAP = 2  # fuzzy matches further apart in year are different works (preprint vs journal is ~1)
+MIN_FUZZY_LENGTH = 16  # shorter normalized titles only merge on exact keys
+MIN_CORE_WORDS = 4  # "Title: subtitle" also keys on "Title" if it is at least this long
+SIGNATURE_BLOCK = 2048  # texts hashed per block; one block's shingles are a few hundred KB
+
+# Multiply-shift hashing: h(x) = ((a * x + b) mod 2**64) >> 32 with odd a
+_rng = np.random.default_rng(20240229)
+_HASH_A = _rng.integers(0, 2 ** 63, NUM_HASHES, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+_HASH_B = _rng.integers(0, 2 ** 63, NUM_HASHES, dtype=np.uint64)
+_SHIFT = np.uint64(32)
+
+# Matched on lowercased titles; surrounding brackets become spaces anyway
+_VERSION_RE = re.compile(r"\b(?:v\d+|preprint|extended (?:version|abstract)|full version|camera[- ]ready|arxiv version)\b")
+_SUBTITLE_RE = re.compile(r"\s*:\s*|\s+[-–—]{1,2}\s+")
+_PLACEHOLDER_RE = re.compile(r"^(?:no (?:abstract|snippet|description)(?: available)?\.?)?$", re.I)
+_BLANK_NON_ALNUM = str.maketrans({chr(i): " " for i in range(128) if not chr(i).isalnum()})
+
+
+def title_text(title):
+    """ASCII-folded, lowercase title with version markers removed: "a b c"."""
+    text = str(title or "")
+    if not text.isascii():
+        text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii")
+    text = text.lower()
+    if _VERSION_RE.search(text):
+        text = _VERSION_RE.sub(" ", text)
+    return " ".join(text.translate(_BLANK_NON_ALNUM).split())
+
+
+def exact_keys(paper, title=None):
+    """Keys that identify a paper outright: identifiers and full title.
+
+    `title` is title_text() of the paper's title, if already computed.
+    """
+    keys = []
+    for prefix, value in (
+        ("doi", storage.paper_doi(paper)),
+        ("arxiv", storage.paper_arxiv_id(paper)),
+        ("url", storage.canonical_url(paper.get("link"))),
+    ):
+        if value:
+            keys.append(f"{prefix}:{value}")
+    title = title_text(paper.get("title")) if title is None else title
+    if not storage.is_untitled(title):
+        keys.append(f"title:{title.replace(' ', '')}")
+    return keys
+
+
+def core_key(paper, title=None):
+    """Key of a long enough main title before a subtitle ("Title: subtitle" -> "Title"), or None.
+
+    Series and follow-ups share main titles, so papers matched on it are
+    subject to the year check of fuzzy matches (see _link_core).
+    """
+    raw = str(paper.get("title") or "")
+    if not _SUBTITLE_RE.search(raw):
+        return None
+    title = title_text(raw) if title is None else title
+    core = title_text(_SUBTITLE_RE.split(raw)[0])
+    if core == title or len(core.split()) < MIN_CORE_WORDS or storage.is_untitled(title):
+        return None
+    return f"title:{core.replace(' ', '')}"
+
+
+# ----------------- MinHash / LSH -----------------
+
+def signatures(texts):
+    """MinHash signatures (len(texts) x NUM_HASHES, uint64) of character shingles.
+
+    Every text must be at least SHINGLE characters long. Texts are hashed
+    in blocks small enough for the temporaries to stay in CPU cache.
+    """
+    if len(texts) > SIGNATURE_BLOCK:
+        return np.concatenate([
+            signatures(texts[start:start + SIGNATURE_BLOCK]) for start in range(0, len(texts), SIGNATURE_BLOCK)
+        ])
+    lengths = np.array([len(t) for t in texts], dtype=np.int64)
+    chars = np.frombuffer("".join(texts).encode("ascii"), dtype=np.uint8).astype(np.uint64)
+    codes = (chars[:-2] << np.uint64(16)) | (chars[1:-1] << np.uint64(8)) | chars[2:]
+    # Drop the shingles that straddle two texts
+    ends = np.cumsum(lengths)
+    keep = np.ones(len(codes), dtype=bool)
+    for back in range(1, SHINGLE):
+        cut = ends - back
+        keep[cut[cut < len(codes)]] = False
+    codes = codes[keep]
+    starts = np.concatenate(([0], np.cumsum(lengths - (SHINGLE - 1))[:-1]))
+
+    sig = np.empty((NUM_HASHES, len(texts)), dtype=np.uint64)
+    for i in range(NUM_HASHES):
+        sig[i] = np.minimum.reduceat((_HASH_A[i] * codes + _HASH_B[i]) >> _SHIFT, starts)
+    return np.ascontiguousarray(sig.T)  # one row per text: pair checks gather whole rows
+
+
+def band_keys(sig):
+    """LSH bucket key of every signature in every band: (n, BANDS) uint64."""
+    rows = NUM_HASHES // BANDS
+    keys = np.zeros((sig.shape[0], BANDS), dtype=np.uint64)
+    for band in range(BANDS):
+        for column in sig[:, band * rows:(band + 1) * rows].T:
+            keys[:, band] = keys[:, band] * np.uint64(0x9E3779B97F4A7C15) + column  # wraps; collisions are re-checked
+    return keys
+
+
+def candidate_pairs(sig):
+    """(i, j) index arrays of texts that share at least one LSH band bucket.
+
+    Within a bucket each text is paired with the one before it, which
+    keeps the pair count linear while chaining the whole bucket together.
+    Pairs found in several bands are returned once.
+    """
+    n = sig.shape[0]
+    pairs = []
+    for key in band_keys(sig).T:
+        order = np.argsort(key, kind="stable")
+        same = key[order][1:] == key[order][:-1]
+        pairs.append(order[:-1][same] * n + order[1:][same])
+    pairs = np.unique(np.concatenate(pairs))
+    return pairs // n, pairs % n
+
+
+def similar_pairs(texts, years=None):
+    """Pairs (i, j) of texts whose estimated shingle Jaccard is at least SIMILARITY.
+
+    `years` (floats, NaN when unknown) vetoes pairs more than MAX_YEAR_GAP apart.
+    """
+    if len(texts) < 2:
+        return []
+    sig = signatures(texts)
+    i, j = candidate_pairs(sig)
+    ok = (sig[i] == sig[j]).mean(axis=1) >= SIMILARITY
+    if years is not None:
+        ok &= ~(np.abs(years[i] - years[j]) > MAX_YEAR_GAP)  # NaN compares False: unknown years pass
+    return list(zip(i[ok].tolist(), j[ok].tolist()))
+
+
+# ----------------- Grouping and merging -----------------
+
+def _find(parent, i):
+    root = i
+    while parent[root] != root:
+        root = parent[root]
+    while parent[i] != root:
+        parent[i], i = root, parent[i]
+    return root
+
+
+def _union(parent, i, j):
+    a, b = _find(parent, i), _find(parent, j)
+    if a != b:
+        parent[max(a, b)] = min(a, b)  # the earliest member stays the root
+
+
+def _link_core(parent, papers, owner, cores, i, title, core):
+    """Union paper i with the earlier papers its main title matches, if their years are close enough.
+
+    A core key meets earlier core keys and the first paper with that full
+    title (`owner`); a full title meets earlier core keys (`cores`, key ->
+    papers). Equal full titles were already merged as exact keys.
+    """
+    matches = list(cores.get(title, ())) if title else []
+    if core:
+        matches += cores.get(core, ())
+        if owner.get(core, i) != i:
+            matches.append(owner[core])
+        cores.setdefault(core, []).append(i)
+    year = _year(papers[i])
+    for j in matches:
+        if not abs(_year(papers[j]) - year) > MAX_YEAR_GAP:  # NaN compares False: unknown years pass
+            _union(parent, j, i)
+
+
+def _title_key(keys):
+    return next((k for k in keys if k.startswith("title:")), None)
+
+
+def duplicate_groups(papers):
+    """Lists of indices into `papers`, one per distinct work, in first-seen order."""
+    parent = list(range(len(papers)))
+    owner, cores = {}, {}
+    fuzzy, fuzzy_ids = [], []
+    for i, p in enumerate(papers):
+        text = title_text(p.get("title"))
+        keys = exact_keys(p, text)
+        for key in keys:
+            if key in owner:
+                _union(parent, owner[key], i)
+            else:
+                owner[key] = i
+        _link_core(parent, papers, owner, cores, i, _title_key(keys), core_key(p, text))
+        if len(text) >= MIN_FUZZY_LENGTH:
+            fuzzy.append(text)
+            fuzzy_ids.append(i)
+    years = np.array([_year(papers[i]) for i in fuzzy_ids])
+    for a, b in similar_pairs(fuzzy, years):
+        _union(parent, fuzzy_ids[a], fuzzy_ids[b])
+
+    groups = {}
+    for i in range(len(papers)):
+        groups.setdefault(_find(parent, i), []).append(i)
+    return list(groups.values())
+
+
+class DuplicateIndex:
+    """duplicate_groups() built up incrementally, for results that arrive in pages.
+
+    add() keys, fingerprints and buckets only the new papers; each one is
+    compared with the last paper seen in each of its LSH buckets, the
+    incremental form of pairing neighbours within a bucket. groups() gives
+    the same kind of groups as duplicate_groups() over everything added.
+    """
+
+    def __init__(self):
+        self.papers = []
+        self._parent = []
+        self._owner = {}
+        self._cores = {}
+        self._buckets = [{} for _ in range(BANDS)]
+        self._sig = np.empty((0, NUM_HASHES), dtype=np.uint64)
+        self._years = np.empty(0)
+        self._fuzzy_ids = []
+
+    def add(self, papers):
+        fuzzy, ids = [], []
+        for p in papers:
+            i = len(self.papers)
+            self.papers.append(p)
+            self._parent.append(i)
+            text = title_text(p.get("title"))
+            keys = exact_keys(p, text)
+            for key in keys:
+                if key in self._owner:
+                    _union(self._parent, self._owner[key], i)
+                else:
+                    self._owner[key] = i
+            _link_core(self._parent, self.papers, self._owner, self._cores, i, _title_key(keys), core_key(p, text))
+            if len(text) >= MIN_FUZZY_LENGTH:
+                fuzzy.append(text)
+                ids.append(i)
+        if not fuzzy:
+            return
+        start = len(self._fuzzy_ids)
+        self._sig = np.concatenate([self._sig, signatures(fuzzy)])
+        self._years = np.concatenate([self._years, [_year(self.papers[i]) for i in ids]])
+        self._fuzzy_ids.extend(ids)
+        for row, keys in enumerate(band_keys(self._sig[start:]).tolist(), start):
+            for bucket, key in zip(self._buckets, keys):
+                other = bucket.get(key)
+                bucket[key] = row
+                if other is not None and self._similar(other, row):
+                    _union(self._parent, self._fuzzy_ids[other], self._fuzzy_ids[row])
+
+    def _similar(self, a, b):
+        if (self._sig[a] == self._sig[b]).mean() < SIMILARITY:
+            return False
+        return not abs(self._years[a] - self._years[b]) > MAX_YEAR_GAP
+
+    def groups(self):
+        """Lists of indices into self.papers, one per distinct work, in first-seen order."""
+        groups = {}
+        for i in range(len(self.papers)):
+            groups.setdefault(_find(self._parent, i), []).append(i)
+        return list(groups.values())
+
+
+def _score(paper):
+    return paper.get("final_score") or 0
+
+
+def _year(paper):
+    m = re.search(r"\b(?:19|20)\d{2}\b", str(paper.get("year") or ""))
+    return float(m.group(0)) if m else np.nan
+
+
+def _citations(paper):
+    try:
+        return int(paper.get("cited_by"))
+    except (TypeError, ValueError):
+        return None
+
+
+def merge_group(members):
+    """One record for a group of duplicates (list of paper dicts, first-seen order)."""
+    best = max(members, key=_score)  # first of equals, as in the node
+    merged = dict(best)
+    if len(members) == 1:
+        return merged
+
+    cited = [c for c in (_citations(p) for p in members) if c is not None]
+    if cited:
+        merged["cited_by"] = max(cited)
+    abstracts = [str(p.get("snippet") or "") for p in members if not _PLACEHOLDER_RE.match(str(p.get("snippet") or ""))]
+    if abstracts:
+        merged["snippet"] = max(abstracts, key=len)
+    for field in ("doi", "arxiv_id", "year", "date", "authors_venue_year"):
+        value = merged.get(field) or next((p[field] for p in members if p.get(field)), None)
+        if value:
+            merged[field] = value
+
+    links, seen = [], set()
+    for p in members:
+        url = storage.canonical_url(p.get("link"))
+        if url and url not in seen:
+            seen.add(url)
+            links.append({"source": p.get("source"), "link": p["link"]})
+    merged["links"] = links
+    merged["duplicates"] = len(members) - 1
+    return merged
+
+
+def merge_duplicates(papers):
+    """Collapse near-duplicates; returns merged records in first-seen order."""
+    return [merge_group([papers[i] for i in group]) for group in duplicate_groups(papers)]
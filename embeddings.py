@@ -0,0 +1,291 @@
+"""Embeddings for semantic re-ranking, kept in a memory-mapped matrix.
+
+Titles and snippets are embedded by a local model (Ollama /api/embed, see
+sources.OllamaEmbedder) and the unit-length float32 vectors are appended to
+a matrix file beside memory.db ("memory.vectors"), which searches map
+read-only. vector_slots maps a hash of each embedded text to its row, so a
+text is embedded once and reused by every later search, fresh provider
+results included. paper_vectors maps stored papers to rows; triggers queue
+new and edited papers in vector_pending (see migrations.py) and sync()
+embeds the queue in batches. A semantic search only maps its own stored
+candidates plus a bounded slice of the queue, so a large backlog is
+worked off over many searches (or ahead of time: python embeddings.py).
+
+Neighbours are found by brute force: one matrix-vector product over the
+mapped rows (BLAS, SIMD), then argpartition for the top k. At 100k papers
+of 768 dimensions that is one sequential ~300 MB scan, mostly page cache.
+
+Vectors of different models are never mixed: when the model or its
+dimension changes, the matrix starts over and every stored paper is
+queued again.
+"""
+import asyncio
+import hashlib
+import os
+from pathlib import Path
+
+import numpy as np
+
+import storage
+
+EMBED_BATCH = int(os.environ.get("EMBED_BATCH", 64))  # texts per embedding request
+EMBED_CHARS = 1000  # of title + snippet; embedding models truncate anyway
+SYNC_CHUNK = 512  # pending papers per commit
+OVERSAMPLE = 4  # top rows fetched per wanted paper (rows of unstored texts are skipped)
+_IN_CHUNK = 500  # host parameters per IN (...) query
+
+
+def vector_path():
+    """The matrix file of the current memory.db."""
+    return Path(storage.DB_PATH).with_suffix(".vectors")
+
+
+def embed_text(paper):
+    """The text embedded for a paper: title, then snippet (or abstract)."""
+    title = str(paper.get("title") or "").strip()
+    snippet = str(paper.get("snippet") or paper.get("abstract") or "").strip()
+    return f"{title}\n{snippet}"[:EMBED_CHARS]
+
+
+def text_key(text):
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
+def _chunks(items, size=_IN_CHUNK):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+# ----------------- Matrix file and slot tables -----------------
+
+def _meta(conn):
+    return conn.execute("SELECT model, dim, rows FROM vector_meta WHERE id = 1").fetchone()
+
+
+def _open_matrix(dim, rows):
+    """Read-only map of the first `rows` rows, or None if the file is shorter (reset meanwhile)."""
+    try:
+        return np.memmap(vector_path(), dtype=np.float32, mode="r", shape=(rows, dim))
+    except (OSError, ValueError):
+        return None
+
+
+def known_slots(conn, keys, model):
+    """{text_key: row} of the texts already embedded by `model`."""
+    meta = _meta(conn)
+    if not keys or meta[0] != model:
+        return {}
+    slots = {}
+    for chunk in _chunks(list(set(keys))):
+        slots.update(conn.execute(
+            f"SELECT text_key, slot FROM vector_slots WHERE text_key IN ({', '.join('?' * len(chunk))})", chunk
+        ).fetchall())
+    return slots
+
+
+def _reset(conn, model, dim):
+    """Start a new matrix for `model`; every stored paper is embedded again."""
+    conn.execute("DELETE FROM vector_slots")
+    conn.execute("DELETE FROM paper_vectors")
+    conn.execute("INSERT OR IGNORE INTO vector_pending (paper_id) SELECT id FROM papers")
+    conn.execute("UPDATE vector_meta SET model = ?, dim = ?, rows = 0 WHERE id = 1", (model, dim))
+    # Unlink rather than truncate: searches may still map the old file
+    vector_path().unlink(missing_ok=True)
+
+
+def store(conn, keys, vectors, model):
+    """Append vectors for `keys` (texts not stored yet); call inside a write transaction.
+
+    Vectors are scaled to unit length, so a dot product is the cosine.
+    The file is written before the rows that point into it are committed.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors = vectors / np.where(norms > 0, norms, 1)
+    stored_model, dim, rows = _meta(conn)
+    if stored_model != model or dim != vectors.shape[1]:
+        _reset(conn, model, vectors.shape[1])
+        rows = 0
+    # Another writer may have embedded some of the same texts meanwhile
+    taken = set(known_slots(conn, keys, model))
+    new = []
+    for i, key in enumerate(keys):
+        if key not in taken:
+            taken.add(key)
+            new.append(i)
+    if not new:
+        return
+    path = vector_path()
+    with open(path, "r+b" if path.exists() else "w+b") as f:
+        f.seek(rows * vectors.shape[1] * 4)
+        f.write(vectors[new].tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+    conn.executemany(
+        "INSERT INTO vector_slots (text_key, slot) VALUES (?, ?)",
+        [(keys[i], rows + n) for n, i in enumerate(new)],
+    )
+    conn.execute("UPDATE vector_meta SET rows = ? WHERE id = 1", (rows + len(new),))
+
+
+def load(keys, model):
+    """Vectors (len(keys) x dim) of embedded texts; raises KeyError for a missing one."""
+    with storage.connection() as conn:
+        slots = known_slots(conn, keys, model)
+        _, dim, rows = _meta(conn)
+    matrix = _open_matrix(dim, rows) if rows else None
+    if matrix is None:
+        raise KeyError("no vectors stored")
+    return np.asarray(matrix[[slots[k] for k in keys]])
+
+
+def nearest(conn, query_vector, model, limit):
+    """Stored papers closest to a unit query vector: [(paper_id, cosine)], best first."""
+    stored_model, dim, rows = _meta(conn)
+    matrix = _open_matrix(dim, rows) if stored_model == model and rows else None
+    if matrix is None or limit <= 0:
+        return []
+    sims = matrix @ np.asarray(query_vector, dtype=np.float32)
+    want = limit * OVERSAMPLE
+    while True:
+        top = np.argpartition(-sims, want - 1)[:want] if want < rows else np.arange(rows)
+        top = top[np.argsort(-sims[top], kind="stable")]
+        found = []
+        for chunk in _chunks(top.tolist()):
+            found.extend(conn.execute(
+                f"SELECT paper_id, slot FROM paper_vectors WHERE slot IN ({', '.join('?' * len(chunk))})", chunk
+            ).fetchall())
+        if len(found) >= limit or want >= rows:
+            found.sort(key=lambda r: -sims[r[1]])
+            return [(paper_id, float(sims[slot])) for paper_id, slot in found[:limit]]
+        want *= 4
+
+
+def lookup(query_vector, model, limit):
+    """Stored papers nearest to the query, each with paper_id and `similarity`."""
+    with storage.connection() as conn:
+        hits = nearest(conn, query_vector, model, limit)
+        if not hits:
+            return []
+        ids = [paper_id for paper_id, _ in hits]
+        found = {
+            r[0]: storage.paper_from_row(r[1:])
+            for r in conn.execute(
+                f"SELECT id, {', '.join(storage.PAPER_COLUMNS)} FROM papers WHERE id IN ({', '.join('?' * len(ids))})",
+                ids,
+            ).fetchall()
+        }
+    return [dict(found[pid], paper_id=pid, similarity=sim) for pid, sim in hits if pid in found]
+
+
+# ----------------- Embedding -----------------
+
+async def embed_batches(texts, embedder, client):
+    """Raw vectors for `texts`, EMBED_BATCH texts per request."""
+    vectors = []
+    for start in range(0, len(texts), EMBED_BATCH):
+        batch = texts[start:start + EMBED_BATCH]
+        response = await client.request(timeout=embedder.timeout, **embedder.build_request(batch))
+        response.raise_for_status()
+        got = embedder.parse(response)
+        if len(got) != len(batch):
+            raise ValueError(f"asked for {len(batch)} embeddings, got {len(got)}")
+        vectors.extend(got)
+    return vectors
+
+
+async def vectors_for(texts, embedder, client):
+    """Unit vectors (len(texts) x dim) for `texts`, embedding only the ones never seen."""
+    keys = [text_key(t) for t in texts]
+
+    def known():
+        with storage.connection() as conn:
+            return known_slots(conn, keys, embedder.model)
+
+    missing = {}
+    slots = await asyncio.to_thread(known)
+    for key, text in zip(keys, texts):
+        if key not in slots:
+            missing.setdefault(key, text)
+    if missing:
+        vectors = await embed_batches(list(missing.values()), embedder, client)
+
+        def write():
+            with storage.transaction() as conn:
+                store(conn, list(missing), vectors, embedder.model)
+
+        await asyncio.to_thread(write)
+    return await asyncio.to_thread(load, keys, embedder.model)
+
+
+def _pending(limit, ids=None):
+    query = """
+        SELECT v.paper_id, p.id IS NOT NULL, p.title, p.snippet FROM vector_pending v
+        LEFT JOIN papers p ON p.id = v.paper_id
+    """
+    with storage.connection() as conn:
+        if ids is None:
+            return conn.execute(query + " ORDER BY v.paper_id LIMIT ?", (limit,)).fetchall()
+        found = []
+        for chunk in _chunks(sorted(set(ids))):
+            found.extend(conn.execute(
+                query + f" WHERE v.paper_id IN ({', '.join('?' * len(chunk))}) ORDER BY v.paper_id", chunk
+            ).fetchall())
+        return found[:limit]
+
+
+def _map_papers(ids, model):
+    """Point paper_vectors at the rows of the papers' current texts and dequeue them.
+
+    A paper edited since it was read keeps its queue entry; one that no
+    longer exists is just dequeued.
+    """
+    with storage.transaction() as conn:
+        marks = ", ".join("?" * len(ids))
+        rows = conn.execute(f"SELECT id, title, snippet FROM papers WHERE id IN ({marks})", ids).fetchall()
+        keys = {pid: text_key(embed_text({"title": t, "snippet": s})) for pid, t, s in rows}
+        slots = known_slots(conn, list(keys.values()), model)
+        mapped = [(pid, slots[key]) for pid, key in keys.items() if key in slots]
+        conn.executemany("INSERT OR REPLACE INTO paper_vectors (paper_id, slot) VALUES (?, ?)", mapped)
+        done = [pid for pid, _ in mapped] + [pid for pid in ids if pid not in keys]
+        for chunk in _chunks(done):
+            conn.execute(f"DELETE FROM vector_pending WHERE paper_id IN ({', '.join('?' * len(chunk))})", chunk)
+        return len(mapped)
+
+
+async def sync(embedder, client, limit=None, ids=None):
+    """Embed the stored papers queued in vector_pending, SYNC_CHUNK per commit.
+
+    `ids` restricts it to those papers; `limit` stops it after about that
+    many, leaving the rest queued. Progress is committed chunk by chunk,
+    so an interrupted sync resumes where it stopped. Returns how many
+    papers were mapped.
+    """
+    done = 0
+    while limit is None or done < limit:
+        pending = await asyncio.to_thread(_pending, SYNC_CHUNK if limit is None else min(SYNC_CHUNK, limit - done), ids)
+        if not pending:
+            return done
+        live = [(t, s) for _, exists, t, s in pending if exists]
+        if live:
+            await vectors_for([embed_text({"title": t, "snippet": s}) for t, s in live], embedder, client)
+        mapped = await asyncio.to_thread(_map_papers, [row[0] for row in pending], embedder.model)
+        if not mapped and live:
+            return done  # everything read was edited meanwhile; the next sync picks it up
+        done += mapped
+    return done
+
+
+if __name__ == "__main__":
+    # Embed every stored paper ahead of the first semantic search (PAPER_SEARCH_DB picks the file)
+    import engine
+    import migrations
+    import sources
+
+    migrations.ensure_schema()
+
+    async def build():
+        async with engine.new_client() as client:
+            return await sync(sources.default_embedder(), client)
+
+    print(f"{storage.DB_PATH}: embedded {asyncio.run(build())} papers into {vector_path()}")
@@ -0,0 +1,788 @@
+"""In-process search engine: the n8n workflow's stages as plain Python.
+
+Stage functions are named after the workflow nodes they reproduce and are
+pure, so each can be profiled or exercised on its own:
+
+    detect_time_intent -> (Ollama) parse_ollama_json -> apply_year_constraint
+    -> four provider adapters, concurrently (sources.py)
+    -> (Semantic Scholar batch lookups) enrich_metadata -> score_papers -> deduplicate_papers -> sort_by_relevance
+
+search_stream() wires them together under a latency budget, re-ranking and
+yielding the merged results each time a provider answers; search() returns
+only the final result and run_search() is its blocking form. The memory API
+exposes them as POST /search/stream and POST /search.
+
+Besides the live providers, a search can draw on every paper already in
+memory.db (corpus_index.py): mode "blend" adds the stored papers that match
+and ranks everything by BM25F, mode "local" answers from memory.db alone.
+With `semantic`, the final ranking also weighs embedding similarity to the
+keywords (embeddings.py), and blend/local draw in the stored papers
+nearest in meaning, not only those sharing words.
+"""
+import asyncio
+import os
+import re
+import sqlite3
+import time
+
+import httpx
+import numpy as np
+
+import corpus_index
+import dedup
+import embeddings
+import enrichment
+import http_cache
+import keywords
+import outbound
+import scoring
+import sources
+
+_YEAR_RE = re.compile(r"\b(19|20)\d{2}\b")
+
+
+# ----------------- Stages -----------------
+
+def detect_time_intent(query):
+    """Port of "Detect time intent": find a 19xx/20xx year in the query."""
+    m = _YEAR_RE.search(str(query or "").lower())
+    return {
+        "original_query": str(query or ""),
+        "has_year_constraint": bool(m),
+        "requested_year": m.group(0) if m else None,
+    }
+
+
+def apply_year_constraint(search_query, requested_year):
+    """Port of "Apply Year Constraint": re-append the requested year to the keywords."""
+    return f"{search_query} {requested_year}" if requested_year else search_query
+
+
+def query_words(search_query):
+    """Scoring keywords: words longer than two characters, years removed."""
+    return [w for w in search_query.lower().split() if len(w) > 2 and not re.fullmatch(r"\d{4}", w)]
+
+
+def smart_score(words, paper, requested_year):
+    """Content score of one paper, as smartScore() in the "Score papers" node.
+
+    Scalar reference for scoring.py's batch version (substring mode).
+    """
+    if not words:
+        return 0.0
+    title = (paper.get("title") or "").lower()
+    abstract = (paper.get("snippet") or paper.get("abstract") or "").lower()
+
+    title_matches = sum(1 for w in words if w in title)
+    abstract_matches = sum(1 for w in words if w in abstract)
+
+    phrase = " ".join(words)
+    phrase_bonus = (0.5 if phrase in title else 0.0) + (0.2 if phrase in abstract else 0.0)
+
+    coverage = (title_matches + abstract_matches) / (len(words) * 2)
+    score = (title_matches * 3 + abstract_matches + phrase_bonus) / (len(words) * 4)
+
+    if requested_year and paper.get("year") and requested_year in str(paper["year"]):
+        score *= 1.5  # year match boost
+
+    return 0.0 if coverage < 0.5 else score
+
+
+def score_papers(papers, search_query, has_year, requested_year, match=None, corpus_stats=None):
+    """Port of "Score papers": optional hard year filter, content score, citation blend.
+
+    Returns a new list; every paper gets content_score and final_score.
+    Scores are computed for the whole set at once by scoring.py; `match`
+    picks token (default) or the node's substring matching. With
+    `corpus_stats` (corpus_index.collection_stats) the content score is
+    BM25F instead, scaled to the best paper of the set, and has no
+    coverage cutoff.
+    """
+    papers = [dict(p) for p in papers]
+    if has_year and requested_year:
+        filtered = [p for p in papers if str(p.get("year")) == str(requested_year)]
+        if filtered:
+            papers = filtered
+        else:
+            # No exact year matches: keep everything, but flag it for the UI
+            for p in papers:
+                p["year_warning"] = True
+
+    if corpus_stats is None:
+        match = match or scoring.DEFAULT_MATCH
+        content = scoring.content_scores(papers, scoring.scoring_words(search_query, match), requested_year, match)
+    else:
+        raw = corpus_index.score_candidates(papers, search_query, corpus_stats)
+        for p, value in zip(papers, raw.tolist()):
+            p["bm25"] = value
+        content = raw / raw.max() if len(raw) and raw.max() > 0 else raw
+        content = scoring.year_boost(papers, content, requested_year)
+    final = scoring.final_scores(papers, content, has_year)
+    for p, c, f in zip(papers, content.tolist(), final.tolist()):
+        p["content_score"] = c
+        p["final_score"] = f
+    return papers
+
+
+def deduplicate_papers(papers):
+    """Port of "Deduplicate papers", extended to near-duplicates (dedup.py).
+
+    Matches on DOI / arXiv id / canonical URL, then title; fuzzy title
+    matches go through MinHash/LSH. Each group is merged into one record
+    built on the best-scored member, with `links` and `duplicates` added.
+    """
+    return dedup.merge_duplicates(papers)
+
+
+def sort_by_relevance(papers):
+    """Port of "Sort by relevance" (stable, best first)."""
+    return sorted(papers, key=lambda p: p.get("final_score") or 0, reverse=True)
+
+
+# ----------------- Pipeline -----------------
+# Providers are queried concurrently on one asyncio loop through a shared
+# httpx connection pool. Each provider has its own deadline, and the whole
+# search has a budget: whatever has arrived when it runs out is scored and
+# returned, and the sources that did not make it are tagged.
+
+SEARCH_BUDGET = float(os.environ.get("SEARCH_BUDGET", 20.0))  # seconds, whole search
+SEARCH_MODES = ("live", "blend", "local")
+CORPUS_RESULTS = int(os.environ.get("CORPUS_RESULTS", 50))  # stored papers drawn into blend/local
+SEMANTIC_WEIGHT = float(os.environ.get("SEMANTIC_WEIGHT", 0.5))  # share of similarity in a semantic ranking
+SEMANTIC_SYNC = int(os.environ.get("SEMANTIC_SYNC", 64))  # queued papers a semantic search embeds beyond its own
+AUXILIARY_STAGES = ("ollama", "enrichment", "embeddings")  # reported in sources, but never make a search partial
+POOL_LIMITS = httpx.Limits(max_connections=32, max_keepalive_connections=16, keepalive_expiry=60.0)
+
+
+def new_client():
+    """An AsyncClient sized for the provider fan-out; share one per event loop."""
+    return httpx.AsyncClient(limits=POOL_LIMITS, follow_redirects=True)
+
+
+def describe_error(error):
+    """Short, key-free description of a provider failure (URLs may carry API keys)."""
+    if isinstance(error, httpx.HTTPStatusError):
+        return f"HTTP {error.response.status_code}"
+    return type(error).__name__
+
+
+async def _call(client, spec, timeout):
+    response = await client.request(timeout=timeout, **spec)
+    response.raise_for_status()
+    return response
+
+
+def _parse_cached(source, entry, request):
+    parser = source.stream_parser()
+    if parser is None:
+        return source.parse(entry.response(request))
+    return parser.feed(entry.body) + parser.close()
+
+
+async def _fetch_papers(client, source, request, timeout, cached=None):
+    """Send one provider request and parse it; streaming parsers consume the body as it arrives.
+
+    With a `cached` (stale) entry the request is conditional, and a 304
+    answer parses the cached body. A 200 body is cached once it parsed.
+    """
+    store = http_cache.cache.enabled(source.cache_ttl)
+    spec = dict(request)
+    if cached is not None:
+        spec["headers"] = {**(request.get("headers") or {}), **cached.validators()}
+    parser = source.stream_parser()
+    async with client.stream(timeout=timeout, **spec) as response:
+        if response.status_code == 304 and cached is not None:
+            await asyncio.to_thread(http_cache.cache.refresh, source.name, cached, response.headers)
+            return _parse_cached(source, cached, request)
+        response.raise_for_status()
+        if parser is None:
+            body = await response.aread()
+            papers = source.parse(response)
+        else:
+            # Chunks are only kept for the cache; otherwise each one is dropped once parsed
+            chunks, papers = [] if store else None, []
+            async for chunk in response.aiter_bytes():
+                if chunks is not None:
+                    chunks.append(chunk)
+                papers.extend(parser.feed(chunk))
+            papers.extend(parser.close())
+            body = b"".join(chunks) if chunks is not None else None
+    if store:
+        try:
+            await asyncio.to_thread(http_cache.cache.put, source.name, request, body, response.headers)
+        except sqlite3.Error as e:
+            print(f"HTTP cache write failed: {e}")
+    return papers
+
+
+async def _cached_fetch(client, source, request, deadline):
+    """Answer from the HTTP cache if fresh, else fetch through outbound.scheduler."""
+    cached = None
+    if http_cache.cache.enabled(source.cache_ttl):
+        try:
+            cached = await asyncio.to_thread(http_cache.cache.get, source.name, request, source.cache_ttl)
+        except sqlite3.Error:
+            cached = None
+        if cached is not None and cached.fresh:
+            return _parse_cached(source, cached, request)
+        if http_cache.cache.mode == "offline":
+            raise LookupError(f"{source.name}: request not in the offline HTTP cache")
+    return await outbound.scheduler.call(
+        source, request, lambda: _fetch_papers(client, source, request, deadline, cached), deadline
+    )
+
+
+async def extract_keywords(query, client, extractor=None, timeout=None, memo=None):
+    """Ollama keyword extraction; falls back to the node's crude cleaning if Ollama fails.
+
+    Keyword-only queries and queries seen before are answered without
+    Ollama (keywords.py). Returns (keywords, error, origin) with origin
+    "rule", "cache", "ollama" or "fallback".
+    """
+    extractor = extractor or sources.default_extractor()
+    memo = memo or keywords.memo
+    try:
+        found, origin = await memo.cached(query, extractor.model)
+    except sqlite3.Error:
+        found, origin = None, None
+    if found:
+        return found, None, origin
+
+    async def fetch():
+        return extractor.parse(await _call(client, extractor.build_request(query), extractor.timeout))
+
+    deadline = min(extractor.timeout, timeout) if timeout is not None else extractor.timeout
+    try:
+        return await asyncio.wait_for(memo.extract(query, extractor.model, fetch), deadline), None, "ollama"
+    except asyncio.TimeoutError:
+        return sources.parse_ollama_json(query), "timeout", "fallback"
+    except (httpx.HTTPError, ValueError) as e:
+        return sources.parse_ollama_json(query), describe_error(e), "fallback"
+
+
+async def fetch_source(source, search_query, client, deadline=None, offset=0, limit=None):
+    """Query one provider (one page) within its deadline. Returns (papers, status, error).
+
+    A fresh copy in the HTTP cache (http_cache.py) answers without any
+    request. Otherwise the request goes through outbound.scheduler: it
+    waits for the provider's rate limit, shares the upstream call with
+    identical requests in flight, and is retried on 429/5xx while the
+    deadline allows.
+    """
+    deadline = source.timeout if deadline is None else min(source.timeout, deadline)
+    request = source.build_request(search_query, offset, limit)
+    try:
+        papers = await asyncio.wait_for(_cached_fetch(client, source, request, deadline), deadline)
+        # Coalesced callers share the parsed papers; each search gets its own dicts
+        return [dict(p) for p in papers], "ok", None
+    except asyncio.TimeoutError:
+        return [], "timeout", f"no answer within {deadline:.1f}s"
+    except outbound.Throttled as e:
+        return [], "throttled", str(e)
+    except LookupError as e:
+        return [], "error", str(e)
+    except (httpx.HTTPError, ValueError) as e:
+        return [], "error", describe_error(e)
+    except (AttributeError, TypeError, KeyError) as e:
+        # The body parsed but has the wrong shape (say a list where the parser expects an object)
+        return [], "error", f"unexpected response ({describe_error(e)})"
+
+
+async def iter_sources(search_query, search_sources, client, budget):
+    """Query all providers at once; yield (name, papers, report) as each one settles.
+
+    report is {status, count, error, ms}; status is "ok", "error",
+    "throttled" (rate limit or open circuit, see outbound.py), "timeout"
+    (own deadline passed) or "late" (still running when the
+    `budget` seconds ran out; cancelled and yielded last).
+    """
+    started = time.perf_counter()
+    tasks = {
+        asyncio.ensure_future(fetch_source(source, search_query, client, budget)): source
+        for source in search_sources
+    }
+    pending = set(tasks)
+    try:
+        while pending:
+            remaining = budget - (time.perf_counter() - started)
+            if remaining <= 0:
+                break
+            done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            ms = round((time.perf_counter() - started) * 1000, 2)
+            for task in done:
+                found, status, error = task.result()
+                yield tasks[task].name, found, {"status": status, "count": len(found), "error": error, "ms": ms}
+        ms = round((time.perf_counter() - started) * 1000, 2)
+        for task in pending:
+            task.cancel()
+            error = f"cut off by the {budget:.1f}s search budget"
+            yield tasks[task].name, [], {"status": "late", "count": 0, "error": error, "ms": ms}
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+
+# ----------------- Deep search -----------------
+# A deep search pages through every provider at once. Each page is scored
+# and fingerprinted once as it lands (IncrementalRanking), and a provider
+# stops when it runs dry, reaches its candidate budget, or its pages stop
+# reaching the head of the ranking (score plateau).
+
+DEEP_SEARCH_BUDGET = float(os.environ.get("DEEP_SEARCH_BUDGET", 45.0))  # seconds, whole deep search
+DEEP_CANDIDATES = int(os.environ.get("DEEP_CANDIDATES", 300))  # results paged in per provider
+DEEP_HEAD = 100  # the part of the ranking a page has to reach to count as progress
+PLATEAU_YIELD = 0.1  # share of a page that must reach the head for progress
+PLATEAU_PAGES = 2  # pages in a row without progress before a provider is stopped
+
+
+class IncrementalRanking:
+    """score_papers -> deduplicate_papers -> sort_by_relevance, maintained page by page.
+
+    add() computes content scores and duplicate fingerprints for the new
+    papers only; ranked() redoes just the set-wide parts (year filter,
+    BM25F scaling, citation scale) as vector operations and merges the
+    duplicate groups. With corpus_stats, each page is scored by BM25F
+    against the stored corpus plus the page itself.
+    """
+
+    def __init__(self, intent, search_query, corpus_stats=None, match=None):
+        self.intent = intent
+        self.search_query = search_query
+        self.stats = corpus_stats
+        self.match = match or scoring.DEFAULT_MATCH
+        self.words = scoring.scoring_words(search_query, self.match)
+        self.dups = dedup.DuplicateIndex()
+        self.content = np.empty(0)
+
+    def add(self, papers):
+        """Score and fingerprint one page; returns its content scores (BM25F: unscaled)."""
+        papers = [dict(p) for p in papers]
+        if self.stats is None:
+            raw = scoring.content_scores(papers, self.words, self.intent["requested_year"], self.match)
+        else:
+            raw = corpus_index.score_candidates(papers, self.search_query, self.stats)
+            for p, value in zip(papers, raw.tolist()):
+                p["bm25"] = value
+        self.content = np.concatenate([self.content, raw])
+        self.dups.add(papers)
+        return raw
+
+    def head_score(self, k=DEEP_HEAD):
+        """Content score of the k-th best paper so far; -inf while there are fewer."""
+        if len(self.content) < k:
+            return -np.inf
+        return np.partition(self.content, -k)[-k]
+
+    def ranked(self):
+        papers = self.dups.papers
+        if not papers:
+            return []
+        has_year, year = self.intent["has_year_constraint"], self.intent["requested_year"]
+        keep = np.ones(len(papers), dtype=bool)
+        if has_year and year:
+            in_year = np.array([str(p.get("year")) == str(year) for p in papers])
+            if in_year.any():
+                keep = in_year
+                for p in papers:
+                    p.pop("year_warning", None)  # set while no page had a match yet
+            else:
+                # No exact year matches: keep everything, but flag it for the UI
+                for p in papers:
+                    p["year_warning"] = True
+
+        subset = [p for p, k in zip(papers, keep) if k]
+        content = self.content[keep]
+        if self.stats is not None:
+            content = content / content.max() if len(content) and content.max() > 0 else content
+            content = scoring.year_boost(subset, content, year)
+        final = scoring.final_scores(subset, content, has_year)
+        for p, c, f in zip(subset, content.tolist(), final.tolist()):
+            p["content_score"] = c
+            p["final_score"] = f
+
+        merged = []
+        for group in self.dups.groups():
+            members = [papers[i] for i in group if keep[i]]
+            if members:
+                merged.append(dedup.merge_group(members))
+        return sort_by_relevance(merged)
+
+
+async def _page_source(source, search_query, client, started, budget, candidates, stop, pages):
+    """Page through one provider, putting (name, papers, report) on `pages` per page.
+
+    The last item for a provider has papers None and its final report:
+    {status, count, pages, error, ms, stopped}, stopped being "exhausted",
+    "budget" (candidate budget), "plateau" (set in `stop` by the caller),
+    "time", or the status of the page that failed after earlier ones.
+    """
+    report = {"status": "ok", "count": 0, "pages": 0, "error": None, "ms": 0.0, "stopped": None}
+    total = min(candidates, source.max_offset or candidates)
+    offset = 0
+    try:
+        while True:
+            if stop.get(source.name):
+                report["stopped"] = stop[source.name]
+                break
+            limit = min(source.max_page_size, total - offset)
+            remaining = budget - (time.perf_counter() - started)
+            if limit <= 0 or remaining <= 0:
+                report["stopped"] = "budget" if limit <= 0 else "time"
+                break
+            found, status, error = await fetch_source(source, search_query, client, remaining, offset, limit)
+            report["ms"] = round((time.perf_counter() - started) * 1000, 2)
+            if status != "ok":
+                if report["pages"]:
+                    report.update(stopped=status, error=error)  # keep what earlier pages brought
+                else:
+                    report.update(status=status, error=error, stopped=status)
+                break
+            report["pages"] += 1
+            report["count"] += len(found)
+            await pages.put((source.name, found, dict(report)))
+            if len(found) < limit or not source.pageable:
+                report["stopped"] = "exhausted"
+                break
+            offset += limit
+    finally:
+        pages.put_nowait((source.name, None, report))
+
+
+async def iter_pages(search_query, search_sources, client, budget, candidates=None, stop=None):
+    """Page through all providers at once; yield (name, papers, report) per page.
+
+    A provider's final report comes last with papers None. Setting
+    stop[name] to a reason stops that provider before its next page.
+    """
+    started = time.perf_counter()
+    candidates = DEEP_CANDIDATES if candidates is None else candidates
+    stop = {} if stop is None else stop
+    pages = asyncio.Queue()
+    tasks = [
+        asyncio.ensure_future(_page_source(source, search_query, client, started, budget, candidates, stop, pages))
+        for source in search_sources
+    ]
+    running = len(tasks)
+    try:
+        while running:
+            name, found, report = await pages.get()
+            if found is None:
+                running -= 1
+            yield name, found, report
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def rank(papers, intent, search_query, corpus_stats=None):
+    """Score, deduplicate and sort a merged paper list; returns (ranked, timings)."""
+    timings = {}
+    t = time.perf_counter()
+    scored = score_papers(
+        papers, search_query, intent["has_year_constraint"], intent["requested_year"], corpus_stats=corpus_stats
+    )
+    timings["score_papers"] = round((time.perf_counter() - t) * 1000, 2)
+
+    t = time.perf_counter()
+    unique = deduplicate_papers(scored)
+    timings["deduplicate_papers"] = round((time.perf_counter() - t) * 1000, 2)
+
+    t = time.perf_counter()
+    ranked = sort_by_relevance(unique)
+    timings["sort_by_relevance"] = round((time.perf_counter() - t) * 1000, 2)
+    return ranked, timings
+
+
+async def lookup_corpus(search_query):
+    """Stored papers matching the keywords and the BM25F statistics for them.
+
+    Returns (papers, stats, report); stats is None if memory.db could not
+    be read, and the search then ranks like a live one.
+    """
+    started = time.perf_counter()
+    try:
+        papers, stats = await asyncio.to_thread(corpus_index.lookup, search_query, CORPUS_RESULTS)
+        status, error = "ok", None
+    except sqlite3.Error as e:
+        papers, stats, status, error = [], None, "error", describe_error(e)
+    ms = round((time.perf_counter() - started) * 1000, 2)
+    return papers, stats, {"status": status, "count": len(papers), "error": error, "ms": ms}
+
+
+def blend_similarity(papers, similarity):
+    """Mix cosine similarity into final_score by SEMANTIC_WEIGHT and re-sort.
+
+    The lexical final score is kept as lexical_score.
+    """
+    blended = []
+    for p, sim in zip(papers, similarity.tolist()):
+        lexical = p.get("final_score") or 0
+        blended.append(dict(
+            p, similarity=sim, lexical_score=lexical,
+            final_score=(1 - SEMANTIC_WEIGHT) * lexical + SEMANTIC_WEIGHT * max(sim, 0.0),
+        ))
+    return sort_by_relevance(blended)
+
+
+async def enrich_metadata(papers, client, timeout, enricher=None, cache_only=False):
+    """Fill in citation counts, venues and abstracts of the papers that came without (enrichment.py).
+
+    Remembered metadata is applied at once; the rest is requested from
+    Semantic Scholar's batch endpoint through the HTTP cache and
+    outbound.scheduler, within `timeout` seconds. `cache_only` never asks
+    upstream. Returns (papers, report); report["count"] is the number of
+    papers enriched, and a failed batch makes the status its failure.
+    """
+    started = time.perf_counter()
+    enricher = enricher or sources.default_enricher()
+    deadline = min(enricher.timeout, timeout)
+
+    async def fetch(ids):
+        request = enricher.build_request(ids)
+        return await asyncio.wait_for(_cached_fetch(client, enricher, request, deadline), deadline)
+
+    status, error = "ok", None
+    try:
+        papers, count, errors = await enrichment.cache.enrich(papers, None if cache_only or deadline <= 0 else fetch)
+    except sqlite3.Error as e:
+        count, errors = 0, [e]
+    if errors:
+        e = errors[0]
+        if isinstance(e, asyncio.TimeoutError):
+            status, error = "timeout", f"no answer within {deadline:.1f}s"
+        elif isinstance(e, outbound.Throttled):
+            status, error = "throttled", str(e)
+        else:
+            status, error = "error", str(e) if isinstance(e, LookupError) else describe_error(e)
+    ms = round((time.perf_counter() - started) * 1000, 2)
+    return papers, {"status": status, "count": count, "error": error, "ms": ms}
+
+
+async def semantic_rerank(merged, ranked, intent, search_query, keywords_text, stats, client, embedder, mode):
+    """Re-rank `ranked` by embedding similarity to `keywords_text`.
+
+    In blend/local mode the stored papers nearest to the keywords join
+    the merged set first. Before that, the stored candidates still queued
+    for embedding are embedded, plus up to SEMANTIC_SYNC more of the queue,
+    so a large backlog never lands on one search's budget. Only texts
+    never embedded before reach the model.
+    """
+    if mode == "live" and not ranked:
+        return ranked
+    query_vector = (await embeddings.vectors_for([keywords_text], embedder, client))[0]
+    if mode != "live":
+        stored = [p["paper_id"] for p in merged if "paper_id" in p]
+        if stored:
+            await embeddings.sync(embedder, client, ids=stored)
+        await embeddings.sync(embedder, client, limit=SEMANTIC_SYNC)
+        nearby = await asyncio.to_thread(embeddings.lookup, query_vector, embedder.model, CORPUS_RESULTS)
+        have = {p.get("paper_id") for p in merged}
+        extra = [p for p in nearby if p["paper_id"] not in have]
+        if extra:
+            ranked, _ = rank(merged + extra, intent, search_query, stats)
+    if not ranked:
+        return ranked
+    vectors = await embeddings.vectors_for([embeddings.embed_text(p) for p in ranked], embedder, client)
+    return blend_similarity(ranked, vectors @ query_vector)
+
+
+async def search_stream(query, search_sources=None, extractor=None, client=None, budget=SEARCH_BUDGET, top_k=None,
+                        mode="live", semantic=False, embedder=None, deep=False):
+    """Run the workflow for one query, yielding progress events as results arrive.
+
+    Events are dicts with an "event" key:
+      "keywords" - {search_query, keywords_from, has_year_constraint, requested_year}
+      "source"   - one provider settled: {source, report, papers, sources}
+                   where `papers` is the merged set re-ranked so far
+      "done"     - the search() result (full ranked list, partial, timings)
+    `top_k` trims the papers carried by "source" events. In "blend" and
+    "local" mode (see SEARCH_MODES) the stored papers arrive first, as
+    source "memory"; "local" skips Ollama and the providers altogether.
+    Once the providers are in, papers without citation counts are enriched
+    (enrich_metadata; "local" uses remembered metadata only) and "done"
+    ranks them again; sources["enrichment"] reports it.
+    With `semantic` only "done" carries the similarity re-rank; if the
+    embedder fails or the budget is spent, the lexical ranking stands and
+    sources["embeddings"] says why.
+
+    With `deep`, every provider is paged through (iter_pages) until it runs
+    dry, reaches DEEP_CANDIDATES results, or PLATEAU_PAGES pages in a row
+    bring less than PLATEAU_YIELD of their papers into the top DEEP_HEAD; "source" events then come per
+    page with a `page` number, and a provider's report says why it
+    `stopped`.
+    """
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"unknown search mode {mode!r}")
+    if client is None:
+        async with new_client() as own_client:
+            async for event in search_stream(
+                query, search_sources, extractor, own_client, budget, top_k, mode, semantic, embedder, deep
+            ):
+                yield event
+        return
+
+    search_sources = sources.default_sources() if search_sources is None else search_sources
+    started = time.perf_counter()
+    timings = {}
+
+    t = time.perf_counter()
+    intent = detect_time_intent(query)
+    timings["detect_time_intent"] = round((time.perf_counter() - t) * 1000, 2)
+
+    t = time.perf_counter()
+    remaining = budget - (time.perf_counter() - started)
+    if mode == "local":
+        # No Ollama round trip; BM25F weighs the words itself
+        extracted, ollama_error, origin = " ".join(_YEAR_RE.sub(" ", intent["original_query"]).split()), None, "rule"
+    else:
+        extracted, ollama_error, origin = await extract_keywords(intent["original_query"], client, extractor, remaining)
+    search_query = apply_year_constraint(extracted, intent["requested_year"])
+    timings["extract_keywords"] = round((time.perf_counter() - t) * 1000, 2)
+    yield {
+        "event": "keywords",
+        "search_query": search_query,
+        "keywords_from": origin,
+        "has_year_constraint": intent["has_year_constraint"],
+        "requested_year": intent["requested_year"],
+    }
+
+    # Re-rank the merged set on every arrival: the citation scale and the
+    # year filter depend on everything seen so far
+    merged, report, ranked, rank_timings, stats = [], {}, [], {}, None
+    if mode != "live":
+        stored, stats, report["memory"] = await lookup_corpus(search_query)
+        timings["lookup_corpus"] = report["memory"]["ms"]
+        merged.extend(stored)
+        if stored:
+            ranked, rank_timings = rank(merged, intent, search_query, stats)
+        yield {
+            "event": "source",
+            "source": "memory",
+            "report": report["memory"],
+            "papers": ranked[:top_k] if top_k else ranked,
+            "sources": dict(report),
+        }
+
+    t = time.perf_counter()
+    remaining = budget - (time.perf_counter() - started)
+    live_sources = [] if mode == "local" else search_sources
+    if deep:
+        ranking, stop, flat, ranking_ms = IncrementalRanking(intent, search_query, stats), {}, {}, 0.0
+        ranking.add(merged)
+        async for name, found, info in iter_pages(search_query, live_sources, client, remaining, stop=stop):
+            report[name] = info
+            if found:
+                r = time.perf_counter()
+                head = ranking.head_score()
+                scores = ranking.add(found)
+                ranked = ranking.ranked()
+                ranking_ms += time.perf_counter() - r
+                merged.extend(found)
+                # Plateau: this provider's pages hardly reach the head of the ranking any more
+                flat[name] = flat.get(name, 0) + 1 if (scores > head).mean() < PLATEAU_YIELD else 0
+                if flat[name] >= PLATEAU_PAGES:
+                    stop[name] = "plateau"
+            yield {
+                "event": "source",
+                "source": name,
+                "page": info["pages"],
+                "report": info,
+                "papers": ranked[:top_k] if top_k else ranked,
+                "sources": dict(report),
+            }
+        timings["fetch"] = round((time.perf_counter() - t) * 1000, 2)
+        timings["incremental_rank"] = round(ranking_ms * 1000, 2)
+    else:
+        async for name, found, info in iter_sources(search_query, live_sources, client, remaining):
+            report[name] = info
+            if found:
+                merged.extend(found)
+                ranked, rank_timings = rank(merged, intent, search_query, stats)
+            yield {
+                "event": "source",
+                "source": name,
+                "report": info,
+                "papers": ranked[:top_k] if top_k else ranked,
+                "sources": dict(report),
+            }
+        timings["fetch"] = round((time.perf_counter() - t) * 1000, 2)
+        timings.update(rank_timings or rank([], intent, search_query, stats)[1])
+
+    if enrichment.ENABLED and merged:
+        # Citation counts for arXiv/Tavily papers change the citation blend,
+        # so the merged set is ranked once more
+        remaining = budget - (time.perf_counter() - started)
+        merged, report["enrichment"] = await enrich_metadata(merged, client, remaining, cache_only=mode == "local")
+        timings["enrich_metadata"] = report["enrichment"]["ms"]
+        if report["enrichment"]["count"]:
+            ranked, rank_timings = rank(merged, intent, search_query, stats)
+            timings.update(rank_timings)
+
+    if semantic:
+        t = time.perf_counter()
+        remaining = budget - (time.perf_counter() - started)
+        embedder = embedder or sources.default_embedder()
+        error = None
+        try:
+            if remaining <= 0:
+                raise asyncio.TimeoutError
+            ranked = await asyncio.wait_for(
+                semantic_rerank(merged, ranked, intent, search_query, extracted, stats, client, embedder, mode),
+                remaining,
+            )
+        except asyncio.TimeoutError:
+            error = "timeout"
+        except (httpx.HTTPError, ValueError, KeyError, OSError, sqlite3.Error) as e:
+            error = describe_error(e)
+        timings["semantic_rerank"] = round((time.perf_counter() - t) * 1000, 2)
+        if error:
+            report["embeddings"] = {"status": "error", "count": 0, "error": error, "ms": timings["semantic_rerank"]}
+
+    if ollama_error:
+        report["ollama"] = {"status": "error", "count": 0, "error": ollama_error, "ms": timings["extract_keywords"]}
+
+    yield {
+        "event": "done",
+        "query": intent["original_query"],
+        "search_query": search_query,
+        "has_year_constraint": intent["has_year_constraint"],
+        "requested_year": intent["requested_year"],
+        "mode": mode,
+        "keywords_from": origin,
+        "semantic": semantic,
+        "deep": deep,
+        "papers": ranked,
+        "sources": report,
+        "partial": any(r["status"] != "ok" for name, r in report.items() if name not in AUXILIARY_STAGES),
+        "timings": timings,
+    }
+
+
+async def search(query, search_sources=None, extractor=None, client=None, budget=SEARCH_BUDGET, mode="live",
+                 semantic=False, embedder=None, deep=False):
+    """Run the whole workflow for one user query within `budget` seconds.
+
+    Returns {query, search_query, has_year_constraint, requested_year,
+    mode, keywords_from, semantic, deep, papers, sources, partial, timings}: `papers` is
+    the full ranked list, `keywords_from` says how the keywords were
+    obtained (see extract_keywords), `sources` is the per-provider report
+    of iter_sources(), `partial` is True when any provider is missing,
+    `timings` holds stage durations in ms (ranking stages: the last
+    re-rank).
+    """
+    result = None
+    async for event in search_stream(
+        query, search_sources, extractor, client, budget, mode=mode, semantic=semantic, embedder=embedder, deep=deep
+    ):
+        result = event
+    result.pop("event")
+    return result
+
+
+def run_search(query, search_sources=None, extractor=None, budget=SEARCH_BUDGET, mode="live", semantic=False,
+               deep=False):
+    """Blocking wrapper around search() for scripts; uses a throwaway client."""
+    return asyncio.run(search(query, search_sources, extractor, budget=budget, mode=mode, semantic=semantic, deep=deep))
@@ -0,0 +1,255 @@
+"""Metadata enrichment: citations, venues and abstracts from Semantic Scholar.
+
+arXiv and Tavily results come without citation counts, so the citation
+blend of "Score papers" only ever helped Scholar and Semantic Scholar
+papers. Before the final ranking, every candidate without a count is
+looked up by its identifiers (DOI, arXiv id, or a landing page Semantic
+Scholar resolves) through the batch endpoint, BATCH_SIZE ids per request
+(sources.SemanticScholarBatchSource).
+
+Answers are remembered in memory.db (paper_metadata) under each of the
+paper's identifiers and its normalized title, so a paper seen before costs
+no request, and a title-only result (most of Tavily's) is enriched once
+any copy of it with an identifier was resolved. Entries are refreshed
+after METADATA_TTL; ids Semantic Scholar does not know are asked again
+after MISSING_TTL, since new preprints take a while to be indexed. A stale
+entry is used while it is being refreshed, and kept if the refresh fails.
+"""
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+
+import sources
+import storage
+
+ENABLED = os.environ.get("ENRICH_METADATA", "1") != "0"
+BATCH_SIZE = int(os.environ.get("ENRICH_BATCH", 100))  # ids per batch request (the endpoint takes up to 500)
+METADATA_TTL = float(os.environ.get("METADATA_TTL", 7 * 86400))  # seconds before a resolved paper is refreshed
+MISSING_TTL = 86400.0  # seconds before an unknown id is asked again
+MAX_ENTRIES = 200_000
+_LOOKUP_CHUNK = 500  # bound parameters per SELECT
+# Landing pages the batch endpoint accepts as URL: ids (besides arXiv, which has its own form)
+_URL_HOSTS = ("semanticscholar.org", "aclanthology.org", "aclweb.org", "dl.acm.org", "biorxiv.org")
+_PLACEHOLDER_SNIPPETS = {"", "No abstract", "No snippet"}
+
+
+def paper_ids(paper):
+    """Cache keys of a paper's identifiers, best first: "doi:...", "arxiv:...", "url:..."."""
+    keys = []
+    doi = storage.paper_doi(paper)
+    if doi:
+        keys.append("doi:" + doi)
+    arxiv_id = storage.paper_arxiv_id(paper)
+    if arxiv_id:
+        keys.append("arxiv:" + arxiv_id)
+    url = storage.canonical_url(paper.get("link"))
+    if url and not arxiv_id and url.split("/")[0].endswith(_URL_HOSTS):
+        keys.append("url:" + url)
+    return keys
+
+
+def batch_id(key):
+    """Semantic Scholar's form of a cache key: "arxiv:2106.15928" -> "ARXIV:2106.15928"."""
+    kind, _, value = key.partition(":")
+    return f"URL:https://{value}" if kind == "url" else f"{kind.upper()}:{value}"
+
+
+def needs_metadata(paper):
+    """Papers without a citation count, other than Semantic Scholar's own (it had none to give)."""
+    return paper.get("source") != "semantic_scholar" and paper.get("cited_by") is None
+
+
+def apply(paper, record):
+    """Copy of `paper` with the gaps filled from a batch record; provider fields are kept."""
+    paper = dict(paper, enriched=True)
+    if record.get("cited_by") is not None:
+        paper["cited_by"] = record["cited_by"]
+    if record.get("venue"):
+        paper.setdefault("venue", record["venue"])
+    if record.get("year") and not paper.get("year"):
+        paper["year"] = record["year"]
+    if not paper.get("authors_venue_year") and record.get("venue"):
+        paper["authors_venue_year"] = " - ".join(x for x in (record["venue"], paper.get("year")) if x)
+    if record.get("abstract"):
+        paper["abstract"] = record["abstract"]
+        if str(paper.get("snippet") or "").strip() in _PLACEHOLDER_SNIPPETS:
+            limit = sources.SNIPPET_CHARS
+            paper["snippet"] = record["abstract"][:limit] + "..." if len(record["abstract"]) > limit else record["abstract"]
+    for field in ("doi", "arxiv_id"):
+        if record.get(field) and not paper.get(field):
+            paper[field] = record[field]
+    return paper
+
+
+class MetadataCache:
+    """paper_metadata lookups and writes, with hit/stale/miss counters."""
+
+    def __init__(self, ttl=METADATA_TTL, missing_ttl=MISSING_TTL, max_entries=MAX_ENTRIES):
+        self.ttl = ttl
+        self.missing_ttl = missing_ttl
+        self.max_entries = max_entries
+        self.counts = dict.fromkeys(("hits", "stale", "misses", "requested", "unknown"), 0)
+        self._lock = threading.Lock()
+
+    def _count(self, **deltas):
+        with self._lock:
+            for what, n in deltas.items():
+                self.counts[what] += n
+
+    def lookup(self, conn, keys, title_keys=()):
+        """({key: (record or None, fresh)}, {title_key: record}) for the keys that have a row."""
+        by_key, by_title = {}, {}
+        now = time.time()
+        keys, title_keys = list(dict.fromkeys(keys)), list(dict.fromkeys(title_keys))
+        for start in range(0, len(keys), _LOOKUP_CHUNK):
+            chunk = keys[start:start + _LOOKUP_CHUNK]
+            for row in conn.execute(
+                "SELECT id_key, found, fetched_at, title, cited_by, venue, year, abstract, doi, arxiv_id "
+                f"FROM paper_metadata WHERE id_key IN ({', '.join('?' * len(chunk))})",
+                chunk,
+            ):
+                ttl = self.ttl if row[1] else self.missing_ttl
+                by_key[row[0]] = (_record(row[3:]) if row[1] else None, now - row[2] < ttl)
+        for start in range(0, len(title_keys), _LOOKUP_CHUNK):
+            chunk = title_keys[start:start + _LOOKUP_CHUNK]
+            for row in conn.execute(
+                "SELECT title_key, title, cited_by, venue, year, abstract, doi, arxiv_id "
+                f"FROM paper_metadata WHERE found = 1 AND title_key IN ({', '.join('?' * len(chunk))})",
+                chunk,
+            ):
+                by_title[row[0]] = _record(row[1:])
+        return by_key, by_title
+
+    def remember(self, conn, resolved):
+        """Store (key, record or None) answers, each record also under its DOI and arXiv id."""
+        now = time.time()
+        rows = []
+        for key, record in resolved:
+            if record is None:
+                rows.append((key, None, 0, None, None, None, None, None, None, None, now))
+                continue
+            title_key = None if storage.is_untitled(record["title"]) else storage.normalize_title(record["title"])
+            values = (title_key, 1, record["title"], record["cited_by"], record["venue"], record["year"],
+                      record["abstract"], record["doi"], record["arxiv_id"], now)
+            aliases = {key}
+            if record["doi"]:
+                aliases.add("doi:" + record["doi"].lower())
+            if record["arxiv_id"]:
+                aliases.add("arxiv:" + record["arxiv_id"].lower())
+            rows.extend((alias, *values) for alias in sorted(aliases))
+        conn.executemany(
+            """
+            INSERT OR REPLACE INTO paper_metadata
+                (id_key, title_key, found, title, cited_by, venue, year, abstract, doi, arxiv_id, fetched_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            rows,
+        )
+        conn.execute(
+            """
+            DELETE FROM paper_metadata WHERE rowid IN (
+                SELECT rowid FROM paper_metadata ORDER BY fetched_at DESC LIMIT -1 OFFSET ?
+            )
+            """,
+            (self.max_entries,),
+        )
+
+    def clear(self, conn):
+        conn.execute("DELETE FROM paper_metadata")
+        with self._lock:
+            self.counts = dict.fromkeys(self.counts, 0)
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counts, ttl=self.ttl, max_entries=self.max_entries)
+
+    # ----------------- Async front end -----------------
+
+    async def enrich(self, papers, fetch=None, batch_size=None):
+        """Enrich the papers that need it; returns (papers, enriched count, errors).
+
+        `fetch(ids)` is a coroutine function answering one batch request
+        (a list of Semantic Scholar ids) with one record or None per id;
+        without it only remembered metadata is used. Failed batches leave
+        their papers as they were (or with their stale metadata) and are
+        returned as the list of exceptions.
+        """
+        wanted = {i: paper_ids(p) for i, p in enumerate(papers) if needs_metadata(p)}
+        if not wanted:
+            return papers, 0, []
+        titles = {i: storage.normalize_title(papers[i].get("title")) for i in wanted
+                  if not storage.is_untitled(papers[i].get("title"))}
+
+        def read():
+            with storage.connection() as conn:
+                return self.lookup(conn, [k for keys in wanted.values() for k in keys], titles.values())
+
+        by_key, by_title = await asyncio.to_thread(read)
+        records, ask = {}, {}
+        hits = stale = misses = 0
+        for i, keys in wanted.items():
+            known = next((by_key[k] for k in keys if k in by_key), None)
+            if known is not None:
+                if known[0] is not None:
+                    records[i] = known[0]
+                if known[1]:
+                    hits += 1
+                    continue
+                stale += 1
+            elif titles.get(i) in by_title:
+                records[i] = by_title[titles[i]]
+                hits += 1
+                continue
+            else:
+                misses += 1
+            if keys:
+                ask.setdefault(keys[0], []).append(i)
+        self._count(hits=hits, stale=stale, misses=misses)
+
+        errors = []
+        batch_size = max(batch_size or BATCH_SIZE, 1)
+        if fetch is not None and ask:
+            # Sorted, so a repeated set of ids is a repeated request (HTTP cache, coalescing)
+            keys = sorted(ask)
+            batches = [keys[n:n + batch_size] for n in range(0, len(keys), batch_size)]
+            answers = await asyncio.gather(*(fetch([batch_id(k) for k in b]) for b in batches), return_exceptions=True)
+            resolved = []
+            for batch, answer in zip(batches, answers):
+                if isinstance(answer, BaseException):
+                    if not isinstance(answer, Exception):
+                        raise answer
+                    errors.append(answer)
+                    continue
+                if len(answer) != len(batch):
+                    errors.append(ValueError(f"batch answered {len(answer)} of {len(batch)} ids"))
+                    continue
+                resolved.extend(zip(batch, answer))
+            self._count(requested=len(resolved), unknown=sum(r is None for _, r in resolved))
+            for key, record in resolved:
+                for i in ask[key]:
+                    if record is not None:
+                        records[i] = record
+            if resolved:
+                def write():
+                    with storage.transaction() as conn:
+                        self.remember(conn, resolved)
+
+                try:
+                    await asyncio.to_thread(write)
+                except sqlite3.Error as e:
+                    print(f"Metadata cache write failed: {e}")
+
+        if not records:
+            return papers, 0, errors
+        papers = [apply(p, records[i]) if i in records else p for i, p in enumerate(papers)]
+        return papers, len(records), errors
+
+
+def _record(row):
+    """Batch record from (title, cited_by, venue, year, abstract, doi, arxiv_id)."""
+    return dict(zip(("title", "cited_by", "venue", "year", "abstract", "doi", "arxiv_id"), row))
+
+
+cache = MetadataCache()
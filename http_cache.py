@@ -0,0 +1,224 @@
+"""On-disk cache of raw provider responses, below the source parsers.
+
+Bodies are stored zlib-compressed in a SQLite file beside memory.db
+("memory.httpcache", or HTTP_CACHE_PATH), keyed by provider plus the
+normalized request: method, query parameters and JSON body, with API keys
+left out and whitespace and case folded. The endpoint URL is not part of
+the key, so a cache recorded against the benchmark stand-ins replays
+under any PROVIDER_BASE_URL.
+
+An entry is fresh for its provider's cache_ttl (Source.cache_ttl,
+overridable with e.g. ARXIV_CACHE_TTL; 0 disables caching for that
+provider). A stale entry that came with an ETag or Last-Modified is
+revalidated with a conditional request, and a 304 renews it without
+transferring the body again. Entries are LRU-evicted once the file holds
+more than HTTP_CACHE_MB of compressed bodies.
+
+HTTP_CACHE selects the mode: "on" (default), "off", or "offline", which
+answers every request from the cache whatever its age and never goes
+upstream; a request that was never recorded fails. Offline replays make
+benchmark runs deterministic and independent of provider latency.
+
+The file is a disposable cache, so its table is created on first use
+rather than through migrations.py.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+import zlib
+from pathlib import Path
+
+import httpx
+
+import storage
+
+MODES = ("on", "off", "offline")
+MODE = os.environ.get("HTTP_CACHE", "on")
+MAX_BYTES = int(float(os.environ.get("HTTP_CACHE_MB", 256)) * 2 ** 20)
+COMPRESS_LEVEL = 6
+EVICT_BATCH = 64  # least recently used entries examined per eviction query
+_SECRET_PARAMS = {"api_key", "apikey", "key", "token"}
+
+
+def cache_path():
+    """The cache file of the current memory.db, unless HTTP_CACHE_PATH names one."""
+    return Path(os.environ.get("HTTP_CACHE_PATH") or Path(storage.DB_PATH).with_suffix(".httpcache"))
+
+
+def _normalize(value):
+    if isinstance(value, str):
+        return " ".join(value.split()).lower()
+    if isinstance(value, dict):
+        return {k: _normalize(v) for k, v in value.items() if k.lower() not in _SECRET_PARAMS}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    return value
+
+
+def request_key(provider, request):
+    """Cache key of a build_request() dict: provider + normalized method, params and JSON body."""
+    canonical = {
+        "provider": provider,
+        "method": str(request.get("method", "GET")).upper(),
+        "params": _normalize(request.get("params") or {}),
+        "json": _normalize(request.get("json")),
+    }
+    return hashlib.blake2b(json.dumps(canonical, sort_keys=True, default=str).encode("utf-8"), digest_size=16).digest()
+
+
+class Entry:
+    """A cached response: body bytes plus what is needed to replay and revalidate it."""
+
+    def __init__(self, key, body, content_type, etag, last_modified, fetched_at, fresh):
+        self.key = key
+        self.body = body
+        self.content_type = content_type
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fetched_at = fetched_at
+        self.fresh = fresh
+
+    def validators(self):
+        """Conditional request headers, empty if the provider sent no validator."""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+    def response(self, request):
+        """The body as an httpx.Response, for Source.parse()."""
+        return httpx.Response(
+            200,
+            content=self.body,
+            headers={"content-type": self.content_type or "application/octet-stream"},
+            request=httpx.Request(request.get("method", "GET"), request["url"]),
+        )
+
+
+class HttpCache:
+    """TTL + size-bounded LRU policy over the http_cache table, with per-provider counters."""
+
+    def __init__(self, path=None, max_bytes=MAX_BYTES, mode=MODE):
+        if mode not in MODES:
+            raise ValueError(f"HTTP_CACHE must be one of {', '.join(MODES)}, not {mode!r}")
+        self.path = path
+        self.max_bytes = max_bytes
+        self.mode = mode
+        self.counts = {}
+        self._lock = threading.Lock()
+        self._ready = set()
+
+    def _pool(self):
+        path = Path(self.path or cache_path())
+        pool = storage.get_pool(path)
+        if path not in self._ready:
+            with pool.transaction() as conn:
+                conn.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS http_cache (
+                        key BLOB PRIMARY KEY,
+                        provider TEXT NOT NULL,
+                        content_type TEXT,
+                        etag TEXT,
+                        last_modified TEXT,
+                        body BLOB NOT NULL,
+                        size INTEGER NOT NULL,
+                        fetched_at REAL NOT NULL,
+                        last_used REAL NOT NULL
+                    )
+                    """
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_http_cache_last_used ON http_cache (last_used)")
+            self._ready.add(path)
+        return pool
+
+    def _count(self, provider, what):
+        with self._lock:
+            counts = self.counts.setdefault(
+                provider, dict.fromkeys(("hits", "stale", "revalidated", "misses", "stored"), 0)
+            )
+            counts[what] += 1
+
+    def enabled(self, ttl):
+        return self.mode == "offline" or (self.mode == "on" and bool(ttl))
+
+    def get(self, provider, request, ttl):
+        """The cached response for `request`, fresh or stale, or None. Counts a hit, a stale entry or a miss."""
+        key = request_key(provider, request)
+        with self._pool().connection() as conn:
+            row = conn.execute(
+                "SELECT body, content_type, etag, last_modified, fetched_at FROM http_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row:
+                conn.execute("UPDATE http_cache SET last_used = ? WHERE key = ?", (time.time(), key))
+        if row is None:
+            self._count(provider, "misses")
+            return None
+        fresh = self.mode == "offline" or time.time() - row[4] < ttl
+        self._count(provider, "hits" if fresh else "stale")
+        return Entry(key, zlib.decompress(row[0]), row[1], row[2], row[3], row[4], fresh)
+
+    def put(self, provider, request, body, headers):
+        """Store a 200 body with its validators, then evict down to max_bytes."""
+        blob = zlib.compress(body, COMPRESS_LEVEL)
+        now = time.time()
+        with self._pool().transaction() as conn:
+            conn.execute(
+                """
+                INSERT OR REPLACE INTO http_cache
+                    (key, provider, content_type, etag, last_modified, body, size, fetched_at, last_used)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (request_key(provider, request), provider, headers.get("content-type"), headers.get("etag"),
+                 headers.get("last-modified"), blob, len(blob), now, now),
+            )
+            self._evict(conn)
+        self._count(provider, "stored")
+
+    def refresh(self, provider, entry, headers):
+        """A 304 answered a revalidation: the entry is fresh again (validators may change)."""
+        with self._pool().transaction() as conn:
+            conn.execute(
+                "UPDATE http_cache SET fetched_at = ?, etag = COALESCE(?, etag), "
+                "last_modified = COALESCE(?, last_modified) WHERE key = ?",
+                (time.time(), headers.get("etag"), headers.get("last-modified"), entry.key),
+            )
+        self._count(provider, "revalidated")
+
+    def _evict(self, conn):
+        excess = conn.execute("SELECT COALESCE(SUM(size), 0) FROM http_cache").fetchone()[0] - self.max_bytes
+        while excess > 0:
+            oldest = conn.execute(
+                "SELECT key, size FROM http_cache ORDER BY last_used LIMIT ?", (EVICT_BATCH,)
+            ).fetchall()
+            if not oldest:
+                return
+            doomed = []
+            for key, size in oldest:
+                if excess <= 0:
+                    break
+                doomed.append((key,))
+                excess -= size
+            conn.executemany("DELETE FROM http_cache WHERE key = ?", doomed)
+
+    def clear(self):
+        with self._pool().transaction() as conn:
+            conn.execute("DELETE FROM http_cache")
+        with self._lock:
+            self.counts = {}
+
+    def stats(self):
+        """{entries, bytes, max_bytes, mode, providers: {name: {hits, stale, revalidated, misses, stored}}}."""
+        with self._pool().connection() as conn:
+            entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM http_cache").fetchone()
+        with self._lock:
+            providers = {name: dict(c) for name, c in self.counts.items()}
+        return {"entries": entries, "bytes": size, "max_bytes": self.max_bytes, "mode": self.mode,
+                "providers": providers}
+
+
+cache = HttpCache()
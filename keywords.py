@@ -0,0 +1,191 @@
+"""Memoized keyword extraction for the Ollama stage.
+
+Extracted keywords are remembered in memory.db (keyword_cache) under the
+normalized user query and the model that produced them, so a query seen
+before never reaches Ollama again; entries are LRU-evicted past
+max_entries. Queries that already are plain keywords ("graph neural
+networks 2024") are answered by rule without any LLM call.
+
+Concurrent extractions are coalesced: identical queries in flight share
+one Ollama request, and distinct ones are let through at most `parallel`
+at a time, matching the slots Ollama decodes together (OLLAMA_NUM_PARALLEL
+on the server). The model stays loaded between searches through the
+request's keep_alive, and the system prompt is sent byte-identical as the
+first message, so Ollama reuses its cached prefix instead of re-reading it.
+"""
+import asyncio
+import os
+import re
+import sqlite3
+import threading
+import time
+import weakref
+
+import storage
+from result_cache import normalize_query
+
+MAX_ENTRIES = 5000
+PARALLEL = int(os.environ.get("OLLAMA_NUM_PARALLEL", 4))
+MAX_KEYWORD_WORDS = 8
+
+# Words that make a query a request rather than a keyword list
+_CHATTY = {
+    "find", "papers", "paper", "about", "on", "in", "for", "please", "show", "me", "research", "query",
+    "search", "i", "we", "you", "want", "need", "looking", "give", "list", "get", "what", "which", "how",
+    "any", "some", "recent", "latest", "new", "can", "could", "would", "help", "tell", "related",
+    "articles", "article", "studies", "study", "works", "published", "from", "year",
+}
+_KEYWORD_RE = re.compile(r"[\w\-\.]+")
+
+
+def keyword_only(query):
+    """The query's keywords if it already is a short keyword list, else None.
+
+    Same lowercase alphanumeric form the "Parse Ollama JSON" fallback
+    produces, kept verbatim (years included, as Ollama returns them).
+    """
+    text = str(query or "").strip().lower()
+    if not text or "?" in text:
+        return None
+    words = _KEYWORD_RE.findall(text)
+    if not words or len(words) > MAX_KEYWORD_WORDS or any(w in _CHATTY for w in words):
+        return None
+    return " ".join(re.sub(r"[^a-z0-9\s]", " ", text).split()) or None
+
+
+class KeywordMemo:
+    """LRU memo of query -> keywords over keyword_cache, plus in-flight coalescing."""
+
+    def __init__(self, max_entries=MAX_ENTRIES, parallel=PARALLEL):
+        self.max_entries = max_entries
+        self.parallel = parallel
+        self.hits = 0
+        self.misses = 0
+        self.rule_answers = 0
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._slots = weakref.WeakKeyDictionary()  # event loop -> Semaphore
+
+    def lookup(self, conn, query, model):
+        """Remembered keywords for `query` under `model`, or None. Counts a hit or a miss."""
+        key = normalize_query(query)
+        row = conn.execute(
+            "SELECT search_query FROM keyword_cache WHERE query_key = ? AND model = ?", (key, model)
+        ).fetchone() if key else None
+        with self._lock:
+            if row:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return row[0] if row else None
+
+    def touch(self, conn, query, model):
+        """Mark a remembered query as just used, for LRU eviction."""
+        conn.execute(
+            "UPDATE keyword_cache SET last_used = ? WHERE query_key = ? AND model = ?",
+            (time.time(), normalize_query(query), model),
+        )
+
+    def remember(self, conn, query, model, keywords):
+        key = normalize_query(query)
+        if not key or not keywords:
+            return
+        now = time.time()
+        conn.execute(
+            """
+            INSERT INTO keyword_cache (query_key, model, search_query, created_at, last_used)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(query_key, model) DO UPDATE SET
+                search_query = excluded.search_query,
+                last_used = excluded.last_used
+            """,
+            (key, model, keywords, now, now),
+        )
+        conn.execute(
+            """
+            DELETE FROM keyword_cache WHERE rowid IN (
+                SELECT rowid FROM keyword_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?
+            )
+            """,
+            (self.max_entries,),
+        )
+
+    def clear(self, conn):
+        conn.execute("DELETE FROM keyword_cache")
+        with self._lock:
+            self.hits = self.misses = self.rule_answers = 0
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "rule_answers": self.rule_answers,
+            "hit_rate": self.hits / total if total else 0.0,
+            "max_entries": self.max_entries,
+        }
+
+    # ----------------- Async front end -----------------
+
+    async def cached(self, query, model):
+        """Rule answer or remembered keywords for `query`: (keywords, origin) or (None, None)."""
+        quick = keyword_only(query)
+        if quick:
+            with self._lock:
+                self.rule_answers += 1
+            return quick, "rule"
+
+        def read():
+            # Plain read: a miss (every new query) takes no write lock
+            with storage.connection() as conn:
+                found = self.lookup(conn, query, model)
+            if found:
+                try:
+                    with storage.transaction() as conn:
+                        self.touch(conn, query, model)
+                except sqlite3.Error as e:  # recency only; the answer stands
+                    print(f"Keyword cache touch failed: {e}")
+            return found
+
+        found = await asyncio.to_thread(read)
+        return (found, "cache") if found else (None, None)
+
+    async def extract(self, query, model, fetch):
+        """Run `fetch()` (a coroutine function returning keywords) once per distinct query.
+
+        Concurrent callers with the same normalized query await the same
+        call; the result is remembered even if every caller has stopped
+        waiting for it.
+        """
+        loop = asyncio.get_running_loop()
+        key = (loop, normalize_query(query), model)
+        task = self._inflight.get(key)
+        if task is None:
+            task = self._inflight[key] = loop.create_task(self._fetch(query, model, fetch))
+            task.add_done_callback(lambda t: self._settled(key, t))
+        return await asyncio.shield(task)
+
+    def _settled(self, key, task):
+        self._inflight.pop(key, None)
+        if not task.cancelled():
+            task.exception()  # retrieved: callers that gave up must not trigger a warning
+
+    async def _fetch(self, query, model, fetch):
+        slots = self._slots.get(asyncio.get_running_loop())
+        if slots is None:
+            slots = self._slots[asyncio.get_running_loop()] = asyncio.Semaphore(self.parallel)
+        async with slots:
+            keywords = await fetch()
+
+        def write():
+            with storage.transaction() as conn:
+                self.remember(conn, query, model, keywords)
+
+        try:
+            await asyncio.to_thread(write)
+        except sqlite3.Error as e:
+            print(f"Keyword cache write failed: {e}")
+        return keywords
+
+
+memo = KeywordMemo()
@@ -1,79 +1,464 @@
-from fastapi import FastAPI, Request
-from pydantic import BaseModel
+from fastapi import FastAPI, Request, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, ValidationError
 from typing import List, Optional, Any
-from pathlib import Path
-import sqlite3
+from collections import OrderedDict
+from concurrent.futures import Future
+from contextlib import asynccontextmanager
+import asyncio
 import json
+import os
+import queue
+import sqlite3
+import threading
+import time
 from datetime import datetime
 
-DB_PATH = Path(__file__).parent / "memory.db"
+import corpus_index
+import engine
+import http_cache
+import migrations
+import outbound
+import result_cache
+import storage
 
-app = FastAPI(title="Search Memory API", description="Backend for storing search history and paper results.")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Schema migrations run once per process, before the first request
+    applied = migrations.ensure_schema()
+    if applied:
+        print(f"Applied schema migrations: {applied}")
+    # One pooled HTTP client for every /search fan-out on this loop
+    app.state.http = engine.new_client()
+    yield
+    await app.state.http.aclose()
+    committer.close()
+    storage.get_pool().close()
+
+app = FastAPI(title="Search Memory API", description="Backend for storing search history and paper results.", lifespan=lifespan)
 
 class SearchLog(BaseModel):
     query: Any
     search_query: Any
     top_results: List[Any] = []
+    request_id: Optional[str] = None
+
+# Upper bound for a single long-poll, so a stuck client cannot pin a worker forever
+MAX_WAIT_SECONDS = 60.0
+
+class CompletionBoard:
+    """Hands freshly logged searches to clients waiting on their request_id.
+
+    Recent completions are kept for a while, so a client that starts waiting
+    after /log_search already fired still gets its result immediately.
+    Waiters are futures on the event loop, resolved from whichever thread
+    publishes, so a long-poll holds no worker thread while it waits.
+    """
+
+    def __init__(self, keep: int = 256):
+        self._lock = threading.Lock()
+        self._done: "OrderedDict[str, dict]" = OrderedDict()
+        self._waiters: "dict[str, list]" = {}
+        self._keep = keep
+
+    def publish(self, request_id: str, record: dict):
+        with self._lock:
+            self._done[request_id] = record
+            self._done.move_to_end(request_id)
+            while len(self._done) > self._keep:
+                self._done.popitem(last=False)
+            waiters = self._waiters.pop(request_id, [])
+        for loop, fut in waiters:
+            try:
+                loop.call_soon_threadsafe(_resolve, fut, record)
+            except RuntimeError:  # its loop has shut down
+                pass
+
+    def get(self, request_id: str) -> Optional[dict]:
+        with self._lock:
+            return self._done.get(request_id)
+
+    async def wait(self, request_id: str, timeout: float) -> Optional[dict]:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if request_id in self._done:
+                return self._done[request_id]
+            waiter = (loop, loop.create_future())
+            self._waiters.setdefault(request_id, []).append(waiter)
+        try:
+            return await asyncio.wait_for(waiter[1], timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            with self._lock:
+                pending = self._waiters.get(request_id, [])
+                if waiter in pending:
+                    pending.remove(waiter)
+                    if not pending:
+                        del self._waiters[request_id]
+
+def _resolve(fut: "asyncio.Future", record: dict):
+    if not fut.done():
+        fut.set_result(record)
+
+completions = CompletionBoard()
+results_cache = result_cache.ResultCache()
+
+# Writes are grouped: /log_search/bulk stores a whole batch in one
+# transaction, and single searches (/log_search, /search) queue up in a
+# write-behind GroupCommitter that commits whatever arrived within a few
+# milliseconds together, so concurrent loggers share one commit.
+GROUP_COMMIT_WINDOW = float(os.environ.get("GROUP_COMMIT_MS", 5)) / 1000
+MAX_GROUP = 256
+MAX_BULK_ENTRIES = 10_000
 
-def get_conn():
-    return sqlite3.connect(DB_PATH, timeout=20.0, check_same_thread=False)
+def write_searches(entries: List[dict]) -> List[dict]:
+    """Store searches in one transaction, cache them and wake up whoever waits on them.
+
+    Entries are {query, search_query, top_results, request_id, cacheable,
+    profile} dicts (profile: result_cache.profile()); returns one record per
+    entry, in order.
+    """
+    created_at = datetime.utcnow().isoformat()
+    with storage.transaction() as conn:
+        ids = storage.save_searches(conn, [
+            (str(e["query"]), str(e["search_query"]), created_at, e.get("request_id"), e["top_results"])
+            for e in entries
+        ])
+        # New and updated papers join the BM25F index in the same commit
+        corpus_index.sync(conn)
+        for search_id, e in zip(ids, entries):
+            if e["top_results"] and e.get("cacheable", True):
+                # Repeats of this query can now be answered without n8n
+                results_cache.remember(
+                    conn, e["query"], e["search_query"], search_id, e.get("profile", result_cache.DEFAULT_PROFILE)
+                )
+    records = []
+    for search_id, e in zip(ids, entries):
+        record = {
+            "id": search_id,
+            "query": str(e["query"]),
+            "search_query": str(e["search_query"]),
+            "top_results": e["top_results"],
+            "created_at": created_at,
+        }
+        if e.get("request_id"):
+            # Row is committed: wake up the UI waiting on this search
+            completions.publish(e["request_id"], record)
+        records.append(record)
+    return records
+
+class GroupCommitter:
+    """Write-behind queue that commits single searches in groups.
+
+    submit() blocks until its entry is committed, so a response still means
+    "stored"; a writer thread takes everything queued within `window`
+    seconds of the first entry (at most `max_group`) into one transaction.
+    If a group fails, its entries are retried one by one, so one bad entry
+    only fails its own caller.
+    """
+
+    def __init__(self, write, window: float = GROUP_COMMIT_WINDOW, max_group: int = MAX_GROUP):
+        self._write = write
+        self._window = window
+        self._max_group = max_group
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def submit(self, entry: dict) -> dict:
+        future: Future = Future()
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="group-commit", daemon=True)
+                self._thread.start()
+            self._queue.put((entry, future))
+        return future.result()
+
+    def close(self):
+        """Commit what is queued and stop the writer thread."""
+        with self._lock:
+            if self._thread is not None:
+                self._queue.put(None)
+                self._thread.join()
+                self._thread = None
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            group = [item]
+            deadline = time.monotonic() + self._window
+            while len(group) < self._max_group:
+                try:
+                    item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._commit(group)
+                    return
+                group.append(item)
+            self._commit(group)
+
+    def _commit(self, group):
+        try:
+            records = self._write([entry for entry, _ in group])
+        except Exception as e:
+            if len(group) == 1:
+                group[0][1].set_exception(e)
+                return
+            for item in group:
+                self._commit([item])
+            return
+        for (_, future), record in zip(group, records):
+            future.set_result(record)
+
+committer = GroupCommitter(write_searches)
+
+def record_search(query, search_query, top_results, request_id=None, cacheable=True,
+                  profile=result_cache.DEFAULT_PROFILE) -> dict:
+    """Store one finished search (group-committed); returns its record once committed."""
+    return committer.submit({
+        "query": query,
+        "search_query": search_query,
+        "top_results": top_results,
+        "request_id": request_id,
+        "cacheable": cacheable,
+        "profile": profile,
+    })
+
+def storage_error(e: sqlite3.Error) -> HTTPException:
+    """HTTP error for a failed read or write: 503 + Retry-After while the database is busy, else 500."""
+    if isinstance(e, sqlite3.OperationalError) and ("locked" in str(e) or "busy" in str(e)):
+        return HTTPException(status_code=503, detail=f"Database busy: {e}", headers={"Retry-After": "1"})
+    return HTTPException(status_code=500, detail=f"Database error: {e}")
 
 @app.post("/log_search")
 def log_search(payload: SearchLog):
-    """Log a search query and its top results to the SQLite database."""
+    """Log a search query and its top results to the SQLite database.
+
+    Concurrent calls are committed together (GroupCommitter). Failures
+    are HTTP errors, 503 when worth retrying.
+    """
     try:
-        conn = get_conn()
-        cur = conn.cursor()
-        cur.execute(
-            """
-            INSERT INTO search_history (query, search_query, top_results, created_at)
-            VALUES (?, ?, ?, ?)
-            """,
-            (
-                str(payload.query),
-                str(payload.search_query),
-                json.dumps(payload.top_results, ensure_ascii=False),
-                datetime.utcnow().isoformat(),
-            ),
+        record = record_search(payload.query, payload.search_query, payload.top_results, payload.request_id)
+    except sqlite3.Error as e:
+        raise storage_error(e)
+    return {"status": "ok", "id": record["id"]}
+
+def parse_bulk(body: bytes) -> List[SearchLog]:
+    """SearchLog entries from a JSON array or NDJSON (one object per line); 422 on bad input."""
+    try:
+        text = body.decode("utf-8").strip()
+        if text.startswith("["):
+            items = [(f"item {i}", item) for i, item in enumerate(json.loads(text))]
+        else:
+            items = [(f"line {n}", json.loads(line)) for n, line in enumerate(text.splitlines(), 1) if line.strip()]
+    except (UnicodeDecodeError, ValueError) as e:
+        raise HTTPException(status_code=422, detail=f"Body is neither a JSON array nor NDJSON: {e}")
+    if len(items) > MAX_BULK_ENTRIES:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BULK_ENTRIES} searches per request")
+    entries = []
+    for where, item in items:
+        try:
+            entries.append(SearchLog.model_validate(item))
+        except ValidationError as e:
+            raise HTTPException(status_code=422, detail=f"{where}: {e.errors()[0]['msg']}")
+    return entries
+
+@app.post("/log_search/bulk")
+async def log_search_bulk(request: Request):
+    """Log many searches at once, e.g. to backfill history or for load tests.
+
+    The body is a JSON array of /log_search payloads or NDJSON (one per
+    line). Everything is written in one transaction: either all searches
+    are stored or none (then the status is 422, 413, 503 or 500).
+    """
+    entries = parse_bulk(await request.body())
+    try:
+        records = await run_in_threadpool(write_searches, [
+            {"query": e.query, "search_query": e.search_query, "top_results": e.top_results, "request_id": e.request_id}
+            for e in entries
+        ])
+    except sqlite3.Error as e:
+        raise storage_error(e)
+    return {"status": "ok", "count": len(records), "ids": [r["id"] for r in records]}
+
+class SearchRequest(BaseModel):
+    query: str
+    request_id: Optional[str] = None
+    top_k: int = 10
+    budget: Optional[float] = None  # seconds; SEARCH_BUDGET, or DEEP_SEARCH_BUDGET for deep searches
+    mode: str = "live"  # "live", "blend" (+ stored papers, BM25F) or "local" (memory.db only)
+    semantic: bool = False  # re-rank by embedding similarity (embeddings.py)
+    deep: bool = False  # page through providers; every ranked paper is logged
+
+def _search_budget(payload: SearchRequest) -> float:
+    if not payload.query.strip():
+        raise HTTPException(status_code=422, detail="Empty query")
+    if payload.mode not in engine.SEARCH_MODES:
+        raise HTTPException(status_code=422, detail=f"mode must be one of {', '.join(engine.SEARCH_MODES)}")
+    budget = payload.budget
+    if budget is None:
+        budget = engine.DEEP_SEARCH_BUDGET if payload.deep else engine.SEARCH_BUDGET
+    return min(max(budget, 0.5), MAX_WAIT_SECONDS)
+
+async def _record_result(payload: SearchRequest, result: dict) -> dict:
+    try:
+        record = await run_in_threadpool(
+            record_search,
+            result["query"],
+            result["search_query"],
+            # A deep search keeps its whole ranking, paged by /history/{id}/results
+            result["papers"] if payload.deep else result["papers"][:max(payload.top_k, 1)],
+            payload.request_id,
+            # Don't replay a search that missed providers or never asked them,
+            # nor a deep one as the answer to a quick one
+            cacheable=not result["partial"] and result["mode"] != "local" and not payload.deep,
+            # Replayed only for the same engine settings (result_cache.profile)
+            profile=result_cache.profile("python", result["mode"], result["semantic"]),
         )
-        conn.commit()
-        last_id = cur.lastrowid
-        conn.close()
-        print(f"Logged search ID: {last_id}")
-        return {"status": "ok", "id": last_id}
-    except Exception as e:
-        print(f"Database error: {e}")
-        return {"status": "error", "message": str(e)}
+    except sqlite3.Error as e:
+        raise storage_error(e)
+    return {
+        **record,
+        "top_results": record["top_results"][:max(payload.top_k, 1)],
+        "total": len(record["top_results"]),
+        "mode": result["mode"],
+        "keywords_from": result["keywords_from"],
+        "semantic": result["semantic"],
+        "deep": result["deep"],
+        "sources": result["sources"],
+        "partial": result["partial"],
+        "timings": result["timings"],
+    }
+
+@app.post("/search")
+async def search(payload: SearchRequest, request: Request):
+    """Run the Python engine (engine.py) for a query and log it like /log_search.
+
+    Providers are queried concurrently; the answer comes back within `budget`
+    seconds with whatever arrived, and `partial`/`sources` say which
+    providers were late or failed. `mode` "blend" also ranks the matching
+    papers already in memory.db (BM25F); "local" answers from them alone.
+    `semantic` re-ranks by embedding similarity and, with stored papers,
+    also brings in the ones nearest in meaning. `deep` pages through every
+    provider (see engine.search_stream); the answer carries the top_k and
+    `total`, and /history/{id}/results pages through the rest.
+    """
+    budget = _search_budget(payload)
+    result = await engine.search(
+        payload.query, client=request.app.state.http, budget=budget, mode=payload.mode, semantic=payload.semantic,
+        deep=payload.deep,
+    )
+    return await _record_result(payload, result)
+
+@app.post("/search/stream")
+async def search_stream(payload: SearchRequest, request: Request):
+    """Like /search, but streams NDJSON events while providers answer.
+
+    One JSON object per line: "keywords", then one "source" event per
+    provider (per page for deep searches) carrying the re-ranked top_k so
+    far, then "done" with the logged record (same body as /search). The
+    200 status is sent with the first line, so a search that cannot be
+    logged ends with an "error" event (status, error) instead of "done".
+    """
+    budget = _search_budget(payload)
+
+    async def events():
+        async for event in engine.search_stream(
+            payload.query, client=request.app.state.http, budget=budget, top_k=max(payload.top_k, 1),
+            mode=payload.mode, semantic=payload.semantic, deep=payload.deep,
+        ):
+            if event["event"] == "done":
+                try:
+                    event = {"event": "done", **await _record_result(payload, event)}
+                except HTTPException as e:
+                    event = {"event": "error", "status": e.status_code, "error": e.detail}
+            yield json.dumps(event, default=str) + "\n"
+
+    # no-transform/X-Accel-Buffering keep proxies from buffering the stream
+    return StreamingResponse(
+        events(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache, no-transform", "X-Accel-Buffering": "no"},
+    )
+
+def find_search(request_id: str) -> Optional[dict]:
+    """Indexed point lookup of a logged search by its request_id."""
+    with storage.connection() as conn:
+        return storage.get_search(conn, request_id=request_id)
+
+@app.get("/wait_search/{request_id}")
+async def wait_search(request_id: str, timeout: float = 25.0):
+    """Long-poll until the search tagged with request_id has been logged."""
+    # Rows logged before this process started are not on the board
+    record = completions.get(request_id) or await run_in_threadpool(find_search, request_id)
+    if record is None:
+        record = await completions.wait(request_id, max(0.0, min(timeout, MAX_WAIT_SECONDS)))
+    if record is None:
+        raise HTTPException(status_code=408, detail=f"Search {request_id} not logged yet")
+    return record
 
 @app.get("/history")
-def history(limit: int = 10):
-    """Retrieve the recent search history."""
+def history(limit: int = 10, before_id: Optional[int] = None, include_results: bool = False):
+    """Retrieve one keyset page of search history, newest first.
+
+    Pass the returned next_cursor as before_id to fetch the following page.
+    Entries carry only header columns unless include_results is set; use
+    /history/{search_id} to load one entry's papers on demand.
+    """
     try:
-        conn = get_conn()
-        cur = conn.cursor()
-        cur.execute(
-            """
-            SELECT id, query, search_query, top_results, created_at
-            FROM search_history
-            ORDER BY id DESC
-            LIMIT ?
-            """,
-            (limit,),
-        )
-        rows = cur.fetchall()
-        conn.close()
-
-        result = []
-        for r in rows:
-            result.append(
-                {
-                    "id": r[0],
-                    "query": r[1],
-                    "search_query": r[2],
-                    "top_results": json.loads(r[3]) if r[3] else [],
-                    "created_at": r[4],
-                }
-            )
-        return result
-    except Exception as e:
-        return {"status": "error", "message": str(e)}
\ No newline at end of file
+        with storage.connection() as conn:
+            entries, next_cursor = storage.history_page(conn, before_id, min(max(limit, 1), 200))
+            if include_results:
+                saved = storage.load_search_results(conn, [e["id"] for e in entries])
+                for e in entries:
+                    e["top_results"] = saved[e["id"]]
+        return {"items": entries, "next_cursor": next_cursor}
+    except sqlite3.Error as e:
+        raise storage_error(e)
+
+@app.get("/history/{search_id}")
+def history_item(search_id: int):
+    """Retrieve the saved papers of a single logged search."""
+    with storage.connection() as conn:
+        record = storage.get_search(conn, search_id=search_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail=f"Search {search_id} not found")
+    return record
+
+@app.get("/history/{search_id}/results")
+def history_results(search_id: int, offset: int = 0, limit: int = 20):
+    """One page of a logged search's ranked papers (deep searches keep them all)."""
+    with storage.connection() as conn:
+        papers, total = storage.search_results_page(conn, search_id, max(offset, 0), min(max(limit, 1), 200))
+        if not total and storage.get_search(conn, search_id=search_id) is None:
+            raise HTTPException(status_code=404, detail=f"Search {search_id} not found")
+    return {"id": search_id, "offset": max(offset, 0), "total": total, "items": papers}
+
+@app.get("/providers")
+def providers():
+    """Outbound scheduler state per provider: calls, coalesced, retries, throttled, circuit."""
+    return outbound.scheduler.stats()
+
+@app.get("/providers/cache")
+def provider_cache():
+    """HTTP response cache: mode, size, and hits/stale/revalidated/misses/stored per provider."""
+    try:
+        return http_cache.cache.stats()
+    except sqlite3.Error as e:
+        raise storage_error(e)
+
+@app.get("/search_memory")
+def search_memory(q: str, limit: int = 20):
+    """Full-text search over stored papers and past searches (FTS5)."""
+    limit = min(max(limit, 1), 200)
+    with storage.connection() as conn:
+        return {
+            "query": q,
+            "papers": storage.search_papers(conn, q, limit),
+            "searches": storage.search_history(conn, q, limit),
+        }
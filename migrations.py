@@ -0,0 +1,461 @@
+"""Versioned schema migrations for memory.db.
+
+Migrations are applied in order, each in its own write transaction, and
+recorded in `schema_version`. Every step also copes with databases created
+before versioning existed (it checks for the tables/columns it adds), so an
+empty file and a legacy memory.db both end up on the latest version.
+
+Steps are frozen once released: each one carries the SQL it needs instead
+of calling into storage.py, so a later change to the live schema or its
+writers never changes what an old step does. The applied version is also
+mirrored into PRAGMA user_version.
+
+Both the UI and the memory API call ensure_schema() once at process start.
+Run `python migrations.py [path/to/memory.db]` to migrate a file by hand.
+"""
+import json
+import sys
+from datetime import datetime
+
+import corpus_index
+import storage
+
+
+def _columns(conn, table):
+    return [c[1] for c in conn.execute(f"PRAGMA table_info({table})").fetchall()]
+
+
+def _base_tables(conn):
+    conn.execute("CREATE TABLE IF NOT EXISTS search_history (id INTEGER PRIMARY KEY AUTOINCREMENT, query TEXT, search_query TEXT, top_results TEXT, created_at TEXT)")
+    conn.execute("CREATE TABLE IF NOT EXISTS favorites (title TEXT, link TEXT UNIQUE, added_at TEXT, paper_json TEXT)")
+    cols = _columns(conn, "favorites")
+    if "added_at" not in cols:
+        conn.execute("ALTER TABLE favorites ADD COLUMN added_at TEXT")
+    if "paper_json" not in cols:
+        conn.execute("ALTER TABLE favorites ADD COLUMN paper_json TEXT")
+
+
+def _search_request_id(conn):
+    # Searches are correlated with the UI request that triggered them
+    if "request_id" not in _columns(conn, "search_history"):
+        conn.execute("ALTER TABLE search_history ADD COLUMN request_id TEXT")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_search_history_request_id ON search_history (request_id)")
+
+
+def _normalized_papers(conn):
+    # Papers live once in `papers`; searches and favorites reference them
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS papers (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            paper_key TEXT NOT NULL UNIQUE,
+            source TEXT,
+            title TEXT,
+            authors_venue_year TEXT,
+            year TEXT,
+            cited_by INTEGER,
+            snippet TEXT,
+            link TEXT,
+            date TEXT
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS search_results (
+            search_id INTEGER NOT NULL REFERENCES search_history(id) ON DELETE CASCADE,
+            paper_id INTEGER NOT NULL REFERENCES papers(id),
+            rank INTEGER NOT NULL,
+            score REAL,
+            year_warning INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (search_id, rank)
+        ) WITHOUT ROWID
+        """
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_search_results_paper ON search_results (paper_id)")
+    if "paper_id" not in _columns(conn, "favorites"):
+        conn.execute("ALTER TABLE favorites ADD COLUMN paper_id INTEGER REFERENCES papers(id)")
+
+    # Move legacy JSON blobs over and clear them
+    blobs = conn.execute("SELECT id, top_results FROM search_history WHERE top_results IS NOT NULL").fetchall()
+    for search_id, blob in blobs:
+        try:
+            papers = json.loads(blob) if blob else []
+        except ValueError:
+            papers = []
+        _v3_save_results(conn, search_id, papers if isinstance(papers, list) else [])
+        conn.execute("UPDATE search_history SET top_results = NULL WHERE id = ?", (search_id,))
+
+    favs = conn.execute("SELECT rowid, title, link, paper_json FROM favorites WHERE paper_id IS NULL").fetchall()
+    for rowid, title, link, blob in favs:
+        try:
+            paper = json.loads(blob) if blob else {}
+        except ValueError:
+            paper = {}
+        if not isinstance(paper, dict):
+            paper = {}
+        paper.setdefault("title", title)
+        paper.setdefault("link", link)
+        conn.execute(
+            "UPDATE favorites SET paper_id = ?, paper_json = NULL WHERE rowid = ?",
+            (_v3_upsert_paper(conn, paper), rowid),
+        )
+
+
+def _v3_cited_by(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _v3_upsert_paper(conn, paper):
+    # The papers upsert as of this step (the live one is storage.upsert_paper).
+    # Only the key comes from storage: moved rows must carry the key that
+    # current writers look papers up by.
+    cols = ("source", "title", "authors_venue_year", "year", "cited_by", "snippet", "link", "date")
+    values = [paper.get(c) for c in cols]
+    values[cols.index("cited_by")] = _v3_cited_by(paper.get("cited_by"))
+    values = [None if v == "" else v for v in values]
+    return conn.execute(
+        """
+        INSERT INTO papers (paper_key, source, title, authors_venue_year, year, cited_by, snippet, link, date)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(paper_key) DO UPDATE SET
+            source = COALESCE(excluded.source, source),
+            title = COALESCE(excluded.title, title),
+            authors_venue_year = COALESCE(excluded.authors_venue_year, authors_venue_year),
+            year = COALESCE(excluded.year, year),
+            cited_by = MAX(COALESCE(excluded.cited_by, cited_by), COALESCE(cited_by, excluded.cited_by)),
+            snippet = COALESCE(excluded.snippet, snippet),
+            link = COALESCE(excluded.link, link),
+            date = COALESCE(excluded.date, date)
+        RETURNING id
+        """,
+        [storage.paper_key(paper), *values],
+    ).fetchone()[0]
+
+
+def _v3_save_results(conn, search_id, papers):
+    rows = []
+    for rank, paper in enumerate(papers):
+        if not isinstance(paper, dict):
+            continue
+        score = paper.get("final_score")
+        rows.append((
+            search_id,
+            _v3_upsert_paper(conn, paper),
+            rank,
+            score if isinstance(score, (int, float)) else None,
+            1 if paper.get("year_warning") else 0,
+        ))
+    conn.executemany(
+        "INSERT OR REPLACE INTO search_results (search_id, paper_id, rank, score, year_warning) VALUES (?, ?, ?, ?, ?)",
+        rows,
+    )
+
+
+def _full_text_index(conn):
+    # External-content FTS5 indexes over past queries and stored papers, kept
+    # in sync by triggers so every writer (API, UI, migrations) updates them
+    conn.execute(
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS history_fts USING fts5(
+            query, search_query,
+            content='search_history', content_rowid='id',
+            tokenize='porter unicode61 remove_diacritics 2'
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS papers_fts USING fts5(
+            title, snippet,
+            content='papers', content_rowid='id',
+            tokenize='porter unicode61 remove_diacritics 2'
+        )
+        """
+    )
+    for table, fts, cols in (
+        ("search_history", "history_fts", ("query", "search_query")),
+        ("papers", "papers_fts", ("title", "snippet")),
+    ):
+        new_vals = ", ".join("new." + c for c in cols)
+        old_vals = ", ".join("old." + c for c in cols)
+        col_list = ", ".join(cols)
+        # One statement per execute(): executescript() would commit our transaction
+        conn.execute(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN
+                INSERT INTO {fts} (rowid, {col_list}) VALUES (new.id, {new_vals});
+            END
+            """
+        )
+        conn.execute(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN
+                INSERT INTO {fts} ({fts}, rowid, {col_list}) VALUES ('delete', old.id, {old_vals});
+            END
+            """
+        )
+        conn.execute(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {col_list} ON {table} BEGIN
+                INSERT INTO {fts} ({fts}, rowid, {col_list}) VALUES ('delete', old.id, {old_vals});
+                INSERT INTO {fts} (rowid, {col_list}) VALUES (new.id, {new_vals});
+            END
+            """
+        )
+        conn.execute(f"INSERT INTO {fts} ({fts}) VALUES ('rebuild')")
+
+
+def _result_cache(conn):
+    # Normalized query / keywords -> the search_history row that answers it
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS result_cache (
+            cache_key TEXT PRIMARY KEY,
+            search_id INTEGER NOT NULL REFERENCES search_history(id) ON DELETE CASCADE,
+            created_at REAL NOT NULL,
+            last_used REAL NOT NULL
+        )
+        """
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_result_cache_last_used ON result_cache (last_used)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_result_cache_search ON result_cache (search_id)")
+
+
+def _corpus_index(conn):
+    # Inverted index for BM25F ranking (corpus_index.py). Tokenizing happens
+    # in Python, so triggers only queue changed papers for corpus_index.sync().
+    # Postings repeat their paper's field lengths so a lookup needs no join.
+    conn.execute("CREATE TABLE IF NOT EXISTS corpus_pending (paper_id INTEGER PRIMARY KEY)")
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS corpus_docs (
+            paper_id INTEGER PRIMARY KEY REFERENCES papers(id) ON DELETE CASCADE,
+            title_len INTEGER NOT NULL,
+            snippet_len INTEGER NOT NULL
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS corpus_postings (
+            term TEXT NOT NULL,
+            paper_id INTEGER NOT NULL REFERENCES papers(id) ON DELETE CASCADE,
+            title_tf INTEGER NOT NULL,
+            snippet_tf INTEGER NOT NULL,
+            title_len INTEGER NOT NULL,
+            snippet_len INTEGER NOT NULL,
+            PRIMARY KEY (term, paper_id)
+        ) WITHOUT ROWID
+        """
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_corpus_postings_paper ON corpus_postings (paper_id)")
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS corpus_stats (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            docs INTEGER NOT NULL,
+            title_len INTEGER NOT NULL,
+            snippet_len INTEGER NOT NULL
+        )
+        """
+    )
+    conn.execute("INSERT OR IGNORE INTO corpus_stats (id, docs, title_len, snippet_len) VALUES (1, 0, 0, 0)")
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS corpus_docs_ai AFTER INSERT ON corpus_docs BEGIN
+            UPDATE corpus_stats SET docs = docs + 1, title_len = title_len + new.title_len,
+                snippet_len = snippet_len + new.snippet_len WHERE id = 1;
+        END
+        """
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS corpus_docs_ad AFTER DELETE ON corpus_docs BEGIN
+            UPDATE corpus_stats SET docs = docs - 1, title_len = title_len - old.title_len,
+                snippet_len = snippet_len - old.snippet_len WHERE id = 1;
+        END
+        """
+    )
+    # Not INSERT OR IGNORE: the upsert in storage.upsert_paper would
+    # override the trigger's conflict clause with its own ABORT
+    for event, name in (("INSERT", "corpus_pending_ai"), ("UPDATE OF title, snippet", "corpus_pending_au")):
+        conn.execute(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS {name} AFTER {event} ON papers BEGIN
+                INSERT INTO corpus_pending (paper_id)
+                SELECT new.id WHERE NOT EXISTS (SELECT 1 FROM corpus_pending WHERE paper_id = new.id);
+            END
+            """
+        )
+    # Everything stored so far is queued; ensure_schema() indexes it after the last step
+    conn.execute("INSERT OR IGNORE INTO corpus_pending (paper_id) SELECT id FROM papers")
+
+
+def _keyword_cache(conn):
+    # Normalized user query + model -> Ollama's keywords (keywords.py)
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS keyword_cache (
+            query_key TEXT NOT NULL,
+            model TEXT NOT NULL,
+            search_query TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            last_used REAL NOT NULL,
+            PRIMARY KEY (query_key, model)
+        )
+        """
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_keyword_cache_last_used ON keyword_cache (last_used)")
+
+
+def _paper_vectors(conn):
+    # Embeddings live in a float32 matrix file beside memory.db (embeddings.py);
+    # these tables map texts and stored papers to its rows. vector_slots is
+    # keyed by a hash of the embedded text, so a text is embedded only once.
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS vector_meta (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            model TEXT,
+            dim INTEGER,
+            rows INTEGER NOT NULL
+        )
+        """
+    )
+    conn.execute("INSERT OR IGNORE INTO vector_meta (id, model, dim, rows) VALUES (1, NULL, NULL, 0)")
+    conn.execute("CREATE TABLE IF NOT EXISTS vector_slots (text_key BLOB PRIMARY KEY, slot INTEGER NOT NULL) WITHOUT ROWID")
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS paper_vectors (
+            paper_id INTEGER PRIMARY KEY REFERENCES papers(id) ON DELETE CASCADE,
+            slot INTEGER NOT NULL
+        )
+        """
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_paper_vectors_slot ON paper_vectors (slot)")
+    conn.execute("CREATE TABLE IF NOT EXISTS vector_pending (paper_id INTEGER PRIMARY KEY)")
+    # Same NOT EXISTS form as the corpus_pending triggers
+    for event, name in (("INSERT", "vector_pending_ai"), ("UPDATE OF title, snippet", "vector_pending_au")):
+        conn.execute(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS {name} AFTER {event} ON papers BEGIN
+                INSERT INTO vector_pending (paper_id)
+                SELECT new.id WHERE NOT EXISTS (SELECT 1 FROM vector_pending WHERE paper_id = new.id);
+            END
+            """
+        )
+    # Embedding needs the model, so existing papers are only queued here
+    conn.execute("INSERT OR IGNORE INTO vector_pending (paper_id) SELECT id FROM papers")
+
+
+def _paper_metadata(conn):
+    # Semantic Scholar metadata by identifier (enrichment.py); found = 0
+    # remembers ids it does not know. title_key (storage.normalize_title)
+    # lets title-only results reuse what a copy with an identifier resolved.
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS paper_metadata (
+            id_key TEXT PRIMARY KEY,
+            title_key TEXT,
+            found INTEGER NOT NULL,
+            title TEXT,
+            cited_by INTEGER,
+            venue TEXT,
+            year TEXT,
+            abstract TEXT,
+            doi TEXT,
+            arxiv_id TEXT,
+            fetched_at REAL NOT NULL
+        )
+        """
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_paper_metadata_title ON paper_metadata (title_key)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_paper_metadata_fetched ON paper_metadata (fetched_at)")
+
+
+def _paper_identifiers(conn):
+    # papers keeps the DOI and arXiv id its key came from, so a paper read
+    # back (history, favorites) maps onto the same key when it is saved again.
+    # Identifiers only in a link are found there again, so keys are enough.
+    cols = _columns(conn, "papers")
+    for col in ("doi", "arxiv_id"):
+        if col not in cols:
+            conn.execute(f"ALTER TABLE papers ADD COLUMN {col} TEXT")
+    conn.execute("UPDATE papers SET doi = substr(paper_key, 5) WHERE doi IS NULL AND paper_key LIKE 'doi:%'")
+    conn.execute("UPDATE papers SET arxiv_id = substr(paper_key, 7) WHERE arxiv_id IS NULL AND paper_key LIKE 'arxiv:%'")
+
+
+# Append only: a step's position in this list is its schema version.
+MIGRATIONS = [
+    _base_tables,
+    _search_request_id,
+    _normalized_papers,
+    _full_text_index,
+    _result_cache,
+    _corpus_index,
+    _keyword_cache,
+    _paper_vectors,
+    _paper_metadata,
+    _paper_identifiers,
+]
+LATEST_VERSION = len(MIGRATIONS)
+
+
+def current_version(conn):
+    conn.execute("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER PRIMARY KEY, applied_at TEXT NOT NULL)")
+    return conn.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version").fetchone()[0]
+
+
+def migrate(conn):
+    """Apply every pending migration on an autocommit connection.
+
+    Returns the list of versions applied. Safe to run from several processes
+    at once: each step re-checks the version after taking the write lock.
+    """
+    applied = []
+    version = current_version(conn)
+    if version >= LATEST_VERSION:
+        if conn.execute("PRAGMA user_version").fetchone()[0] != version:
+            conn.execute(f"PRAGMA user_version = {int(version)}")  # files migrated before it was mirrored
+        return applied
+    for version, step in enumerate(MIGRATIONS, start=1):
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if current_version(conn) < version:
+                step(conn)
+                conn.execute(
+                    "INSERT INTO schema_version (version, applied_at) VALUES (?, ?)",
+                    (version, datetime.utcnow().isoformat()),
+                )
+                conn.execute(f"PRAGMA user_version = {version}")
+                applied.append(version)
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+    return applied
+
+
+def ensure_schema(path=None):
+    """Bring the database at `path` (default: storage.DB_PATH) to the latest version.
+
+    Papers the steps queued for the BM25F index are indexed afterwards, with
+    the live tokenizer.
+    """
+    pool = storage.get_pool(path)
+    with pool.connection() as conn:
+        applied = migrate(conn)
+    if applied:
+        with pool.transaction() as conn:
+            corpus_index.sync(conn)
+    return applied
+
+
+if __name__ == "__main__":
+    target = sys.argv[1] if len(sys.argv) > 1 else None
+    done = ensure_schema(target)
+    print(f"{target or storage.DB_PATH}: applied {done or 'nothing'}, now at version {LATEST_VERSION}")
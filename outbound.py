@@ -0,0 +1,279 @@
+"""Shared scheduler for outbound provider requests.
+
+Every provider call of the Python engine goes through one Scheduler, so
+concurrent searches share each provider's limits instead of each firing
+its own requests:
+
+- a token bucket per provider (Source.rate requests per second, bursts of
+  Source.burst) spaces requests out; a request that could not get a slot
+  before its deadline fails at once as Throttled instead of timing out;
+- identical requests in flight (same provider, same request) share one
+  upstream call;
+- 429, 5xx and connection errors are retried with jittered exponential
+  backoff, honouring Retry-After (which also pauses the provider's bucket,
+  so the other searches wait too), as long as the retry fits the deadline;
+- after BREAKER_FAILURES failed attempts in a row a provider's circuit
+  opens: its calls fail fast as CircuitOpen for BREAKER_RESET seconds,
+  then a single probe decides whether it closes again.
+
+A provider that is throttled or down is reported as such (status
+"throttled" in the engine's source report) rather than answering with
+fewer papers.
+"""
+import asyncio
+import json
+import random
+import threading
+import time
+
+import httpx
+
+MAX_RETRIES = 3
+BACKOFF_BASE = 0.5  # seconds before the first retry, doubled for each next one
+BACKOFF_MAX = 8.0
+BREAKER_FAILURES = 5  # failed attempts in a row that open a provider's circuit
+BREAKER_RESET = 30.0  # seconds a circuit stays open before a probe is let through
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class Throttled(Exception):
+    """The provider's rate limit has no slot for this request before its deadline."""
+
+
+class CircuitOpen(Throttled):
+    """The provider failed repeatedly; calls fail fast until its circuit closes."""
+
+
+class TokenBucket:
+    """`rate` tokens per second, at most `burst` banked; a None or 0 rate never waits."""
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate or None
+        self.burst = max(float(burst or 1), 1.0)
+        self.tokens = self.burst
+        self.stamp = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, within=None):
+        """Take a token; returns the seconds to wait for it, or None if that is more than `within`.
+
+        Reservations queue up (the balance goes negative), so callers are
+        served in order.
+        """
+        if self.rate is None:
+            return 0.0
+        with self._lock:
+            self._refill()
+            wait = max(0.0, (1 - self.tokens) / self.rate)
+            if within is not None and wait > within:
+                return None
+            self.tokens -= 1
+            return wait
+
+    def pause(self, seconds):
+        """Hand out no token for `seconds` (the provider asked us to back off)."""
+        if self.rate is None:
+            return
+        with self._lock:
+            self._refill()  # a stale balance would already be owed the pause
+            self.tokens = min(self.tokens, -seconds * self.rate)
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+
+class CircuitBreaker:
+    """Opens after `failures` failed attempts in a row; half-opens after `reset_after` seconds."""
+
+    def __init__(self, failures=BREAKER_FAILURES, reset_after=BREAKER_RESET):
+        self.max_failures = failures
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if time.monotonic() - self.opened_at >= self.reset_after else "open"
+
+    def admit(self, name):
+        """Raise CircuitOpen unless a call may go out; in half-open state, one probe at a time."""
+        with self._lock:
+            if self.opened_at is None:
+                return
+            left = self.opened_at + self.reset_after - time.monotonic()
+            if left > 0 or self.probing:
+                raise CircuitOpen(f"{name} circuit open after {self.failures} failures, retry in {max(left, 0):.0f}s")
+            self.probing = True
+
+    def record(self, ok):
+        with self._lock:
+            self.probing = False
+            if ok:
+                self.failures, self.opened_at = 0, None
+                return
+            self.failures += 1
+            if self.opened_at is not None or self.failures >= self.max_failures:
+                self.opened_at = time.monotonic()
+
+    def release(self):
+        """Give up a probe that ended without a verdict (cancelled, unparsable answer)."""
+        with self._lock:
+            self.probing = False
+
+
+def retry_after(error):
+    """Seconds from a Retry-After header (delta-seconds form), or None."""
+    if not isinstance(error, httpx.HTTPStatusError):
+        return None
+    try:
+        return max(0.0, float(error.response.headers.get("retry-after", "")))
+    except ValueError:
+        return None
+
+
+def retryable(error):
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code in RETRY_STATUS
+    return isinstance(error, httpx.TransportError)
+
+
+def backoff(attempt):
+    """Delay before retry `attempt` (0-based): half of the exponential step, plus jitter up to the other half."""
+    step = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt)
+    return step / 2 + random.uniform(0, step / 2)
+
+
+def request_key(request):
+    """Canonical form of a build_request() dict, for coalescing identical requests."""
+    return json.dumps(request, sort_keys=True, default=str)
+
+
+class _Flight:
+    """One upstream call shared by every caller of the same request."""
+
+    def __init__(self, until):
+        self.task = None
+        self.waiters = 0
+        self.until = until
+
+
+class Scheduler:
+    """Per-provider token buckets and circuit breakers, request coalescing and retries."""
+
+    def __init__(self, retries=MAX_RETRIES, rate_limits=True, coalesce=True, circuit_breakers=True):
+        self.retries = retries
+        self.rate_limits = rate_limits
+        self.coalesce = coalesce
+        self.circuit_breakers = circuit_breakers
+        self.buckets = {}
+        self.breakers = {}
+        self.counts = {}
+        self._lock = threading.Lock()
+        self._inflight = {}
+
+    def _provider(self, source):
+        with self._lock:
+            if source.name not in self.buckets:
+                rate = getattr(source, "rate", None) if self.rate_limits else None
+                self.buckets[source.name] = TokenBucket(rate, getattr(source, "burst", 1))
+                self.breakers[source.name] = CircuitBreaker(BREAKER_FAILURES if self.circuit_breakers else float("inf"))
+                self.counts[source.name] = dict.fromkeys(("calls", "coalesced", "retries", "throttled"), 0)
+        return self.buckets[source.name], self.breakers[source.name]
+
+    def _count(self, name, what):
+        with self._lock:
+            self.counts[name][what] += 1
+
+    def stats(self):
+        """{provider: {calls, coalesced, retries, throttled, circuit}}."""
+        with self._lock:
+            return {name: dict(c, circuit=self.breakers[name].state) for name, c in self.counts.items()}
+
+    async def call(self, source, request, fetch, timeout=None):
+        """Run `fetch()` (a coroutine function sending `request` to `source`) under the provider's limits.
+
+        Callers of an identical request in flight await the same call; it
+        is cancelled once every caller has given up. `timeout` is the
+        caller's deadline in seconds: no slot is waited for and no retry
+        is slept on past it.
+        """
+        self._provider(source)
+        loop = asyncio.get_running_loop()
+        until = time.monotonic() + timeout if timeout is not None else None
+        key = (loop, source.name, request_key(request) if self.coalesce else object())
+        flight = self._inflight.get(key)
+        if flight is None:
+            flight = self._inflight[key] = _Flight(until)
+            flight.task = loop.create_task(self._run(source, fetch, flight))
+            flight.task.add_done_callback(lambda t: self._settled(key, t))
+        else:
+            self._count(source.name, "coalesced")
+            if flight.until is not None:
+                flight.until = None if until is None else max(flight.until, until)
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if not flight.waiters and not flight.task.done():
+                flight.task.cancel()
+
+    def _settled(self, key, task):
+        self._inflight.pop(key, None)
+        if not task.cancelled():
+            task.exception()  # retrieved: callers that gave up must not trigger a warning
+
+    async def _run(self, source, fetch, flight):
+        bucket, breaker = self._provider(source)
+        attempt = 0
+        while True:
+            left = None if flight.until is None else flight.until - time.monotonic()
+            try:
+                breaker.admit(source.name)
+            except CircuitOpen:
+                self._count(source.name, "throttled")
+                raise
+            wait = bucket.reserve(left)
+            if wait is None:
+                self._count(source.name, "throttled")
+                raise Throttled(f"{source.name} rate limit ({bucket.rate:g}/s): no slot within {left:.1f}s")
+            if wait:
+                try:
+                    await asyncio.sleep(wait)
+                except asyncio.CancelledError:
+                    breaker.release()
+                    raise
+            self._count(source.name, "calls")
+            try:
+                result = await fetch()
+            except (httpx.HTTPStatusError, httpx.TransportError) as e:
+                if not retryable(e):
+                    breaker.release()  # the provider answered; the request was wrong
+                    raise
+                breaker.record(False)
+                delay = retry_after(e)
+                delay = min(BACKOFF_MAX, delay) if delay is not None else backoff(attempt)
+                left = None if flight.until is None else flight.until - time.monotonic()
+                if attempt >= self.retries or (left is not None and delay >= left):
+                    raise
+                attempt += 1
+                self._count(source.name, "retries")
+                if retry_after(e) is not None and bucket.rate is not None:
+                    bucket.pause(delay)  # holds back every search's requests, this retry included
+                    continue
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                breaker.release()
+                raise
+            breaker.record(True)
+            return result
+
+
+scheduler = Scheduler()
@@ -0,0 +1,126 @@
+"""Query-result cache: answers repeated searches from memory.db.
+
+Every logged search is remembered under its normalized query and its
+extracted keywords (search_query). A later search whose normalized text
+matches either key, within the TTL, is served from search_history instead
+of re-running the n8n pipeline. Entries are LRU-evicted past max_entries
+and vanish with their history row (ON DELETE CASCADE). Lookups only read;
+the last_used stamps of their hits are written in batches by touch().
+
+Keys also carry the settings that produced the answer (see profile()): an
+n8n answer is not replayed for the Python engine, nor a live search for a
+blended or semantically re-ranked one.
+"""
+import re
+import threading
+import time
+
+DEFAULT_TTL = 6 * 3600  # seconds
+MAX_ENTRIES = 1000
+DEFAULT_PROFILE = "n8n"
+
+
+def normalize_query(text):
+    """Lowercase word tokens joined by single spaces: "LLM  Quantization!" -> "llm quantization"."""
+    return " ".join(re.findall(r"\w+", str(text or "").lower()))
+
+
+def profile(engine="n8n", mode="live", semantic=False):
+    """Settings an answer was produced under: "n8n", "python:live", "python:blend+semantic"."""
+    if engine != "python":
+        return DEFAULT_PROFILE
+    return f"python:{mode}" + ("+semantic" if semantic else "")
+
+
+def cache_keys(query, search_query=None, profile=DEFAULT_PROFILE):
+    pairs = (("q:", normalize_query(query)), ("k:", normalize_query(search_query)))
+    return [f"{prefix}{profile}:{norm}" for prefix, norm in pairs if norm]
+
+
+class ResultCache:
+    """TTL + LRU policy over the result_cache table, with per-process hit/miss counters."""
+
+    def __init__(self, ttl=DEFAULT_TTL, max_entries=MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._used = {}  # cache_key -> time of its latest hit, not yet written
+        self._lock = threading.Lock()
+
+    def lookup(self, conn, query, profile=DEFAULT_PROFILE):
+        """Return the search_id cached for `query` under `profile`, or None. Counts a hit or a miss.
+
+        Read-only, so it runs on a reader connection; the hit's LRU stamp
+        waits for the next touch().
+        """
+        norm = normalize_query(query)
+        row = None
+        if norm:
+            # The typed text may equal an earlier query or its extracted keywords
+            row = conn.execute(
+                """
+                SELECT cache_key, search_id FROM result_cache
+                WHERE cache_key IN (?, ?) AND created_at >= ?
+                ORDER BY created_at DESC
+                LIMIT 1
+                """,
+                (f"q:{profile}:{norm}", f"k:{profile}:{norm}", time.time() - self.ttl),
+            ).fetchone()
+        with self._lock:
+            if row:
+                self.hits += 1
+                self._used[row[0]] = time.time()
+            else:
+                self.misses += 1
+        return row[1] if row else None
+
+    def touch(self, conn):
+        """Write the last_used stamps of the hits since the last call, in one statement; run it in a write transaction."""
+        with self._lock:
+            used, self._used = self._used, {}
+        if used:
+            conn.executemany(
+                "UPDATE result_cache SET last_used = MAX(last_used, ?) WHERE cache_key = ?",
+                [(stamp, key) for key, stamp in used.items()],
+            )
+
+    def remember(self, conn, query, search_query, search_id, profile=DEFAULT_PROFILE):
+        """Point the cache keys of this search (under `profile`) at `search_id` and enforce the size bound."""
+        self.touch(conn)  # pending hits count before anything is evicted
+        now = time.time()
+        conn.executemany(
+            """
+            INSERT INTO result_cache (cache_key, search_id, created_at, last_used)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(cache_key) DO UPDATE SET
+                search_id = excluded.search_id,
+                created_at = excluded.created_at,
+                last_used = excluded.last_used
+            """,
+            [(key, search_id, now, now) for key in cache_keys(query, search_query, profile)],
+        )
+        conn.execute(
+            """
+            DELETE FROM result_cache WHERE cache_key IN (
+                SELECT cache_key FROM result_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?
+            )
+            """,
+            (self.max_entries,),
+        )
+
+    def clear(self, conn):
+        conn.execute("DELETE FROM result_cache")
+        with self._lock:
+            self.hits = self.misses = 0
+            self._used = {}
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "ttl": self.ttl,
+            "max_entries": self.max_entries,
+        }
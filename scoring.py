@@ -0,0 +1,139 @@
+"""Vectorized "Score papers" stage.
+
+Computes the smartScore formula of the n8n node (title/abstract term
+coverage, exact-phrase bonus, year boost, log-citation blend) for a whole
+candidate set at once. Each title and abstract is normalized once, every
+query word yields one boolean presence vector over all candidates, and the
+formula runs as NumPy array arithmetic; the phrase join and the citation
+maximum are computed once per batch rather than once per paper.
+
+Two matching modes:
+  "token"     - query words must match whole tokens (lowercase \\w+ runs),
+                so "graph" no longer scores on "paragraph". The default for
+                the Python engine.
+  "substring" - the node's own `includes()` semantics; scores are identical
+                to engine.smart_score(), for side-by-side comparisons.
+
+Set SCORING_MATCH=substring to rank exactly like the n8n workflow.
+"""
+import os
+import re
+
+import numpy as np
+
+MATCH_MODES = ("token", "substring")
+DEFAULT_MATCH = os.environ.get("SCORING_MATCH", "token")
+
+_NON_WORD = re.compile(r"\W+")
+_YEAR_WORD = re.compile(r"\d{4}")
+# ASCII fast path of normalize_text(): lowercase word characters, blank the rest
+_ASCII_FOLD = str.maketrans({
+    chr(i): chr(i).lower() if re.match(r"\w", chr(i)) else " " for i in range(128)
+})
+
+
+def normalize_text(text):
+    """" a b c ": lowercase word tokens, space-separated and space-padded."""
+    return " " + " ".join(_NON_WORD.sub(" ", str(text or "").lower()).split()) + " "
+
+
+def scoring_words(search_query, match=DEFAULT_MATCH):
+    """Query words as the node filters them (>2 chars, no 4-digit years).
+
+    In token mode a word like "quantization-aware" contributes its tokens.
+    """
+    words = [w for w in search_query.lower().split() if len(w) > 2 and not _YEAR_WORD.fullmatch(w)]
+    if match == "token":
+        words = [t for w in words for t in normalize_text(w).split() if len(t) > 2 and not _YEAR_WORD.fullmatch(t)]
+    return words
+
+
+def _token_texts(texts):
+    """Padded token streams; " w " is a substring iff w is one of the tokens.
+
+    ASCII texts (nearly all) take a str.translate fast path that may leave
+    runs of spaces, which single-word lookups don't mind.
+    """
+    return [f" {t.translate(_ASCII_FOLD)} " if t.isascii() else normalize_text(t) for t in texts]
+
+
+def _present(texts, needle):
+    return np.fromiter((needle in t for t in texts), dtype=bool, count=len(texts))
+
+
+def _phrase_present(texts, words, present, match):
+    phrase = " ".join(words)
+    if match == "substring":
+        return _present(texts, phrase)
+    # Only texts holding every word can hold the phrase; collapse the
+    # spacing of just those before looking for the words in sequence
+    found = np.zeros(len(texts), dtype=bool)
+    needle = f" {phrase} "
+    for i in np.flatnonzero(np.logical_and.reduce(present)):
+        found[i] = needle in f" {' '.join(texts[i].split())} "
+    return found
+
+
+def content_scores(papers, words, requested_year=None, match=DEFAULT_MATCH):
+    """smartScore for every paper at once; returns a float64 array."""
+    n = len(papers)
+    if not n or not words:
+        return np.zeros(n)
+    if match not in MATCH_MODES:
+        raise ValueError(f"unknown match mode {match!r}")
+
+    title_matches = np.zeros(n)
+    abstract_matches = np.zeros(n)
+    phrase_bonus = np.zeros(n)
+    for field, weight, matches in (("title", 0.5, title_matches), ("abstract", 0.2, abstract_matches)):
+        if field == "title":
+            raw = [str(p.get("title") or "") for p in papers]
+        else:
+            raw = [str(p.get("snippet") or p.get("abstract") or "") for p in papers]
+        if match == "token":
+            texts, pad = _token_texts(raw), " "
+        else:
+            texts, pad = [t.lower() for t in raw], ""
+        present = [_present(texts, f"{pad}{w}{pad}") for w in words]
+        matches += np.sum(present, axis=0)
+        phrase_bonus += weight * _phrase_present(texts, words, present, match)
+
+    coverage = (title_matches + abstract_matches) / (len(words) * 2)
+    score = (title_matches * 3 + abstract_matches + phrase_bonus) / (len(words) * 4)
+
+    return np.where(coverage < 0.5, 0.0, year_boost(papers, score, requested_year))
+
+
+def year_boost(papers, score, requested_year):
+    """1.5x for papers whose year contains the requested one."""
+    if not requested_year:
+        return score
+    year = str(requested_year)
+    boosted = np.fromiter((bool(p.get("year")) and year in str(p["year"]) for p in papers), dtype=bool, count=len(papers))
+    return np.where(boosted, score * 1.5, score)
+
+
+def _citations(papers):
+    """cited_by as floats, NaN where unknown."""
+    values = [p.get("cited_by") for p in papers]
+    try:
+        return np.array(values, dtype=float)  # None -> NaN
+    except (TypeError, ValueError):
+        out = np.full(len(values), np.nan)
+        for i, v in enumerate(values):
+            try:
+                out[i] = float(v)
+            except (TypeError, ValueError):
+                pass
+        return out
+
+
+def final_scores(papers, content, has_year):
+    """Blend content scores with log-scaled citations, as the node does without a year."""
+    if has_year or not len(papers):
+        return content.copy()
+    cited = _citations(papers)
+    max_cite = max(np.nanmax(np.nan_to_num(cited, nan=0.0)), 1.0)
+    blend = ~np.isnan(cited) & (content > 0)
+    cite = np.log1p(np.where(blend, cited, 0.0)) / np.log1p(max_cite)
+    return np.where(blend, 0.85 * content + 0.15 * cite, content)
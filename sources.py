@@ -0,0 +1,565 @@
+"""Provider adapters for the Python search engine.
+
+Each adapter mirrors one request/parse node pair of `Paper Search Agent.json`:
+it builds the HTTP request for a keyword query and parses the provider's
+response into the common paper dict. Transport is left to the caller, so the
+same adapters work with any client whose responses offer `.text` and
+`.json()`.
+
+Endpoints and keys come from the environment. Setting PROVIDER_BASE_URL
+points every adapter (Ollama included) at one local stand-in server, e.g.
+`python benchmarks/fake_providers.py`, which serves `/arxiv`, `/scholar`,
+`/tavily`, `/semantic_scholar` (plus `/semantic_scholar/batch`) and `/ollama`.
+"""
+import json
+import os
+import re
+import xml.etree.ElementTree as ET
+
+PROVIDER_BASE_URL = os.environ.get("PROVIDER_BASE_URL")
+SNIPPET_CHARS = 240
+_YEAR_RE = re.compile(r"(19|20)\d{2}")
+
+
+def _endpoint(env_name, default, path):
+    if os.environ.get(env_name):
+        return os.environ[env_name]
+    if PROVIDER_BASE_URL:
+        return PROVIDER_BASE_URL.rstrip("/") + "/" + path
+    return default
+
+
+def _clip(text):
+    text = text or ""
+    return text[:SNIPPET_CHARS] + "..." if len(text) > SNIPPET_CHARS else text
+
+
+def _first_year(text):
+    m = _YEAR_RE.search(str(text or ""))
+    return m.group(0) if m else ""
+
+
+def _deadline(name, default):
+    return float(os.environ.get(f"{name.upper()}_DEADLINE", default))
+
+
+def _rate(name, default):
+    """Requests per second for a provider (ARXIV_RATE=...); 0 or None is unlimited.
+
+    The defaults are the real providers' limits, so stand-ins
+    (PROVIDER_BASE_URL) are only limited when the variable is set.
+    """
+    value = os.environ.get(f"{name.upper()}_RATE")
+    if value:
+        return float(value) or None
+    return None if PROVIDER_BASE_URL else default
+
+
+class Source:
+    """One literature provider: request builder plus response parser.
+
+    `timeout` is the provider's deadline in seconds; override it per
+    provider with e.g. ARXIV_DEADLINE=5. A request asks for `page_size`
+    results unless given a limit; deep searches page with `offset` up to
+    `max_page_size` results at a time and stop before `max_offset`
+    (providers without paging have `pageable` False). `rate` and `burst`
+    are the provider's request limits, enforced across all searches by
+    outbound.scheduler; override the rate with e.g. SEMANTIC_SCHOLAR_RATE.
+    Raw responses are cached for `cache_ttl` seconds (http_cache.py;
+    e.g. ARXIV_CACHE_TTL, 0 to never cache).
+    """
+
+    name = ""
+    timeout = 8.0
+    rate = None  # requests per second; None is unlimited
+    burst = 1
+    cache_ttl = 3600.0
+    page_size = 10
+    max_page_size = 10
+    max_offset = None
+    pageable = True
+
+    def __init__(self, url, api_key=None, timeout=None):
+        self.url = url
+        self.api_key = api_key
+        self.timeout = timeout if timeout is not None else _deadline(self.name, self.timeout)
+        self.rate = _rate(self.name, self.rate)
+        self.burst = int(os.environ.get(f"{self.name.upper()}_BURST", self.burst))
+        self.cache_ttl = float(os.environ.get(f"{self.name.upper()}_CACHE_TTL", self.cache_ttl))
+
+    def build_request(self, search_query, offset=0, limit=None):
+        """Keyword arguments for `client.request(...)` (httpx) for one page of results."""
+        raise NotImplementedError
+
+    def parse(self, response):
+        """List of paper dicts from a successful response."""
+        raise NotImplementedError
+
+    def stream_parser(self):
+        """Incremental parser (feed(bytes) / close() -> papers), or None to parse whole bodies."""
+        return None
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.url!r})"
+
+
+# ----------------- arXiv -----------------
+# The Atom feed is parsed incrementally: bytes are fed as they arrive and
+# each <entry> becomes a paper as soon as its end tag is seen, then is
+# dropped from the tree, so memory stays bounded by one entry.
+
+ATOM = "{http://www.w3.org/2005/Atom}"
+ARXIV_NS = "{http://arxiv.org/schemas/atom}"
+_ARXIV_ID_RE = re.compile(r"arxiv\.org/abs/(.+?)(?:v\d+)?$")
+
+
+def _text(elem, tag):
+    """Whitespace-collapsed text of a child element, or ""."""
+    child = elem.find(tag)
+    return " ".join(child.text.split()) if child is not None and child.text else ""
+
+
+def arxiv_entry(entry):
+    """Paper dict for one Atom <entry> element (same fields as the n8n node, plus ids)."""
+    title = _text(entry, ATOM + "title")
+    summary = _text(entry, ATOM + "summary")
+    published = _text(entry, ATOM + "published")
+    date = published.split("T")[0] if published else "Unknown date"
+    link = _text(entry, ATOM + "id")
+    m = _ARXIV_ID_RE.search(link)
+
+    doi = _text(entry, ARXIV_NS + "doi")
+    if not doi:
+        for l in entry.iter(ATOM + "link"):
+            if l.get("title") == "doi":
+                doi = l.get("href", "").split("doi.org/")[-1]
+    primary = entry.find(ARXIV_NS + "primary_category")
+    categories = [c.get("term") for c in entry.iter(ATOM + "category") if c.get("term")]
+    authors = ", ".join(filter(None, (_text(a, ATOM + "name") for a in entry.iter(ATOM + "author"))))
+
+    paper = {
+        "source": "arxiv",
+        "title": title or "No title",
+        "authors_venue_year": authors or "Unknown authors",
+        "year": date[:4] if date != "Unknown date" else "",
+        "cited_by": None,
+        "snippet": _clip(summary) if summary else "No abstract",
+        "link": link or "No link",
+        "date": date,
+        "arxiv_id": m.group(1) if m else None,
+        "primary_category": primary.get("term") if primary is not None else (categories[0] if categories else None),
+        "categories": categories,
+    }
+    if doi:
+        paper["doi"] = doi.split()[0]
+    return paper
+
+
+class ArxivFeedParser:
+    """Incremental Atom parser: feed() bytes, get back the papers completed so far."""
+
+    def __init__(self):
+        self._parser = ET.XMLPullParser(events=("start", "end"))
+        self._feed = None
+
+    def _drain(self):
+        papers = []
+        try:
+            for event, elem in self._parser.read_events():
+                if event == "start":
+                    if self._feed is None:
+                        self._feed = elem
+                elif elem.tag == ATOM + "entry":
+                    papers.append(arxiv_entry(elem))
+                    self._feed.remove(elem)
+        except ET.ParseError as e:
+            raise ValueError(f"malformed arXiv feed: {e}") from e
+        return papers
+
+    def feed(self, data):
+        try:
+            self._parser.feed(data)
+        except ET.ParseError as e:
+            raise ValueError(f"malformed arXiv feed: {e}") from e
+        return self._drain()
+
+    def close(self):
+        try:
+            self._parser.close()
+        except ET.ParseError as e:
+            raise ValueError(f"malformed arXiv feed: {e}") from e
+        return self._drain()
+
+
+def parse_arxiv(xml):
+    """Papers of a complete arXiv Atom response (str or bytes)."""
+    parser = ArxivFeedParser()
+    return parser.feed(xml.encode("utf-8") if isinstance(xml, str) else xml) + parser.close()
+
+
+class ArxivSource(Source):
+    name = "arxiv"
+    rate = 1 / 3  # arXiv API terms: one request every three seconds
+    cache_ttl = 3600.0  # sorted by submission date; new listings appear daily
+    page_size = 40
+    max_page_size = 200
+
+    def build_request(self, search_query, offset=0, limit=None):
+        params = {
+            "search_query": "all:" + search_query,
+            "max_results": limit or self.page_size,
+            "sortBy": "submittedDate",
+            "sortOrder": "descending",
+        }
+        if offset:
+            params["start"] = offset
+        return {"method": "GET", "url": self.url, "params": params}
+
+    def stream_parser(self):
+        return ArxivFeedParser()
+
+    def parse(self, response):
+        return parse_arxiv(response.content)
+
+
+# ----------------- Google Scholar (SerpAPI) -----------------
+
+def parse_scholar(data, limit=10):
+    """Port of the "Parse SerpAPI Scholar" node."""
+    papers = []
+    for r in (data.get("organic_results") or [])[:limit]:
+        pub_info = (r.get("publication_info") or {}).get("summary") or ""
+        cited_by = ((r.get("inline_links") or {}).get("cited_by") or {}).get("total")
+        papers.append({
+            "source": "scholar",
+            "title": r.get("title") or "No title",
+            "authors_venue_year": pub_info,
+            "year": _first_year(pub_info),
+            "cited_by": cited_by,
+            "snippet": _clip(r.get("snippet")),
+            "link": r.get("link") or r.get("result_id") or "",
+        })
+    return papers
+
+
+class ScholarSource(Source):
+    name = "scholar"
+    rate = 5.0
+    burst = 5
+    cache_ttl = 86400.0  # every SerpAPI search costs plan credit
+    max_page_size = 20  # SerpAPI's cap for Google Scholar
+
+    def build_request(self, search_query, offset=0, limit=None):
+        params = {"engine": "google_scholar", "q": search_query, "num": limit or self.page_size, "hl": "en",
+                  "api_key": self.api_key or ""}
+        if offset:
+            params["start"] = offset
+        return {"method": "GET", "url": self.url, "params": params}
+
+    def parse(self, response):
+        return parse_scholar(response.json(), self.max_page_size)
+
+
+# ----------------- Tavily -----------------
+
+def parse_tavily(data, limit=10):
+    """Port of the "Parse Tavily" node."""
+    papers = []
+    for r in (data.get("results") or [])[:limit]:
+        snippet = r.get("content") or r.get("snippet") or ""
+        papers.append({
+            "source": "tavily",
+            "title": r.get("title") or "No title",
+            "year": _first_year(snippet),
+            "cited_by": None,
+            "snippet": _clip(snippet),
+            "link": r.get("url") or "",
+        })
+    return papers
+
+
+class TavilySource(Source):
+    name = "tavily"
+    rate = 1.5  # 100 requests per minute on the free plan
+    burst = 5
+    cache_ttl = 21600.0
+    max_page_size = 20
+    pageable = False  # no offset: a deep search asks for one larger page
+
+    def build_request(self, search_query, offset=0, limit=None):
+        request = {
+            "method": "POST",
+            "url": self.url,
+            "json": {
+                "query": search_query + " paper OR journal OR study filetype:pdf",
+                "search_depth": "basic",
+                "max_results": limit or self.page_size,
+                "include_answer": False,
+                "include_raw_content": False,
+            },
+        }
+        if self.api_key:
+            request["headers"] = {"Authorization": f"Bearer {self.api_key}"}
+        return request
+
+    def parse(self, response):
+        return parse_tavily(response.json(), self.max_page_size)
+
+
+# ----------------- Semantic Scholar -----------------
+
+def parse_semantic_scholar(data):
+    """Port of the "Parse Semantic Scholar" node."""
+    if not isinstance(data.get("data"), list):
+        return []
+    papers = []
+    for p in data["data"]:
+        authors = ", ".join(a.get("name") or "" for a in p.get("authors") or [])
+        year = str(p["year"]) if p.get("year") else ""
+        paper = {
+            "source": "semantic_scholar",
+            "title": p.get("title") or "No title",
+            "authors_venue_year": " - ".join(str(x) for x in (authors, p.get("venue"), p.get("year")) if x),
+            "year": year,
+            "cited_by": p.get("citationCount"),
+            "snippet": _clip(p.get("abstract")),
+            "link": p.get("url") or "",
+        }
+        # Identifiers let dedup and storage match the arXiv/publisher copies
+        external = p.get("externalIds") or {}
+        if external.get("DOI"):
+            paper["doi"] = external["DOI"]
+        if external.get("ArXiv"):
+            paper["arxiv_id"] = external["ArXiv"]
+        papers.append(paper)
+    return papers
+
+
+class SemanticScholarSource(Source):
+    name = "semantic_scholar"
+    timeout = 10.0
+    rate = 1.0  # the API key's introductory limit
+    cache_ttl = 86400.0
+    page_size = 5
+    max_page_size = 100
+    max_offset = 1000  # the relevance search endpoint serves the first 1,000 hits
+    fields = "title,authors,year,venue,abstract,citationCount,url,externalIds"
+
+    def build_request(self, search_query, offset=0, limit=None):
+        params = {"query": search_query, "limit": limit or self.page_size, "fields": self.fields}
+        if offset:
+            params["offset"] = offset
+        request = {"method": "GET", "url": self.url, "params": params}
+        if self.api_key:
+            request["headers"] = {"x-api-key": self.api_key}
+        return request
+
+    def parse(self, response):
+        return parse_semantic_scholar(response.json())
+
+
+def parse_semantic_scholar_batch(data):
+    """One metadata dict (or None for ids Semantic Scholar does not know) per requested id, in order."""
+    if not isinstance(data, list):
+        raise ValueError("Semantic Scholar batch answer is not a list")
+    records = []
+    for p in data:
+        if not isinstance(p, dict):
+            records.append(None)
+            continue
+        external = p.get("externalIds") or {}
+        records.append({
+            "title": p.get("title") or "",
+            "cited_by": p.get("citationCount"),
+            "venue": p.get("venue") or "",
+            "year": str(p["year"]) if p.get("year") else "",
+            "abstract": " ".join((p.get("abstract") or "").split()),
+            "doi": external.get("DOI"),
+            "arxiv_id": external.get("ArXiv"),
+        })
+    return records
+
+
+class SemanticScholarBatchSource(Source):
+    """Metadata for up to `max_ids` papers per request (POST /graph/v1/paper/batch).
+
+    Ids are Semantic Scholar's prefixed forms ("ARXIV:2106.15928",
+    "DOI:10.1145/...", "URL:https://..."); parse() returns one record per
+    id, None where the paper is unknown. It shares the provider name, so
+    the search and batch endpoints draw on one rate limit, as they share
+    one API key.
+    """
+
+    name = "semantic_scholar"
+    timeout = 5.0
+    rate = 1.0
+    cache_ttl = 86400.0
+    max_ids = 500  # the endpoint's cap per request
+    fields = "title,venue,year,abstract,citationCount,externalIds"
+
+    def build_request(self, ids, offset=0, limit=None):
+        request = {"method": "POST", "url": self.url, "params": {"fields": self.fields}, "json": {"ids": list(ids)}}
+        if self.api_key:
+            request["headers"] = {"x-api-key": self.api_key}
+        return request
+
+    def parse(self, response):
+        return parse_semantic_scholar_batch(response.json())
+
+
+# ----------------- Ollama keyword extraction -----------------
+
+SYSTEM_PROMPT = """
+You are NOT a chat assistant.
+You are a function.
+
+Your only job:
+Extract search keywords from the user text and return JSON.
+
+You MUST output ONLY this format:
+{"search_query":"..."}
+
+No greetings.
+No explanations.
+No emojis.
+No markdown.
+No extra text.
+
+If you break the format, the system fails.
+
+Example:
+User: Find papers about microscopy in 2025
+Output: {"search_query":"microscopy 2025"}
+
+Now process this user message:
+"""
+
+# The n8n fallback's stop words, matched as whole words (as substrings they
+# turned "attention" into "attenti")
+_FILLER_RE = re.compile(r"\b(?:find|papers|about|on|in|for|please|show|me|research|query|search)\b")
+OLLAMA_KEEP_ALIVE = os.environ.get("OLLAMA_KEEP_ALIVE", "30m")
+
+
+def parse_ollama_json(raw):
+    """Port of the "Parse Ollama JSON" node: reply text or object -> keywords."""
+    if isinstance(raw, dict):
+        if raw.get("search_query"):
+            return str(raw["search_query"]).strip()
+        if isinstance(raw.get("json"), dict) and raw["json"].get("search_query"):
+            return str(raw["json"]["search_query"]).strip()
+
+    text = str(raw if not isinstance(raw, dict) else json.dumps(raw)).strip()
+    first, last = text.find("{"), text.rfind("}")
+    if first != -1 and last > first:
+        try:
+            parsed = json.loads(text[first:last + 1])
+            if isinstance(parsed, dict) and parsed.get("search_query"):
+                return str(parsed["search_query"]).strip()
+        except ValueError:
+            pass
+
+    cleaned = _FILLER_RE.sub("", text.lower())
+    cleaned = re.sub(r"\s+", " ", re.sub(r"[^a-z0-9\s]", " ", cleaned)).strip()
+    return cleaned or "General Research"
+
+
+class OllamaExtractor:
+    """Keyword extraction through a local Ollama chat model.
+
+    keep_alive keeps the model loaded between searches; with the system
+    prompt always first and unchanged, Ollama also reuses its cached
+    prefix and only processes the user message.
+    """
+
+    def __init__(self, url, model="qwen3:4b", timeout=None, keep_alive=OLLAMA_KEEP_ALIVE):
+        self.url = url
+        self.model = model
+        self.timeout = timeout if timeout is not None else _deadline("ollama", 15.0)
+        self.keep_alive = keep_alive
+
+    def build_request(self, query):
+        return {
+            "method": "POST",
+            "url": self.url,
+            "json": {
+                "model": self.model,
+                "messages": [
+                    {"role": "system", "content": SYSTEM_PROMPT},
+                    {"role": "user", "content": str(query)},
+                ],
+                "stream": False,
+                "keep_alive": self.keep_alive,
+                "options": {"temperature": 0},
+            },
+        }
+
+    def parse(self, response):
+        data = response.json()
+        raw = ((data.get("message") or {}).get("content")
+               or ((data.get("choices") or [{}])[0].get("message") or {}).get("content")
+               or data.get("response")
+               or data.get("content")
+               or data)
+        return parse_ollama_json(raw)
+
+
+class OllamaEmbedder:
+    """Text embeddings from a local Ollama embedding model (/api/embed).
+
+    One request embeds a whole batch of texts; parse() returns one vector
+    (list of floats) per input, in order.
+    """
+
+    def __init__(self, url, model="nomic-embed-text", timeout=None, keep_alive=OLLAMA_KEEP_ALIVE):
+        self.url = url
+        self.model = model
+        self.timeout = timeout if timeout is not None else _deadline("ollama_embed", 30.0)
+        self.keep_alive = keep_alive
+
+    def build_request(self, texts):
+        return {
+            "method": "POST",
+            "url": self.url,
+            "json": {"model": self.model, "input": [str(t) for t in texts], "keep_alive": self.keep_alive},
+        }
+
+    def parse(self, response):
+        vectors = response.json().get("embeddings")
+        if not isinstance(vectors, list):
+            raise ValueError("Ollama returned no embeddings")
+        return vectors
+
+
+def default_sources():
+    """The four providers of the n8n workflow, configured from the environment."""
+    return [
+        ArxivSource(_endpoint("ARXIV_URL", "http://export.arxiv.org/api/query", "arxiv")),
+        ScholarSource(_endpoint("SERPAPI_URL", "https://serpapi.com/search.json", "scholar"),
+                      api_key=os.environ.get("SERPAPI_API_KEY")),
+        TavilySource(_endpoint("TAVILY_URL", "https://api.tavily.com/search", "tavily"),
+                     api_key=os.environ.get("TAVILY_API_KEY")),
+        SemanticScholarSource(_endpoint("SEMANTIC_SCHOLAR_URL", "https://api.semanticscholar.org/graph/v1/paper/search", "semantic_scholar"),
+                              api_key=os.environ.get("SEMANTIC_SCHOLAR_API_KEY")),
+    ]
+
+
+def default_enricher():
+    return SemanticScholarBatchSource(
+        _endpoint("SEMANTIC_SCHOLAR_BATCH_URL", "https://api.semanticscholar.org/graph/v1/paper/batch",
+                  "semantic_scholar/batch"),
+        api_key=os.environ.get("SEMANTIC_SCHOLAR_API_KEY"),
+    )
+
+
+def default_extractor():
+    return OllamaExtractor(
+        _endpoint("OLLAMA_URL", "http://127.0.0.1:11434/api/chat", "ollama"),
+        model=os.environ.get("OLLAMA_MODEL", "qwen3:4b"),
+    )
+
+
+def default_embedder():
+    return OllamaEmbedder(
+        _endpoint("OLLAMA_EMBED_URL", "http://127.0.0.1:11434/api/embed", "ollama_embed"),
+        model=os.environ.get("OLLAMA_EMBED_MODEL", "nomic-embed-text"),
+    )
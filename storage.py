@@ -0,0 +1,452 @@
+"""Shared SQLite access layer for the Streamlit UI and the memory API.
+
+Both processes talk to memory.db through a small pool of long-lived
+connections opened in WAL mode, so UI readers never block the /log_search
+writer and no query pays for a fresh connect().
+"""
+import hashlib
+import json
+import os
+import queue
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+DB_PATH = Path(os.environ.get("PAPER_SEARCH_DB", Path(__file__).parent / "memory.db"))
+
+# Applied to every new connection. WAL lets readers run alongside a writer;
+# synchronous=NORMAL is durable across app crashes in WAL mode and skips the
+# per-commit fsync of the main database file.
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-16000",  # ~16 MB page cache per connection
+    "PRAGMA mmap_size=268435456",  # 256 MB memory-mapped reads
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA foreign_keys=ON",
+)
+LOCK_TIMEOUT = 20.0
+POOL_SIZE = 4
+# Compiled statements kept per connection, reused across calls
+STATEMENT_CACHE_SIZE = 256
+
+
+class ConnectionPool:
+    """Hands out pooled connections to one database file.
+
+    Connections are created lazily and returned to the pool after use; at
+    most `size` idle connections are kept, extra ones are closed on release.
+    """
+
+    def __init__(self, path=DB_PATH, size=POOL_SIZE):
+        self.path = Path(path)
+        self.size = size
+        self._idle = queue.LifoQueue()
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.path,
+            timeout=LOCK_TIMEOUT,
+            isolation_level=None,  # autocommit; writes use explicit transactions
+            check_same_thread=False,
+            cached_statements=STATEMENT_CACHE_SIZE,
+        )
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection for reads (each statement sees a fresh snapshot)."""
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            if self._idle.qsize() < self.size:
+                self._idle.put(conn)
+            else:
+                conn.close()
+
+    @contextmanager
+    def transaction(self):
+        """Borrow a connection inside a write transaction, committed on success."""
+        with self.connection() as conn:
+            # IMMEDIATE takes the write lock up front instead of failing mid-way
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.rollback()
+                raise
+            conn.commit()
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(path=None):
+    """Return the process-wide pool for `path` (defaults to DB_PATH)."""
+    key = Path(path or DB_PATH)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = ConnectionPool(key)
+        return pool
+
+
+def connection():
+    return get_pool().connection()
+
+
+def transaction():
+    return get_pool().transaction()
+
+
+# ----------------- Papers -----------------
+# Every paper is stored once in `papers`, keyed by a normalized identity;
+# searches and favorites reference it instead of carrying JSON copies.
+
+PAPER_COLUMNS = ("source", "title", "authors_venue_year", "year", "cited_by", "snippet", "link", "date", "doi", "arxiv_id")
+
+_DOI_RE = re.compile(r"\b(10\.\d{4,9}/[^\s?#\"<>]+)", re.I)
+_ARXIV_RE = re.compile(r"arxiv\.org/(?:abs|pdf)/([a-z\-]+(?:\.[a-z]{2})?/\d{7}|\d{4}\.\d{4,5})(?:v\d+)?", re.I)
+_ARXIV_ID_RE = re.compile(r"^(?:arxiv:)?([a-z\-]+(?:\.[a-z]{2})?/\d{7}|\d{4}\.\d{4,5})(?:v\d+)?$", re.I)
+_UNTITLED = {"", "notitle", "untitledpaper", "untitledresult"}
+_NON_ALNUM_RE = re.compile(r"[^a-z0-9]")
+_NO_LINK = ("", "#", "No link")
+_TRACKING_PARAM_RE = re.compile(r"^(utm_\w+|fbclid|gclid|ref|source)=", re.I)
+
+
+def normalize_title(title):
+    """Same key the "Deduplicate papers" node uses: lowercase alphanumerics only."""
+    return _NON_ALNUM_RE.sub("", str(title or "").lower())
+
+
+def is_untitled(title):
+    """True for empty titles and the placeholders the parsers emit ("No title")."""
+    return normalize_title(title) in _UNTITLED
+
+
+def paper_doi(paper):
+    """Lowercased DOI from the doi field or the link, or None."""
+    text = str(paper.get("doi") or paper.get("link") or "")
+    m = _DOI_RE.search(text) if "10." in text else None
+    return m.group(1).lower().rstrip(".") if m else None
+
+
+def paper_arxiv_id(paper):
+    """Version-less arXiv id from the link or the arxiv_id field, or None."""
+    link = str(paper.get("link") or "")
+    m = _ARXIV_RE.search(link) if "arxiv" in link.lower() else None
+    if not m and paper.get("arxiv_id"):
+        m = _ARXIV_ID_RE.match(str(paper["arxiv_id"]).strip())
+    return m.group(1).lower() if m else None
+
+
+def canonical_url(link):
+    """Comparable form of a link: no scheme, www., fragment, tracking parameters or trailing slash.
+
+    arXiv PDF links collapse onto their abstract page. Returns None for
+    placeholder links.
+    """
+    link = str(link or "").strip()
+    if link in _NO_LINK:
+        return None
+    m = _ARXIV_RE.search(link) if "arxiv" in link.lower() else None
+    if m:
+        return "arxiv.org/abs/" + m.group(1).lower()
+    link = re.sub(r"^[a-z]+://", "", link.split("#")[0], flags=re.I)
+    host, _, rest = link.partition("/")
+    path, _, query = rest.partition("?")
+    params = "&".join(sorted(p for p in query.split("&") if p and not _TRACKING_PARAM_RE.match(p)))
+    host = host.lower().removeprefix("www.")
+    path = path.rstrip("/")
+    return host + (f"/{path}" if path else "") + (f"?{params}" if params else "")
+
+
+def paper_key(paper):
+    """Stable identity for a paper: DOI, then arXiv id, then normalized title."""
+    link = str(paper.get("link") or "")
+    doi = paper_doi(paper)
+    if doi:
+        return "doi:" + doi
+    arxiv_id = paper_arxiv_id(paper)
+    if arxiv_id:
+        return "arxiv:" + arxiv_id
+    if not is_untitled(paper.get("title")):
+        return "title:" + normalize_title(paper.get("title"))
+    if link not in _NO_LINK:
+        return "url:" + link
+    blob = json.dumps(paper, sort_keys=True, ensure_ascii=False, default=str)
+    return "hash:" + hashlib.sha1(blob.encode("utf-8")).hexdigest()
+
+
+def _cited_by(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def upsert_paper(conn, paper):
+    """Insert or refresh a paper and return its id. Newer non-empty fields win."""
+    values = [paper.get(c) for c in PAPER_COLUMNS]
+    values[PAPER_COLUMNS.index("cited_by")] = _cited_by(paper.get("cited_by"))
+    # Normalized identifiers, so the row re-reads to the same paper_key
+    values[PAPER_COLUMNS.index("doi")] = paper_doi(paper)
+    values[PAPER_COLUMNS.index("arxiv_id")] = paper_arxiv_id(paper)
+    values = [None if v == "" else v for v in values]
+    row = conn.execute(
+        """
+        INSERT INTO papers (paper_key, source, title, authors_venue_year, year, cited_by, snippet, link, date, doi, arxiv_id)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(paper_key) DO UPDATE SET
+            source = COALESCE(excluded.source, source),
+            title = COALESCE(excluded.title, title),
+            authors_venue_year = COALESCE(excluded.authors_venue_year, authors_venue_year),
+            year = COALESCE(excluded.year, year),
+            cited_by = MAX(COALESCE(excluded.cited_by, cited_by), COALESCE(cited_by, excluded.cited_by)),
+            snippet = COALESCE(excluded.snippet, snippet),
+            link = COALESCE(excluded.link, link),
+            date = COALESCE(excluded.date, date),
+            doi = COALESCE(excluded.doi, doi),
+            arxiv_id = COALESCE(excluded.arxiv_id, arxiv_id)
+        RETURNING id
+        """,
+        [paper_key(paper), *values],
+    ).fetchone()
+    return row[0]
+
+
+def paper_from_row(row):
+    """Build a paper dict from the PAPER_COLUMNS part of a row, skipping NULLs."""
+    return {c: v for c, v in zip(PAPER_COLUMNS, row) if v is not None}
+
+
+def _result_rows(conn, search_id, papers):
+    rows = []
+    for rank, paper in enumerate(papers):
+        if not isinstance(paper, dict):
+            continue
+        score = paper.get("final_score")
+        rows.append((
+            search_id,
+            upsert_paper(conn, paper),
+            rank,
+            score if isinstance(score, (int, float)) else None,
+            1 if paper.get("year_warning") else 0,
+        ))
+    return rows
+
+
+def save_search_results(conn, search_id, papers):
+    """Store the ranked papers of one search through the papers/search_results tables."""
+    conn.executemany(
+        "INSERT OR REPLACE INTO search_results (search_id, paper_id, rank, score, year_warning) VALUES (?, ?, ?, ?, ?)",
+        _result_rows(conn, search_id, papers),
+    )
+
+
+def save_searches(conn, searches):
+    """Log many searches with their papers; call inside a write transaction.
+
+    `searches` holds (query, search_query, created_at, request_id, papers)
+    tuples. History rows and result rows each go in with one executemany;
+    returns the new search ids in input order.
+    """
+    if not searches:
+        return []
+    # Ids are assigned here rather than read back: the next AUTOINCREMENT id
+    # is one past both the sequence and the largest id, and the write
+    # transaction keeps other writers out until commit
+    base = conn.execute(
+        """
+        SELECT MAX(COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'search_history'), 0),
+                   COALESCE((SELECT MAX(id) FROM search_history), 0))
+        """
+    ).fetchone()[0]
+    ids = list(range(base + 1, base + len(searches) + 1))
+    conn.executemany(
+        "INSERT INTO search_history (id, query, search_query, created_at, request_id) VALUES (?, ?, ?, ?, ?)",
+        [(search_id, *s[:4]) for search_id, s in zip(ids, searches)],
+    )
+    rows = []
+    for search_id, search in zip(ids, searches):
+        rows.extend(_result_rows(conn, search_id, search[4]))
+    conn.executemany(
+        "INSERT OR REPLACE INTO search_results (search_id, paper_id, rank, score, year_warning) VALUES (?, ?, ?, ?, ?)",
+        rows,
+    )
+    return ids
+
+
+def load_search_results(conn, search_ids):
+    """Return {search_id: [paper, ...]} in rank order for the given searches."""
+    results = {sid: [] for sid in search_ids}
+    ids = list(results)
+    # Stay well below SQLite's bound-parameter limit
+    for start in range(0, len(ids), 500):
+        chunk = ids[start:start + 500]
+        rows = conn.execute(
+            f"""
+            SELECT r.search_id, r.score, r.year_warning, {", ".join("p." + c for c in PAPER_COLUMNS)}
+            FROM search_results r
+            JOIN papers p ON p.id = r.paper_id
+            WHERE r.search_id IN ({", ".join("?" * len(chunk))})
+            ORDER BY r.search_id, r.rank
+            """,
+            chunk,
+        ).fetchall()
+        for row in rows:
+            results[row[0]].append(_result_paper(row[1:]))
+    return results
+
+
+def _result_paper(row):
+    """Paper from (score, year_warning, *PAPER_COLUMNS)."""
+    paper = paper_from_row(row[2:])
+    if row[0] is not None:
+        paper["final_score"] = row[0]
+    if row[1]:
+        paper["year_warning"] = True
+    return paper
+
+
+def search_results_page(conn, search_id, offset=0, limit=20):
+    """One page of a search's ranked papers by rank range; returns (papers, total)."""
+    total = conn.execute("SELECT COUNT(*) FROM search_results WHERE search_id = ?", (search_id,)).fetchone()[0]
+    rows = conn.execute(
+        f"""
+        SELECT r.score, r.year_warning, {", ".join("p." + c for c in PAPER_COLUMNS)}
+        FROM search_results r
+        JOIN papers p ON p.id = r.paper_id
+        WHERE r.search_id = ?
+        ORDER BY r.rank
+        LIMIT ? OFFSET ?
+        """,
+        (search_id, limit, offset),
+    ).fetchall()
+    return [_result_paper(row) for row in rows], total
+
+
+# ----------------- History -----------------
+
+HISTORY_PAGE_SIZE = 20
+_MAX_ID = 2 ** 63 - 1
+
+
+def get_search(conn, search_id=None, request_id=None):
+    """One logged search with its ranked papers, by id or by request_id; None if absent."""
+    column, value = ("id", search_id) if search_id is not None else ("request_id", request_id)
+    row = conn.execute(
+        f"SELECT id, query, search_query, created_at FROM search_history WHERE {column} = ?",
+        (value,),
+    ).fetchone()
+    if not row:
+        return None
+    return {
+        "id": row[0],
+        "query": row[1],
+        "search_query": row[2],
+        "top_results": load_search_results(conn, [row[0]])[row[0]],
+        "created_at": row[3],
+    }
+
+
+def history_page(conn, before_id=None, limit=HISTORY_PAGE_SIZE):
+    """Keyset page of search headers, newest first.
+
+    Returns (entries, next_cursor); pass next_cursor back as `before_id` to
+    get the following page. next_cursor is None on the last page. Results
+    are not loaded here, only counted.
+    """
+    rows = conn.execute(
+        """
+        SELECT h.id, h.query, h.search_query, h.created_at,
+               (SELECT COUNT(*) FROM search_results r WHERE r.search_id = h.id)
+        FROM search_history h
+        WHERE h.id < ?
+        ORDER BY h.id DESC
+        LIMIT ?
+        """,
+        (_MAX_ID if before_id is None else before_id, limit + 1),
+    ).fetchall()
+    entries = [
+        {"id": r[0], "query": r[1], "search_query": r[2], "created_at": r[3], "result_count": r[4]}
+        for r in rows[:limit]
+    ]
+    next_cursor = entries[-1]["id"] if len(rows) > limit else None
+    return entries, next_cursor
+
+
+# ----------------- Full-text search -----------------
+# history_fts / papers_fts are maintained by triggers (see migrations.py).
+
+
+def fts_query(text):
+    """Turn free text into an FTS5 query: every word must match, the last as a prefix."""
+    terms = re.findall(r"\w+", str(text or "").lower())
+    if not terms:
+        return None
+    return " ".join([f'"{t}"' for t in terms[:-1]] + [f'"{terms[-1]}"*'])
+
+
+def search_papers(conn, text, limit=20):
+    """Stored papers matching `text`, best first (title hits weigh 3x snippet hits)."""
+    match = fts_query(text)
+    if not match:
+        return []
+    rows = conn.execute(
+        f"""
+        SELECT p.id, {", ".join("p." + c for c in PAPER_COLUMNS)}
+        FROM papers_fts
+        JOIN papers p ON p.id = papers_fts.rowid
+        WHERE papers_fts MATCH ?
+        ORDER BY bm25(papers_fts, 3.0, 1.0)
+        LIMIT ?
+        """,
+        (match, limit),
+    ).fetchall()
+    return [dict(paper_from_row(r[1:]), paper_id=r[0]) for r in rows]
+
+
+def search_history(conn, text, limit=50):
+    """History headers (as in history_page) whose query, keywords or saved papers match `text`."""
+    match = fts_query(text)
+    if not match:
+        return []
+    rows = conn.execute(
+        """
+        SELECT h.id, h.query, h.search_query, h.created_at,
+               (SELECT COUNT(*) FROM search_results r WHERE r.search_id = h.id)
+        FROM search_history h
+        WHERE h.id IN (
+            SELECT rowid FROM history_fts WHERE history_fts MATCH ?
+            UNION
+            SELECT r.search_id FROM search_results r
+            WHERE r.paper_id IN (SELECT rowid FROM papers_fts WHERE papers_fts MATCH ?)
+        )
+        ORDER BY h.id DESC
+        LIMIT ?
+        """,
+        (match, match, limit),
+    ).fetchall()
+    return [
+        {"id": r[0], "query": r[1], "search_query": r[2], "created_at": r[3], "result_count": r[4]}
+        for r in rows
+    ]
@@ -0,0 +1,71 @@
+import importlib.util
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# The modules live at the repository root (run as scripts, not installed)
+sys.path.insert(0, str(ROOT))
+# Never touch the real memory.db; storage reads this at import
+os.environ.setdefault("PAPER_SEARCH_DB", os.path.join(tempfile.mkdtemp(prefix="paper-search-tests-"), "memory.db"))
+
+
+@pytest.fixture(scope="session")
+def fake_providers():
+    """benchmarks/fake_providers.py, the local stand-ins for every provider."""
+    spec = importlib.util.spec_from_file_location("fake_providers", ROOT / "benchmarks" / "fake_providers.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def provider_server(fake_providers):
+    """A fresh stand-in server: (server, base_url)."""
+    server, base_url = fake_providers.start()
+    yield server, base_url
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def stand_ins(provider_server):
+    """The four search providers pointed at the stand-in server, without rate limits."""
+    import sources
+
+    _, base_url = provider_server
+    found = [
+        sources.ArxivSource(f"{base_url}/arxiv"),
+        sources.ScholarSource(f"{base_url}/scholar", api_key="test"),
+        sources.TavilySource(f"{base_url}/tavily", api_key="test"),
+        sources.SemanticScholarSource(f"{base_url}/semantic_scholar"),
+    ]
+    for source in found:
+        source.rate = None
+    return found
+
+
+@pytest.fixture
+def http_cache(tmp_path, monkeypatch):
+    """A fresh HTTP response cache in tmp_path, installed as http_cache.cache."""
+    import http_cache as module
+    import storage
+
+    cache = module.HttpCache(path=tmp_path / "test.httpcache")
+    monkeypatch.setattr(module, "cache", cache)
+    yield cache
+    storage.get_pool(cache.path).close()
+
+
+@pytest.fixture(autouse=True)
+def scheduler(monkeypatch):
+    """Provider limits, breakers and counters start afresh in every test."""
+    import outbound
+
+    fresh = outbound.Scheduler()
+    monkeypatch.setattr(outbound, "scheduler", fresh)
+    return fresh
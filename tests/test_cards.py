@@ -0,0 +1,33 @@
+import app
+
+
+def card(**fields):
+    paper = {"source": "tavily", "title": "A Paper", "year": "2024", "cited_by": 3,
+             "snippet": "Short abstract.", "link": "https://example.org/paper"}
+    return app.render_paper_card(dict(paper, **fields), 1)
+
+
+def test_multiline_snippet_stays_on_one_line():
+    html = card(snippet="First paragraph.\n\n    Indented second paragraph\twith a tab.")
+    assert "\n" not in html
+    assert "First paragraph. Indented second paragraph with a tab...." in html
+
+
+def test_markup_in_fields_is_escaped():
+    html = card(
+        title="Attention <script>alert(1)</script>",
+        snippet="We show that x < y & <b>z</b> > w",
+        source="<i>web</i>",
+        link='https://example.org/?q="><img src=x>',
+        links=[{"source": "x<y", "link": 'https://example.org/b"c'}],
+    )
+    assert "<script>" not in html and "&lt;script&gt;" in html
+    assert "<b>" not in html and "x &lt; y &amp; &lt;b&gt;z&lt;/b&gt; &gt; w" in html
+    assert "<i>" not in html
+    assert 'href="https://example.org/?q=&quot;&gt;&lt;img src=x&gt;"' in html
+    assert 'href="https://example.org/b&quot;c"' in html and "X&lt;Y" in html
+
+
+def test_snippet_is_cut_before_escaping():
+    html = card(snippet="&" * 300)
+    assert html.count("&amp;") == 200
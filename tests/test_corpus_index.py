@@ -0,0 +1,156 @@
+import math
+import random
+
+import numpy as np
+import pytest
+
+import corpus_index
+import engine
+import migrations
+import storage
+
+PAPERS = [
+    {"source": "arxiv", "title": "Graph Attention Networks", "snippet": "Attention over graph neighbourhoods.",
+     "link": "https://arxiv.org/abs/1710.10903", "arxiv_id": "1710.10903"},
+    {"source": "scholar", "title": "Sparse attention for long documents", "snippet": "A graph of sparse patterns.",
+     "link": "https://example.org/sparse"},
+    {"source": "tavily", "title": "Protein folding at scale", "snippet": "Structure prediction without attention.",
+     "link": "https://example.org/folding"},
+]
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    """A fresh memory.db holding PAPERS, indexed: (pool, {title: paper_id})."""
+    path = tmp_path / "corpus.db"
+    migrations.ensure_schema(path)
+    pool = storage.get_pool(path)
+    with pool.transaction() as conn:
+        ids = {p["title"]: storage.upsert_paper(conn, p) for p in PAPERS}
+        assert corpus_index.sync(conn) == 3
+    yield pool, ids
+    pool.close()
+
+
+def stats(pool, query=""):
+    with pool.connection() as conn:
+        return corpus_index.collection_stats(conn, corpus_index.query_terms(query))
+
+
+def found(pool, query):
+    with pool.connection() as conn:
+        return corpus_index.search(conn, query)
+
+
+def lengths(papers):
+    return (sum(len(corpus_index.tokenize(p["title"])) for p in papers),
+            sum(len(corpus_index.tokenize(p["snippet"])) for p in papers))
+
+
+def test_inserted_papers_are_indexed(corpus):
+    pool, ids = corpus
+    totals = stats(pool, "graph attention")
+    assert (totals["docs"], totals["title_len"], totals["snippet_len"]) == (3, *lengths(PAPERS))
+    assert totals["df"] == {"graph": 2, "attention": 3}
+    ranked = found(pool, "graph attention")
+    assert [p["title"] for p in ranked][:2] == ["Graph Attention Networks", "Sparse attention for long documents"]
+    assert [p["bm25"] for p in ranked] == sorted((p["bm25"] for p in ranked), reverse=True)
+    assert ranked[0]["paper_id"] == ids["Graph Attention Networks"]
+    assert found(pool, "2021 of") == [] and found(pool, "unseen") == []
+
+
+def test_search_agrees_with_scoring_the_same_papers_in_memory(corpus):
+    pool, _ = corpus
+    ranked = found(pool, "graph attention")
+    expected = corpus_index.score_candidates(ranked, "graph attention", stats(pool, "graph attention"))
+    assert np.allclose([p["bm25"] for p in ranked], expected)
+
+
+def test_bm25f_by_hand():
+    totals = {"docs": 4, "title_len": 8, "snippet_len": 40}
+    tf = {"title": np.array([1.0]), "snippet": np.array([2.0])}
+    lens = {"title": np.array([2.0]), "snippet": np.array([10.0])}
+    idf = math.log(1 + (4 - 1 + 0.5) / (1 + 0.5))
+    pseudo = 3.0 * 1 / (0.25 + 0.75 * 2 / 2) + 1.0 * 2 / (0.25 + 0.75 * 10 / 10)
+    assert math.isclose(corpus_index.bm25f(tf, lens, totals, idf)[0], idf * pseudo / (1.2 + pseudo))
+
+
+def test_edited_papers_are_reindexed(corpus):
+    pool, ids = corpus
+    edited = dict(PAPERS[2], title="Protein graph transformers", snippet="Folding by message passing.")
+    with pool.transaction() as conn:
+        conn.execute("UPDATE papers SET title = ?, snippet = ? WHERE id = ?",
+                     (edited["title"], edited["snippet"], ids["Protein folding at scale"]))
+        assert corpus_index.sync(conn) == 1
+    totals = stats(pool, "graph folding structure")
+    assert (totals["docs"], totals["title_len"], totals["snippet_len"]) == (3, *lengths(PAPERS[:2] + [edited]))
+    assert totals["df"] == {"graph": 3, "folding": 1, "structure": 0}
+    assert [p["title"] for p in found(pool, "transformers")] == ["Protein graph transformers"]
+    assert found(pool, "structure prediction") == []
+
+
+def test_deleted_papers_leave_the_index(corpus):
+    pool, ids = corpus
+    with pool.transaction() as conn:
+        conn.execute("DELETE FROM papers WHERE id = ?", (ids["Graph Attention Networks"],))
+        assert corpus_index.sync(conn) == 0
+    totals = stats(pool, "graph attention networks")
+    assert (totals["docs"], totals["title_len"], totals["snippet_len"]) == (2, *lengths(PAPERS[1:]))
+    assert totals["df"] == {"graph": 1, "attention": 2, "networks": 0}
+    assert [p["title"] for p in found(pool, "graph attention")] == [
+        "Sparse attention for long documents", "Protein folding at scale"]
+
+
+def test_a_paper_deleted_before_sync_is_dropped_from_the_queue(corpus):
+    pool, _ = corpus
+    with pool.transaction() as conn:
+        paper_id = storage.upsert_paper(conn, {"title": "Transient graph paper", "link": "https://example.org/t"})
+        conn.execute("DELETE FROM papers WHERE id = ?", (paper_id,))
+        assert corpus_index.sync(conn) == 1
+        assert conn.execute("SELECT COUNT(*) FROM corpus_pending").fetchone()[0] == 0
+    assert stats(pool)["docs"] == 3
+
+
+# ----------------- Deep search ranking -----------------
+
+WORDS = "graph neural attention network sparse transformer protein folding survey benchmark".split()
+
+
+def pages(query, seed, n_pages=6, size=25):
+    """Provider pages with exact and near duplicates across them."""
+    rng = random.Random(seed)
+    titles = [" ".join(rng.sample(WORDS, 4)).title() for _ in range(60)]
+    out = []
+    for page in range(n_pages):
+        batch = []
+        for i in range(size):
+            title = rng.choice(titles)
+            batch.append({
+                "source": rng.choice(["arxiv", "scholar", "tavily", "semantic_scholar"]),
+                "title": title if i % 5 else title.upper() + "!",
+                "snippet": " ".join(rng.choice(WORDS) for _ in range(20)),
+                "year": str(rng.choice([2019, 2020, 2021, 2022])),
+                "cited_by": None if i % 4 == 0 else rng.randint(0, 3000),
+                "link": f"https://example.org/{page}/{i}",
+            })
+        out.append(batch)
+    return out
+
+
+def summary(ranked):
+    return sorted((round(p["final_score"], 9), p["title"], len(p.get("links") or [])) for p in ranked)
+
+
+@pytest.mark.parametrize("query", ["graph attention networks", "protein folding survey 2021", "transformer"])
+@pytest.mark.parametrize("seed", [0, 1])
+def test_incremental_ranking_agrees_with_rank(query, seed):
+    intent = engine.detect_time_intent(query)
+    search_query = engine.apply_year_constraint(query, intent["requested_year"])
+    ranking, merged = engine.IncrementalRanking(intent, search_query), []
+    for page in pages(query, seed):
+        ranking.add(page)
+        merged.extend(page)
+        incremental = ranking.ranked()
+        full, _ = engine.rank(merged, intent, search_query)
+        # Equal scores may come in either order
+        assert summary(incremental) == summary(full)
@@ -0,0 +1,26 @@
+import dedup
+
+PAPERS = [
+    {"title": "Attention Is All You Need: Transformers", "year": "2017"},
+    {"title": "Attention Is All You Need", "year": "2017"},
+    {"title": "Attention Is All You Need: A Decade Later", "year": "2027"},
+    {"title": "Graph Networks For Molecular Property Prediction: extended", "year": "2020"},
+    {"title": "Graph Networks For Molecular Property Prediction"},
+]
+
+
+def test_main_title_matches_pass_the_year_check():
+    assert dedup.duplicate_groups(PAPERS) == [[0, 1], [2], [3, 4]]
+
+
+def test_incremental_index_agrees():
+    for split in range(len(PAPERS) + 1):
+        index = dedup.DuplicateIndex()
+        index.add(PAPERS[:split])
+        index.add(PAPERS[split:])
+        assert index.groups() == dedup.duplicate_groups(PAPERS)
+
+
+def test_short_main_titles_do_not_match():
+    papers = [{"title": "Deep Learning: A Review", "year": "2015"}, {"title": "Deep Learning", "year": "2015"}]
+    assert dedup.duplicate_groups(papers) == [[0], [1]]
@@ -0,0 +1,119 @@
+import asyncio
+
+import pytest
+
+import engine
+import migrations
+import sources
+
+
+@pytest.fixture
+def pages_asked(monkeypatch):
+    """(source, offset, limit) of every page request fetch_source is asked for."""
+    asked = []
+    fetch_source = engine.fetch_source
+
+    async def recording(source, search_query, client, deadline=None, offset=0, limit=None):
+        asked.append((source.name, offset, limit))
+        return await fetch_source(source, search_query, client, deadline, offset, limit)
+
+    monkeypatch.setattr(engine, "fetch_source", recording)
+    return asked
+
+
+def page_through(stand_ins, names, budget=10.0, candidates=None, page_size=10):
+    chosen = [s for s in stand_ins if s.name in names]
+    for source in chosen:
+        source.max_page_size = page_size
+
+    async def run():
+        got = []
+        async with engine.new_client() as client:
+            async for name, found, report in engine.iter_pages("graph attention", chosen, client, budget, candidates):
+                got.append((name, found, report))
+        return got
+
+    got = asyncio.run(run())
+    return {name: report for name, found, report in got if found is None}, got
+
+
+def test_a_provider_that_runs_dry_is_exhausted(http_cache, fake_providers, monkeypatch, stand_ins, pages_asked):
+    monkeypatch.setattr(fake_providers, "RESULTS_PER_QUERY", 25)
+    final, got = page_through(stand_ins, {"arxiv", "semantic_scholar"}, candidates=100)
+    for name in ("arxiv", "semantic_scholar"):
+        assert final[name] == dict(final[name], status="ok", count=25, pages=3, stopped="exhausted")
+        assert [(o, n) for s, o, n in pages_asked if s == name] == [(0, 10), (10, 10), (20, 10)]
+    assert [len(found) for name, found, _ in got if name == "arxiv" and found is not None] == [10, 10, 5]
+
+
+def test_the_candidate_budget_caps_the_requests(http_cache, provider_server, stand_ins, pages_asked):
+    server, _ = provider_server
+    final, _ = page_through(stand_ins, {"arxiv", "scholar"}, candidates=25)
+    for name in ("arxiv", "scholar"):
+        assert final[name] == dict(final[name], status="ok", count=25, pages=3, stopped="budget")
+        # The last page asks for just what is left of the budget
+        assert [(o, n) for s, o, n in pages_asked if s == name] == [(0, 10), (10, 10), (20, 5)]
+        assert server.hits[name] == 3
+
+
+def test_max_offset_caps_the_requests(http_cache, stand_ins, pages_asked):
+    semantic_scholar = next(s for s in stand_ins if s.name == "semantic_scholar")
+    semantic_scholar.max_offset = 30
+    final, _ = page_through(stand_ins, {"semantic_scholar"}, candidates=100, page_size=20)
+    assert final["semantic_scholar"] == dict(final["semantic_scholar"], count=30, pages=2, stopped="budget")
+    assert pages_asked == [("semantic_scholar", 0, 20), ("semantic_scholar", 20, 10)]
+
+
+def test_a_provider_without_paging_asks_once(http_cache, stand_ins, pages_asked):
+    final, _ = page_through(stand_ins, {"tavily"}, candidates=100, page_size=20)
+    assert final["tavily"] == dict(final["tavily"], count=20, pages=1, stopped="exhausted")
+    assert pages_asked == [("tavily", 0, 20)]
+
+
+def test_the_time_budget_stops_paging(http_cache, fake_providers, stand_ins):
+    server, base_url = fake_providers.start(latency={"arxiv": 0.3})
+    try:
+        arxiv = next(s for s in stand_ins if s.name == "arxiv")
+        arxiv.url = f"{base_url}/arxiv"
+        final, _ = page_through(stand_ins, {"arxiv"}, budget=0.8, candidates=1000)
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert final["arxiv"]["status"] == "ok" and final["arxiv"]["pages"] >= 1
+    assert final["arxiv"]["stopped"] in ("time", "timeout")
+
+
+def test_stop_stops_a_provider_within_a_page(http_cache, stand_ins, pages_asked):
+    chosen = [s for s in stand_ins if s.name == "arxiv"]
+    chosen[0].max_page_size = 10
+
+    async def run():
+        stop, final = {}, None
+        async with engine.new_client() as client:
+            async for name, found, report in engine.iter_pages("graph attention", chosen, client, 10.0, 1000, stop):
+                if found is None:
+                    final = report
+                elif report["pages"] == 2:
+                    stop[name] = "plateau"
+        return final
+
+    final = asyncio.run(run())
+    # The page already in flight when stop is set still lands
+    assert final["stopped"] == "plateau" and final["pages"] in (2, 3) and len(pages_asked) == final["pages"]
+
+
+def test_deep_search_stops_on_a_plateau(http_cache, provider_server, monkeypatch, stand_ins):
+    _, base_url = provider_server
+    migrations.ensure_schema()
+    monkeypatch.setattr(sources, "PROVIDER_BASE_URL", base_url)
+    monkeypatch.setattr(engine, "DEEP_CANDIDATES", 1000)
+    monkeypatch.setattr(engine, "DEEP_HEAD", 20)
+    chosen = [s for s in stand_ins if s.name == "arxiv"]
+    chosen[0].max_page_size = 20
+    result = asyncio.run(engine.search("graph attention", chosen, deep=True, budget=20))
+    report = result["sources"]["arxiv"]
+    # The fake ranking fades past rank 50: pages beyond it stop reaching the head
+    assert report["stopped"] == "plateau" and report["status"] == "ok"
+    assert engine.PLATEAU_PAGES <= report["pages"] < 1000 // 20
+    assert result["deep"] and not result["partial"]
+    assert len(result["papers"]) <= report["count"]
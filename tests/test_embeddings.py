@@ -0,0 +1,134 @@
+import asyncio
+import hashlib
+import json
+
+import httpx
+import numpy as np
+import pytest
+
+import embeddings
+import engine
+import migrations
+import sources
+import storage
+
+DIM = 8
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """A fresh memory.db (and memory.vectors beside it) as storage.DB_PATH."""
+    path = tmp_path / "memory.db"
+    monkeypatch.setattr(storage, "DB_PATH", path)
+    migrations.ensure_schema(path)
+    yield path
+    storage.get_pool(path).close()
+
+
+class FakeEmbedder:
+    """An Ollama embedder answered in-process: a fixed pseudo-random vector per text."""
+
+    def __init__(self, model="fake", dim=DIM):
+        self.embedder = sources.OllamaEmbedder("http://embed.test/api/embed", model=model, timeout=5.0)
+        self.dim = dim
+        self.texts = []
+
+    def vector(self, text):
+        seed = int.from_bytes(hashlib.sha1(text.encode("utf-8")).digest()[:4], "big")
+        return np.random.default_rng(seed).normal(size=self.dim).tolist()
+
+    def answer(self, request):
+        texts = json.loads(request.content)["input"]
+        self.texts.extend(texts)
+        return httpx.Response(200, json={"embeddings": [self.vector(t) for t in texts]})
+
+    def run(self, coroutine_function):
+        async def run():
+            async with httpx.AsyncClient(transport=httpx.MockTransport(self.answer)) as client:
+                return await coroutine_function(self.embedder, client)
+        return asyncio.run(run())
+
+
+def save(papers):
+    with storage.transaction() as conn:
+        return [storage.upsert_paper(conn, p) for p in papers]
+
+
+def paper(i):
+    return {"title": f"Paper number {i} on graph learning", "snippet": f"Abstract {i}.", "link": f"https://example.org/{i}"}
+
+
+def meta():
+    with storage.connection() as conn:
+        return conn.execute("SELECT model, dim, rows FROM vector_meta WHERE id = 1").fetchone()
+
+
+def count(table):
+    with storage.connection() as conn:
+        return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+def test_the_matrix_grows_and_texts_reuse_their_slots(db):
+    fake = FakeEmbedder()
+    texts = ["alpha", "beta", "gamma"]
+    first = fake.run(lambda e, c: embeddings.vectors_for(texts, e, c))
+    assert first.shape == (3, DIM) and np.allclose(np.linalg.norm(first, axis=1), 1)
+    assert meta() == ("fake", DIM, 3)
+    assert embeddings.vector_path().stat().st_size == 3 * DIM * 4
+
+    # Known texts come from their slots; only the new one is embedded and appended
+    again = fake.run(lambda e, c: embeddings.vectors_for(["gamma", "delta", "alpha", "delta"], e, c))
+    assert fake.texts == texts + ["delta"]
+    assert np.allclose(again[[0, 2]], first[[2, 0]]) and np.allclose(again[1], again[3])
+    assert meta() == ("fake", DIM, 4) and count("vector_slots") == 4
+    assert embeddings.vector_path().stat().st_size == 4 * DIM * 4
+
+
+def test_a_new_model_starts_the_matrix_over(db):
+    save([paper(i) for i in range(3)])
+    FakeEmbedder().run(lambda e, c: embeddings.sync(e, c))
+    assert count("paper_vectors") == 3 and count("vector_pending") == 0
+    other = FakeEmbedder(model="other", dim=4)
+    other.run(lambda e, c: embeddings.vectors_for(["alpha"], e, c))
+    assert meta() == ("other", 4, 1) and count("paper_vectors") == 0 and count("vector_pending") == 3
+    assert embeddings.vector_path().stat().st_size == 4 * 4
+
+
+def test_sync_maps_papers_and_finds_them_again(db):
+    ids = save([paper(i) for i in range(5)])
+    fake = FakeEmbedder()
+    assert fake.run(lambda e, c: embeddings.sync(e, c)) == 5
+    query = np.asarray(fake.vector(embeddings.embed_text(paper(3))), dtype=np.float32)
+    found = embeddings.lookup(query / np.linalg.norm(query), "fake", 2)
+    assert found[0]["paper_id"] == ids[3] and found[0]["similarity"] == pytest.approx(1, abs=1e-6)
+
+    # A paper stored with an already embedded text reuses its slot
+    fake.texts.clear()
+    save([dict(paper(3), link="https://example.org/copy", title=paper(3)["title"] + " ")])
+    assert fake.run(lambda e, c: embeddings.sync(e, c)) == 1
+    assert fake.texts == [] and meta()[2] == 5
+
+
+def test_sync_limits_and_candidate_ids(db):
+    ids = save([paper(i) for i in range(10)])
+    fake = FakeEmbedder()
+    assert fake.run(lambda e, c: embeddings.sync(e, c, ids=[ids[7], ids[2]])) == 2
+    assert len(fake.texts) == 2 and count("vector_pending") == 8
+    assert fake.run(lambda e, c: embeddings.sync(e, c, limit=3)) == 3
+    assert len(fake.texts) == 5 and count("vector_pending") == 5
+
+
+def test_a_semantic_search_embeds_its_candidates_and_a_bounded_slice(db, monkeypatch):
+    papers = [paper(i) for i in range(30)]
+    ids = save(papers)
+    monkeypatch.setattr(engine, "SEMANTIC_SYNC", 4)
+    intent = engine.detect_time_intent("graph learning")
+    merged = [dict(p, paper_id=pid) for p, pid in zip(papers[20:23], ids[20:23])]
+    ranked, _ = engine.rank(merged, intent, "graph learning")
+    fake = FakeEmbedder()
+    reranked = fake.run(lambda e, c: engine.semantic_rerank(
+        merged, ranked, intent, "graph learning", "graph learning", None, c, e, "blend"))
+    # keywords + 3 candidates + 4 queued papers; the other 23 wait for later searches
+    assert count("vector_pending") == 23
+    assert len(set(fake.texts)) == 1 + 3 + 4
+    assert all("similarity" in p for p in reranked)
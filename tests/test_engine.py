@@ -0,0 +1,89 @@
+import asyncio
+
+import httpx
+import pytest
+
+import engine
+import migrations
+import sources
+
+
+@pytest.fixture(autouse=True)
+def schema():
+    migrations.ensure_schema()
+
+
+@pytest.fixture
+def providers(provider_server, monkeypatch):
+    """Ollama and the enrichment batch endpoint answered by the stand-in server too."""
+    _, base_url = provider_server
+    monkeypatch.setattr(sources, "PROVIDER_BASE_URL", base_url)
+    return provider_server
+
+
+def search(query, stand_ins, **kwargs):
+    return asyncio.run(engine.search(query, stand_ins, **kwargs))
+
+
+def fetch(source, client):
+    async def run():
+        async with client:
+            return await engine.fetch_source(source, "graph attention", client, 2)
+    return asyncio.run(run())
+
+
+def answering(body):
+    return httpx.AsyncClient(transport=httpx.MockTransport(lambda request: httpx.Response(200, json=body)))
+
+
+def test_search_merges_every_provider(http_cache, providers, stand_ins):
+    result = search("which recent papers cover graph attention networks", stand_ins)
+    assert {name: r["status"] for name, r in result["sources"].items() if name in engine.AUXILIARY_STAGES} == {
+        "enrichment": "ok"}
+    assert {name: r["status"] for name, r in result["sources"].items() if name not in engine.AUXILIARY_STAGES} == {
+        "arxiv": "ok", "scholar": "ok", "tavily": "ok", "semantic_scholar": "ok"}
+    assert not result["partial"] and result["keywords_from"] == "ollama"
+    assert {p["source"] for p in result["papers"]} == {"arxiv", "scholar", "tavily", "semantic_scholar"}
+    scores = [p["final_score"] for p in result["papers"]]
+    assert scores == sorted(scores, reverse=True)
+
+
+@pytest.mark.parametrize("name, body", [
+    ("semantic_scholar", []),  # a list where an object is expected
+    ("scholar", {"organic_results": "none"}),  # a string where a list is expected
+    ("tavily", {"results": [None]}),
+])
+def test_a_body_of_the_wrong_shape_fails_only_its_source(stand_ins, name, body):
+    source = next(s for s in stand_ins if s.name == name)
+    papers, status, error = fetch(source, answering(body))
+    assert (papers, status) == ([], "error") and error.startswith("unexpected response")
+
+
+def test_a_body_that_is_not_json_is_an_error(stand_ins):
+    client = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: httpx.Response(200, text="<html>")))
+    assert fetch(stand_ins[3], client)[:2] == ([], "error")
+
+
+def test_failing_and_slow_providers_make_the_search_partial(http_cache, fake_providers, monkeypatch, stand_ins):
+    server, base_url = fake_providers.start(latency={"scholar": 3.0}, errors={"tavily": 1.0})
+    try:
+        monkeypatch.setattr(sources, "PROVIDER_BASE_URL", base_url)
+        for source in stand_ins:
+            source.url = source.url.replace(source.url.rsplit("/", 1)[0], base_url)
+        result = search("graph attention networks", stand_ins, budget=1.5)
+    finally:
+        server.shutdown()
+        server.server_close()
+    report = result["sources"]
+    assert report["arxiv"]["status"] == report["semantic_scholar"]["status"] == "ok"
+    assert report["tavily"]["status"] == "error" and report["tavily"]["error"] == "HTTP 503"
+    assert report["scholar"]["status"] in ("late", "timeout")
+    assert result["partial"]
+    assert {p["source"] for p in result["papers"]} == {"arxiv", "semantic_scholar"}
+
+
+def test_ollama_failure_falls_back_to_rule_keywords(http_cache, providers, stand_ins):
+    extractor = sources.OllamaExtractor("http://127.0.0.1:9/api/chat", timeout=0.5)
+    result = search("which papers from 2021 cover graph attention networks", stand_ins, extractor=extractor)
+    assert result["keywords_from"] == "fallback" and result["sources"]["ollama"]["status"] == "error"
+    assert result["requested_year"] == "2021" and not result["partial"]
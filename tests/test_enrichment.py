@@ -0,0 +1,144 @@
+import asyncio
+import time
+
+import pytest
+
+import engine
+import enrichment
+import migrations
+import sources
+import storage
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """A fresh memory.db as storage.DB_PATH, so paper_metadata starts empty."""
+    path = tmp_path / "memory.db"
+    monkeypatch.setattr(storage, "DB_PATH", path)
+    migrations.ensure_schema(path)
+    yield path
+    storage.get_pool(path).close()
+
+
+class FakeBatchSource:
+    """Answers batch requests in-process: a record per id, None for `unknown` ids, failing batches on demand."""
+
+    def __init__(self, unknown=(), failing=(), short=()):
+        self.unknown, self.failing, self.short = set(unknown), set(failing), set(short)
+        self.batches = []
+
+    def record(self, batch_id):
+        kind, _, value = batch_id.partition(":")
+        return {
+            "title": f"Resolved {value}", "cited_by": len(value) * 10, "venue": "NeurIPS", "year": "2021",
+            "abstract": f"Abstract of {value}.", "doi": value if kind == "DOI" else None,
+            "arxiv_id": value if kind == "ARXIV" else None,
+        }
+
+    async def __call__(self, ids):
+        self.batches.append(ids)
+        await asyncio.sleep(0)
+        if self.failing & set(ids):
+            raise TimeoutError("batch timed out")
+        answer = [None if i in self.unknown else self.record(i) for i in ids]
+        return answer[:-1] if self.short & set(ids) else answer
+
+
+def arxiv(n, **fields):
+    return dict({"source": "arxiv", "title": f"Arxiv paper {n}", "snippet": "No abstract",
+                 "link": f"http://arxiv.org/abs/2101.{n:05d}v1", "cited_by": None}, **fields)
+
+
+def enrich(cache, papers, fetch=None, batch_size=None):
+    return asyncio.run(cache.enrich(papers, fetch, batch_size))
+
+
+def test_identifiers():
+    paper = {"doi": "10.1000/ABC", "link": "https://arxiv.org/abs/2101.00001v2"}
+    assert enrichment.paper_ids(paper) == ["doi:10.1000/abc", "arxiv:2101.00001"]
+    assert enrichment.paper_ids({"link": "https://www.semanticscholar.org/paper/abc"}) == [
+        "url:semanticscholar.org/paper/abc"]
+    assert enrichment.paper_ids({"link": "https://example.org/blog"}) == []
+    assert enrichment.batch_id("arxiv:2101.00001") == "ARXIV:2101.00001"
+    assert enrichment.batch_id("url:aclanthology.org/x") == "URL:https://aclanthology.org/x"
+    assert not enrichment.needs_metadata({"source": "semantic_scholar", "cited_by": None})
+    assert not enrichment.needs_metadata({"source": "scholar", "cited_by": 3})
+
+
+def test_ids_are_batched_sorted_and_asked_once(db):
+    cache, fake = enrichment.MetadataCache(), FakeBatchSource()
+    papers = [arxiv(n) for n in (5, 3, 1, 4, 2, 7, 6)]
+    papers += [arxiv(3, source="tavily"), {"source": "scholar", "title": "Counted", "cited_by": 12},
+               {"source": "tavily", "title": "No identifiers", "link": "https://example.org/blog"}]
+    enriched, count, errors = enrich(cache, papers, fake, batch_size=3)
+    assert fake.batches == [[f"ARXIV:2101.{n:05d}" for n in ns] for ns in ((1, 2, 3), (4, 5, 6), (7,))]
+    assert (count, errors) == (8, [])
+    assert enriched[0]["cited_by"] == 100 and enriched[0]["venue"] == "NeurIPS" and enriched[0]["enriched"]
+    assert enriched[0]["snippet"] == "Abstract of 2101.00005." and enriched[7]["cited_by"] == 100
+    assert enriched[8] is papers[8] and enriched[9] is papers[9]
+    assert cache.stats()["misses"] == 9 and cache.stats()["requested"] == 7
+
+
+def test_remembered_metadata_costs_no_request(db):
+    cache, fake = enrichment.MetadataCache(), FakeBatchSource(unknown={"ARXIV:2101.00002"})
+    enrich(cache, [arxiv(1), arxiv(2)], fake)
+    # Same papers again, plus a title-only result with the title the first one resolved to
+    copy = {"source": "tavily", "title": "Resolved 2101.00001!", "link": "https://example.org/copy"}
+    enriched, count, errors = enrich(cache, [arxiv(1), arxiv(2), copy], fake)
+    assert len(fake.batches) == 1 and (count, errors) == (2, [])
+    assert enriched[2]["cited_by"] == 100 and "enriched" not in enriched[1]
+    assert cache.stats()["hits"] == 3 and cache.stats()["unknown"] == 1
+
+
+def test_entries_are_asked_again_after_their_ttl(db):
+    cache = enrichment.MetadataCache(ttl=0.3, missing_ttl=0.5)
+    fake = FakeBatchSource(unknown={"ARXIV:2101.00002"})
+    enrich(cache, [arxiv(1), arxiv(2)], fake)
+    time.sleep(0.35)
+    enrich(cache, [arxiv(1), arxiv(2)], fake)  # the record is stale, the unknown id is not yet
+    time.sleep(0.2)
+    enrich(cache, [arxiv(1), arxiv(2)], fake)  # now both are
+    assert fake.batches == [["ARXIV:2101.00001", "ARXIV:2101.00002"], ["ARXIV:2101.00001"],
+                            ["ARXIV:2101.00002"]]
+    assert cache.stats()["stale"] == 2
+
+
+def test_stale_metadata_is_kept_when_the_refresh_fails(db):
+    cache = enrichment.MetadataCache(ttl=0.1)
+    enrich(cache, [arxiv(1)], FakeBatchSource())
+    time.sleep(0.15)
+    enriched, count, errors = enrich(cache, [arxiv(1)], FakeBatchSource(failing={"ARXIV:2101.00001"}))
+    assert count == 1 and enriched[0]["cited_by"] == 100
+    assert [type(e) for e in errors] == [TimeoutError]
+
+
+def test_a_failed_batch_leaves_only_its_papers_unenriched(db):
+    cache = enrichment.MetadataCache()
+    fake = FakeBatchSource(failing={"ARXIV:2101.00003"}, short={"ARXIV:2101.00005"})
+    papers = [arxiv(n) for n in range(1, 7)]
+    enriched, count, errors = enrich(cache, papers, fake, batch_size=2)
+    assert count == 2 and [p.get("enriched", False) for p in enriched] == [True, True, False, False, False, False]
+    assert [type(e) for e in errors] == [TimeoutError, ValueError]
+    # Only the answered batch was remembered: the others are asked again
+    fake.failing = fake.short = set()
+    enriched, count, errors = enrich(cache, papers, fake, batch_size=2)
+    assert fake.batches[-2:] == [["ARXIV:2101.00003", "ARXIV:2101.00004"], ["ARXIV:2101.00005", "ARXIV:2101.00006"]]
+    assert count == 6 and errors == []
+
+
+def test_enrich_metadata_against_the_batch_endpoint(db, http_cache, provider_server, monkeypatch):
+    server, base_url = provider_server
+    monkeypatch.setattr(enrichment, "cache", enrichment.MetadataCache())
+    enricher = sources.SemanticScholarBatchSource(f"{base_url}/semantic_scholar/batch")
+    enricher.rate = None
+    papers = [arxiv(n) for n in range(1, 40)]
+
+    async def run():
+        async with engine.new_client() as client:
+            return await engine.enrich_metadata(papers, client, 5, enricher)
+
+    enriched, report = asyncio.run(run())
+    assert report["status"] == "ok" and report["count"] == sum("enriched" in p for p in enriched) > 0
+    assert server.hits["semantic_scholar/batch"] == 1
+    enriched, report = asyncio.run(run())
+    assert server.hits["semantic_scholar/batch"] == 1  # answered from paper_metadata
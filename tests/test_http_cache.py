@@ -0,0 +1,84 @@
+import asyncio
+import os
+import time
+
+import httpx
+import pytest
+
+import engine
+import http_cache as http_cache_module
+
+
+def fetch(source, query, client=None):
+    async def run():
+        async with (client or engine.new_client()) as c:
+            return await engine._cached_fetch(c, source, source.build_request(query), 5)
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("name", ["arxiv", "semantic_scholar"])  # streaming and whole-body parsers
+def test_stale_entry_is_revalidated_with_its_etag(http_cache, provider_server, stand_ins, name):
+    server, _ = provider_server
+    source = next(s for s in stand_ins if s.name == name)
+    source.cache_ttl = 0.2
+    first = fetch(source, "graph attention")
+    assert first and server.hits[name] == 1
+    assert fetch(source, "graph attention") == first  # fresh: no request
+    assert server.hits[name] == 1
+    time.sleep(0.25)
+    assert fetch(source, "graph attention") == first  # stale: If-None-Match -> 304, cached body parsed
+    assert server.hits[name] == 2 and server.not_modified == 1
+    assert http_cache.stats()["providers"][name] == {"hits": 1, "stale": 1, "revalidated": 1, "misses": 1, "stored": 1}
+    assert fetch(source, "graph attention") == first  # the 304 made it fresh again
+    assert server.hits[name] == 2
+
+
+def test_least_recently_used_entries_are_evicted_past_the_cap(tmp_path):
+    cache = http_cache_module.HttpCache(path=tmp_path / "small.httpcache", max_bytes=2500)
+    requests = {name: {"url": "http://p", "params": {"q": name}} for name in "abc"}
+    bodies = {name: os.urandom(1000) for name in "abc"}  # incompressible
+    cache.put("p", requests["a"], bodies["a"], {})
+    time.sleep(0.01)
+    cache.put("p", requests["b"], bodies["b"], {})
+    time.sleep(0.01)
+    assert cache.get("p", requests["a"], 60).body == bodies["a"]  # a is now more recent than b
+    time.sleep(0.01)
+    cache.put("p", requests["c"], bodies["c"], {})
+    assert cache.get("p", requests["b"], 60) is None
+    assert cache.get("p", requests["a"], 60).body == bodies["a"]
+    assert cache.get("p", requests["c"], 60).body == bodies["c"]
+    stats = cache.stats()
+    assert stats["entries"] == 2 and stats["bytes"] <= 2500
+
+
+def test_keys_ignore_api_keys_case_and_whitespace():
+    a = {"method": "get", "url": "http://x", "params": {"q": "Graph  Attention", "api_key": "secret"}}
+    b = {"url": "http://y", "params": {"q": "graph attention", "api_key": "other"}}
+    assert http_cache_module.request_key("p", a) == http_cache_module.request_key("p", b)
+    assert http_cache_module.request_key("p", a) != http_cache_module.request_key("q", a)
+
+
+def test_offline_mode_replays_old_entries_and_never_goes_upstream(http_cache, provider_server, stand_ins):
+    server, _ = provider_server
+    source = next(s for s in stand_ins if s.name == "arxiv")
+    recorded = fetch(source, "sparse attention")
+    with http_cache._pool().transaction() as conn:
+        conn.execute("UPDATE http_cache SET fetched_at = 0")  # long past any TTL
+    http_cache.mode = "offline"
+
+    def refuse(request):
+        raise AssertionError(f"offline cache went upstream: {request.url}")
+
+    offline = httpx.AsyncClient(transport=httpx.MockTransport(refuse))
+    assert fetch(source, "sparse attention", offline) == recorded
+    with pytest.raises(LookupError):
+        fetch(source, "never recorded", httpx.AsyncClient(transport=httpx.MockTransport(refuse)))
+    assert server.hits["arxiv"] == 1
+
+
+def test_cache_off_streams_without_storing(http_cache, provider_server, stand_ins, monkeypatch):
+    http_cache.mode = "off"
+    monkeypatch.setattr(http_cache, "put", lambda *a: pytest.fail("a disabled cache stored a body"))
+    source = next(s for s in stand_ins if s.name == "arxiv")
+    assert len(fetch(source, "graph attention")) == source.page_size
+    assert http_cache.stats()["entries"] == 0
@@ -0,0 +1,160 @@
+import asyncio
+import sqlite3
+import types
+
+import httpx
+import pytest
+
+import engine
+import keywords
+import migrations
+import storage
+
+
+@pytest.fixture
+def memo():
+    migrations.ensure_schema()
+    fresh = keywords.KeywordMemo(parallel=2)
+    with storage.transaction() as conn:
+        fresh.clear(conn)
+    return fresh
+
+
+class StubExtractor:
+    """Answers every query with its own words after `delay` seconds; records what it was asked."""
+
+    model = "stub"
+    timeout = 5.0
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.asked = []
+        self.running = self.peak = 0
+
+    async def __call__(self, query):
+        self.asked.append(query)
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.running -= 1
+        return f"keywords of {keywords.normalize_query(query)}"
+
+    def fetch(self, query):
+        return lambda: self(query)
+
+
+def stored(query, model="stub"):
+    with storage.connection() as conn:
+        row = conn.execute("SELECT search_query FROM keyword_cache WHERE query_key = ? AND model = ?",
+                           (keywords.normalize_query(query), model)).fetchone()
+    return row[0] if row else None
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("graph neural networks 2024", "graph neural networks 2024"),
+    ("  Quantization-Aware Training ", "quantization aware training"),
+    ("BERT v2.0", "bert v2 0"),
+    ("find papers about graph neural networks", None),
+    ("graph neural networks?", None),
+    ("one two three four five six seven eight nine", None),
+    ("", None),
+])
+def test_keyword_only(query, expected):
+    assert keywords.keyword_only(query) == expected
+
+
+def test_keyword_queries_are_answered_by_rule_without_the_database(memo, monkeypatch):
+    def unreachable():
+        raise AssertionError("a rule answer must not read memory.db")
+
+    monkeypatch.setattr(storage, "connection", unreachable)
+    assert asyncio.run(memo.cached("Graph Neural Networks 2024", "stub")) == ("graph neural networks 2024", "rule")
+    assert memo.stats()["rule_answers"] == 1 and memo.stats()["misses"] == 0
+
+
+def test_remembered_keywords_are_read_on_a_read_only_connection(memo):
+    query = "which papers improve sparse attention for long documents"
+    with storage.transaction() as conn:
+        memo.remember(conn, query, "stub", "sparse attention long documents")
+    reader = sqlite3.connect(f"file:{storage.DB_PATH}?mode=ro", uri=True)
+    try:
+        assert memo.lookup(reader, query.upper() + "!", "stub") == "sparse attention long documents"
+        assert memo.lookup(reader, query, "another-model") is None
+    finally:
+        reader.close()
+    assert asyncio.run(memo.cached(query, "stub")) == ("sparse attention long documents", "cache")
+    assert memo.stats()["hits"] == 2 and memo.stats()["misses"] == 1
+
+
+def test_a_miss_takes_no_write_lock(memo, monkeypatch):
+    def no_writes():
+        raise AssertionError("a miss must not open a write transaction")
+
+    monkeypatch.setattr(storage, "transaction", no_writes)
+    assert asyncio.run(memo.cached("what is new in protein folding", "stub")) == (None, None)
+
+
+def test_identical_queries_in_flight_share_one_call(memo):
+    extractor = StubExtractor(delay=0.1)
+    variants = ["What is new in graph attention?", "what is new in graph attention", "WHAT IS NEW IN GRAPH ATTENTION!!"]
+
+    async def run():
+        return await asyncio.gather(*(memo.extract(q, "stub", extractor.fetch(q)) for q in variants * 3))
+
+    answers = asyncio.run(run())
+    assert len(extractor.asked) == 1
+    assert set(answers) == {"keywords of what is new in graph attention"}
+    assert stored(variants[0]) == answers[0]
+    assert not memo._inflight
+
+
+def test_distinct_queries_run_at_most_parallel_at_once(memo):
+    extractor = StubExtractor(delay=0.05)
+    queries = [f"what do we know about topic number {i}" for i in range(7)]
+
+    async def run():
+        return await asyncio.gather(*(memo.extract(q, "stub", extractor.fetch(q)) for q in queries))
+
+    answers = asyncio.run(run())
+    assert len(extractor.asked) == 7 and extractor.peak == memo.parallel == 2
+    assert answers == [f"keywords of {keywords.normalize_query(q)}" for q in queries]
+
+
+def test_the_answer_is_remembered_after_the_caller_gives_up(memo):
+    extractor = StubExtractor(delay=0.1)
+    query = "which benchmarks measure retrieval augmented generation"
+
+    async def run():
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(memo.extract(query, "stub", extractor.fetch(query)), 0.01)
+        await asyncio.sleep(0.3)
+
+    asyncio.run(run())
+    assert stored(query) == f"keywords of {keywords.normalize_query(query)}"
+
+
+def test_extract_keywords_asks_the_model_once_per_query(memo, monkeypatch):
+    monkeypatch.setattr(keywords, "memo", memo)
+    calls = []
+
+    def answer(request):
+        calls.append(request)
+        return httpx.Response(200, json={"search_query": "diffusion models images"})
+
+    extractor = types.SimpleNamespace(
+        model="stub", timeout=5.0,
+        build_request=lambda query: {"method": "POST", "url": "http://ollama.test/api/chat", "json": {"q": query}},
+        parse=lambda response: response.json()["search_query"],
+    )
+    query = "recent work on diffusion models for images"
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(answer)) as client:
+            return [await engine.extract_keywords(query, client, extractor) for _ in range(2)]
+
+    first, second = asyncio.run(run())
+    assert first == ("diffusion models images", None, "ollama")
+    assert second == ("diffusion models images", None, "cache")
+    assert len(calls) == 1
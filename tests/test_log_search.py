@@ -0,0 +1,184 @@
+import json
+import sqlite3
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import memory_api
+import migrations
+import storage
+
+
+@pytest.fixture
+def client():
+    with TestClient(memory_api.app) as c:
+        yield c
+
+
+def paper(title):
+    return {"title": title, "link": f"https://example.org/{title.replace(' ', '-')}", "snippet": title}
+
+
+# ----------------- save_searches -----------------
+
+def test_save_searches_returns_the_ids_of_its_rows():
+    migrations.ensure_schema()
+    with storage.transaction() as conn:
+        first = storage.save_searches(conn, [(f"ids {i}", f"ids {i}", "t", None, [paper(f"ids paper {i}")])
+                                              for i in range(3)])
+        # AUTOINCREMENT never reuses a deleted id, and a gap in the ids is skipped over
+        conn.execute("DELETE FROM search_history WHERE id = ?", (first[-1],))
+        conn.execute("INSERT INTO search_history (id, query) VALUES (?, 'gap')", (first[-1] + 10,))
+        second = storage.save_searches(conn, [("ids 3", "ids 3", "t", None, []), ("ids 4", "ids 4", "t", None, [])])
+        got = {i: q for i, q in conn.execute(
+            f"SELECT id, query FROM search_history WHERE id IN ({', '.join('?' * 5)})", first + second)}
+        results = storage.load_search_results(conn, first[:2])
+    assert first == [first[0], first[0] + 1, first[0] + 2]
+    assert second == [first[-1] + 11, first[-1] + 12]
+    assert got == {**{i: f"ids {n}" for n, i in enumerate(first[:2])}, second[0]: "ids 3", second[1]: "ids 4"}
+    assert [[p["title"] for p in results[i]] for i in first[:2]] == [["ids paper 0"], ["ids paper 1"]]
+
+
+# ----------------- /log_search/bulk -----------------
+
+def test_bulk_json_array_and_ndjson(client):
+    body = [{"query": f"bulk {i}", "search_query": f"bulk {i}", "top_results": [paper(f"bulk {i}")]} for i in range(3)]
+    answer = client.post("/log_search/bulk", content=json.dumps(body))
+    assert answer.status_code == 200 and answer.json()["count"] == 3
+    ids = answer.json()["ids"]
+    assert ids == sorted(ids)
+    ndjson = "\n".join(json.dumps(b) for b in body) + "\n\n"
+    assert client.post("/log_search/bulk", content=ndjson).json()["count"] == 3
+    with storage.connection() as conn:
+        assert [storage.get_search(conn, search_id=i)["query"] for i in ids] == ["bulk 0", "bulk 1", "bulk 2"]
+
+
+@pytest.mark.parametrize("body, where", [
+    ("{not json", "neither a JSON array nor NDJSON"),
+    (json.dumps([{"query": "ok", "search_query": "ok"}, {"search_query": "no query"}]), "item 1"),
+    ('{"query": "a", "search_query": "a"}\n{"query": "b"}', "line 2"),
+    (b"\xff\xfe", "neither a JSON array nor NDJSON"),
+])
+def test_bulk_rejects_bad_bodies_with_422(client, body, where):
+    answer = client.post("/log_search/bulk", content=body)
+    assert answer.status_code == 422 and where in answer.json()["detail"]
+
+
+def test_bulk_rejects_too_many_entries_with_413(client, monkeypatch):
+    monkeypatch.setattr(memory_api, "MAX_BULK_ENTRIES", 2)
+    body = [{"query": f"q{i}", "search_query": f"q{i}"} for i in range(3)]
+    assert client.post("/log_search/bulk", content=json.dumps(body)).status_code == 413
+
+
+def test_bulk_is_all_or_nothing(client, monkeypatch):
+    def locked(*args):
+        raise sqlite3.OperationalError("database is locked")
+
+    with storage.connection() as conn:
+        before = conn.execute("SELECT COUNT(*) FROM search_history").fetchone()[0]
+    monkeypatch.setattr(memory_api.corpus_index, "sync", locked)
+    body = [{"query": "never", "search_query": "never", "top_results": [paper("never")]}]
+    answer = client.post("/log_search/bulk", content=json.dumps(body))
+    assert answer.status_code == 503 and answer.headers["retry-after"] == "1"
+    with storage.connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM search_history").fetchone()[0] == before
+
+
+# ----------------- GroupCommitter -----------------
+
+def test_group_committer_batches_concurrent_entries():
+    groups = []
+
+    def write(entries):
+        groups.append(len(entries))
+        return [{"n": e["n"]} for e in entries]
+
+    committer = memory_api.GroupCommitter(write, window=0.05)
+    answers = [None] * 20
+
+    def submit(i):
+        answers[i] = committer.submit({"n": i})
+
+    threads = [threading.Thread(target=submit, args=(i,)) for i in range(20)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    committer.close()
+    assert answers == [{"n": i} for i in range(20)]
+    assert sum(groups) == 20 and len(groups) < 20
+
+
+def test_group_committer_fails_only_the_bad_entry():
+    def write(entries):
+        if any(e.get("bad") for e in entries):
+            raise sqlite3.IntegrityError("bad entry")
+        return [dict(e) for e in entries]
+
+    committer = memory_api.GroupCommitter(write, window=0.05)
+    outcomes = {}
+
+    def submit(i):
+        try:
+            outcomes[i] = committer.submit({"n": i, "bad": i == 3})
+        except sqlite3.Error as e:
+            outcomes[i] = e
+
+    threads = [threading.Thread(target=submit, args=(i,)) for i in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    committer.close()
+    assert isinstance(outcomes.pop(3), sqlite3.IntegrityError)
+    assert outcomes == {i: {"n": i, "bad": False} for i in (0, 1, 2, 4, 5)}
+
+
+def test_group_committer_respects_max_group():
+    groups = []
+    committer = memory_api.GroupCommitter(lambda es: groups.append(len(es)) or es, window=0.2, max_group=4)
+    threads = [threading.Thread(target=committer.submit, args=({"n": i},)) for i in range(10)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    committer.close()
+    assert sum(groups) == 10 and max(groups) <= 4
+
+
+# ----------------- Read errors -----------------
+
+def test_history_maps_database_errors_to_http_errors(client, monkeypatch):
+    def busy(*args):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(memory_api.storage, "history_page", busy)
+    answer = client.get("/history")
+    assert answer.status_code == 503 and answer.headers["retry-after"] == "1"
+
+    def broken(*args):
+        raise sqlite3.DatabaseError("file is not a database")
+
+    monkeypatch.setattr(memory_api.storage, "history_page", broken)
+    assert client.get("/history").status_code == 500
+
+
+def test_stream_ends_with_an_error_event_when_logging_fails(client, monkeypatch):
+    async def search_stream(query, **kwargs):
+        yield {"event": "keywords", "search_query": query}
+        yield {"event": "done", "query": query, "search_query": query, "papers": [], "mode": "live",
+               "partial": False, "keywords_from": "rule", "semantic": False, "deep": False, "sources": {},
+               "timings": {}}
+
+    def locked(*args, **kwargs):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(memory_api.engine, "search_stream", search_stream)
+    monkeypatch.setattr(memory_api, "record_search", locked)
+    answer = client.post("/search/stream", json={"query": "stream failure"})
+    events = [json.loads(line) for line in answer.text.splitlines() if line]
+    assert answer.status_code == 200
+    assert [e["event"] for e in events] == ["keywords", "error"]
+    assert events[-1]["status"] == 503 and "locked" in events[-1]["error"]
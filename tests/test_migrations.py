@@ -0,0 +1,105 @@
+import json
+import sqlite3
+
+import pytest
+
+import migrations
+import storage
+
+LEGACY_PAPERS = [
+    {"title": "Sparse Attention Transformers", "link": "https://arxiv.org/abs/2101.00001v2", "source": "arxiv",
+     "snippet": "Attention that scales to long documents.", "year": "2021", "final_score": 0.9},
+    {"title": "Graph Networks for Molecules", "link": "https://doi.org/10.1000/ABC", "source": "scholar",
+     "snippet": "Message passing over molecular graphs.", "cited_by": "42", "final_score": 0.5},
+]
+
+
+@pytest.fixture
+def legacy_db(tmp_path):
+    """memory.db as the app created it before migrations were versioned."""
+    path = tmp_path / "legacy.db"
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE search_history (id INTEGER PRIMARY KEY AUTOINCREMENT, query TEXT, search_query TEXT, top_results TEXT, created_at TEXT)")
+    conn.execute("CREATE TABLE favorites (title TEXT, link TEXT UNIQUE, added_at TEXT, paper_json TEXT)")
+    conn.execute(
+        "INSERT INTO search_history (query, search_query, top_results, created_at) VALUES (?, ?, ?, ?)",
+        ("long context attention", "sparse attention", json.dumps(LEGACY_PAPERS), "2024-01-01T00:00:00"),
+    )
+    conn.execute(
+        "INSERT INTO search_history (query, search_query, top_results, created_at) VALUES (?, ?, ?, ?)",
+        ("broken", "broken", "{not json", "2024-01-02T00:00:00"),
+    )
+    conn.execute(
+        "INSERT INTO favorites (title, link, added_at, paper_json) VALUES (?, ?, ?, ?)",
+        (LEGACY_PAPERS[1]["title"], LEGACY_PAPERS[1]["link"], "2024-01-03T00:00:00", json.dumps(LEGACY_PAPERS[1])),
+    )
+    conn.execute(
+        "INSERT INTO favorites (title, link, added_at, paper_json) VALUES (?, ?, ?, NULL)",
+        ("Bookmarked Without Metadata", "https://example.org/paper", "2024-01-04T00:00:00"),
+    )
+    conn.commit()
+    conn.close()
+    yield path
+    storage.get_pool(path).close()
+
+
+def test_empty_database_reaches_latest_version(tmp_path):
+    path = tmp_path / "empty.db"
+    assert migrations.ensure_schema(path) == list(range(1, migrations.LATEST_VERSION + 1))
+    with storage.get_pool(path).connection() as conn:
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == migrations.LATEST_VERSION == 10
+        assert migrations.current_version(conn) == 10
+        assert {"doi", "arxiv_id"} <= set(migrations._columns(conn, "papers"))
+    assert migrations.ensure_schema(path) == []
+    storage.get_pool(path).close()
+
+
+def test_legacy_database_is_migrated(legacy_db):
+    migrations.ensure_schema(legacy_db)
+    with storage.get_pool(legacy_db).connection() as conn:
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == 10
+        # JSON blobs moved into papers / search_results and were cleared
+        assert conn.execute("SELECT COUNT(*) FROM search_history WHERE top_results IS NOT NULL").fetchone()[0] == 0
+        assert conn.execute("SELECT COUNT(*) FROM favorites WHERE paper_json IS NOT NULL").fetchone()[0] == 0
+        search = storage.get_search(conn, search_id=1)
+        assert [p["title"] for p in search["top_results"]] == [p["title"] for p in LEGACY_PAPERS]
+        assert search["top_results"][1]["cited_by"] == 42
+        assert storage.get_search(conn, search_id=2)["top_results"] == []
+        keys = dict(conn.execute("SELECT title, paper_key FROM papers").fetchall())
+        assert keys["Sparse Attention Transformers"] == "arxiv:2101.00001"
+        assert keys["Graph Networks for Molecules"] == "doi:10.1000/abc"
+        # The favorite and the search result are one papers row
+        assert conn.execute("SELECT COUNT(*) FROM papers").fetchone()[0] == 3
+        assert conn.execute("SELECT COUNT(*) FROM favorites WHERE paper_id IS NULL").fetchone()[0] == 0
+        # Identifiers backfilled from the keys
+        assert conn.execute(
+            "SELECT doi, arxiv_id FROM papers WHERE title = 'Graph Networks for Molecules'"
+        ).fetchone() == ("10.1000/abc", None)
+        assert conn.execute(
+            "SELECT arxiv_id FROM papers WHERE title = 'Sparse Attention Transformers'"
+        ).fetchone() == ("2101.00001",)
+        # Full-text indexes and the BM25F index cover the moved rows
+        assert [p["title"] for p in storage.search_papers(conn, "molecular")] == ["Graph Networks for Molecules"]
+        assert [h["id"] for h in storage.search_history(conn, "attention")] == [1]
+        assert conn.execute("SELECT COUNT(*) FROM corpus_pending").fetchone()[0] == 0
+        assert conn.execute("SELECT docs FROM corpus_stats").fetchone()[0] == 3
+
+
+def test_migrated_papers_keep_their_key_when_saved_again(legacy_db):
+    migrations.ensure_schema(legacy_db)
+    with storage.get_pool(legacy_db).transaction() as conn:
+        for paper in storage.get_search(conn, search_id=1)["top_results"]:
+            storage.upsert_paper(conn, paper)
+        assert conn.execute("SELECT COUNT(*) FROM papers").fetchone()[0] == 3
+
+
+def test_partially_migrated_database_resumes(legacy_db):
+    conn = sqlite3.connect(legacy_db, isolation_level=None)
+    migrations.current_version(conn)
+    for version, step in enumerate(migrations.MIGRATIONS[:3], start=1):
+        conn.execute("BEGIN IMMEDIATE")
+        step(conn)
+        conn.execute("INSERT INTO schema_version (version, applied_at) VALUES (?, 'then')", (version,))
+        conn.commit()
+    conn.close()
+    assert migrations.ensure_schema(legacy_db) == list(range(4, 11))
@@ -0,0 +1,151 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+import outbound
+
+
+def provider(name, rate=None, burst=1):
+    return SimpleNamespace(name=name, rate=rate, burst=burst)
+
+
+def fake_server(answers):
+    """httpx client over a MockTransport answering with `answers` in turn (the last one repeats)."""
+    seen = []
+
+    def handle(request):
+        seen.append(request)
+        status, headers = answers[min(len(seen), len(answers)) - 1]
+        return httpx.Response(status, headers=headers, json={"n": len(seen)})
+
+    return httpx.AsyncClient(transport=httpx.MockTransport(handle), base_url="http://provider"), seen
+
+
+def fetcher(client, path="/q"):
+    async def fetch():
+        response = await client.get(path)
+        response.raise_for_status()
+        return response.json()
+    return fetch
+
+
+def test_token_bucket_spaces_reservations():
+    bucket = outbound.TokenBucket(rate=10, burst=2)
+    waits = [bucket.reserve() for _ in range(4)]
+    assert waits[:2] == [0.0, 0.0]
+    assert waits[2] == pytest.approx(0.1, abs=0.01) and waits[3] == pytest.approx(0.2, abs=0.01)
+    assert bucket.reserve(within=0.1) is None  # the next slot is ~0.3 s away
+    assert outbound.TokenBucket(rate=None).reserve(within=0) == 0.0
+
+
+def test_scheduler_paces_requests_at_the_provider_rate():
+    async def run():
+        client, seen = fake_server([(200, {})])
+        scheduler, source = outbound.Scheduler(), provider("paced", rate=20)
+        started = time.monotonic()
+        async with client:
+            await asyncio.gather(*(scheduler.call(source, {"q": i}, fetcher(client), 5) for i in range(5)))
+        return time.monotonic() - started, len(seen)
+
+    elapsed, calls = asyncio.run(run())
+    assert calls == 5
+    assert elapsed >= 0.19  # four waits of 1/20 s after the first token
+
+
+def test_identical_requests_in_flight_share_one_call():
+    async def run():
+        client, seen = fake_server([(200, {})])
+        scheduler, source = outbound.Scheduler(), provider("shared")
+        async with client:
+            answers = await asyncio.gather(*(scheduler.call(source, {"q": "same"}, fetcher(client), 5) for _ in range(5)))
+            other = await scheduler.call(source, {"q": "other"}, fetcher(client), 5)
+        return answers, other, len(seen), scheduler.stats()["shared"]
+
+    answers, other, calls, stats = asyncio.run(run())
+    assert answers == [{"n": 1}] * 5 and other == {"n": 2}
+    assert calls == 2 and stats["coalesced"] == 4 and stats["calls"] == 2
+
+
+def test_429_is_retried_after_retry_after():
+    async def run():
+        client, seen = fake_server([(429, {"Retry-After": "0.1"}), (429, {"Retry-After": "0.1"}), (200, {})])
+        scheduler, source = outbound.Scheduler(), provider("limited", rate=100)
+        started = time.monotonic()
+        async with client:
+            answer = await scheduler.call(source, {"q": 1}, fetcher(client), 5)
+        return answer, time.monotonic() - started, scheduler.stats()["limited"]
+
+    answer, elapsed, stats = asyncio.run(run())
+    assert answer == {"n": 3}
+    assert stats["retries"] == 2 and elapsed >= 0.2
+
+
+def test_retry_that_does_not_fit_the_deadline_gives_up_at_once():
+    async def run():
+        client, seen = fake_server([(429, {"Retry-After": "5"})])
+        scheduler, source = outbound.Scheduler(), provider("slow")
+        started = time.monotonic()
+        async with client:
+            with pytest.raises(httpx.HTTPStatusError):
+                await scheduler.call(source, {"q": 1}, fetcher(client), 1.0)
+        return time.monotonic() - started, len(seen)
+
+    elapsed, calls = asyncio.run(run())
+    assert calls == 1 and elapsed < 0.5
+
+
+def test_circuit_opens_half_opens_and_closes():
+    async def run():
+        client, seen = fake_server([(503, {})] * outbound.BREAKER_FAILURES + [(200, {})])
+        scheduler, source = outbound.Scheduler(retries=0), provider("flaky")
+        breaker = scheduler._provider(source)[1]
+        breaker.reset_after = 0.2
+        states = []
+        async with client:
+            for i in range(outbound.BREAKER_FAILURES):
+                with pytest.raises(httpx.HTTPStatusError):
+                    await scheduler.call(source, {"q": i}, fetcher(client), 5)
+            states.append(breaker.state)
+            with pytest.raises(outbound.CircuitOpen):
+                await scheduler.call(source, {"q": "fast"}, fetcher(client), 5)
+            calls_while_open = len(seen)
+            await asyncio.sleep(0.25)
+            states.append(breaker.state)
+            answer = await scheduler.call(source, {"q": "probe"}, fetcher(client), 5)
+            states.append(breaker.state)
+        return states, calls_while_open, answer, scheduler.stats()["flaky"]
+
+    states, calls_while_open, answer, stats = asyncio.run(run())
+    assert states == ["open", "half-open", "closed"]
+    assert calls_while_open == outbound.BREAKER_FAILURES  # the open circuit sent nothing
+    assert answer == {"n": outbound.BREAKER_FAILURES + 1}
+    assert stats["throttled"] == 1 and stats["circuit"] == "closed"
+
+
+def test_failed_probe_reopens_the_circuit():
+    breaker = outbound.CircuitBreaker(failures=2, reset_after=0.0)
+    breaker.record(False)
+    breaker.record(False)
+    breaker.admit("p")  # half-open: the probe goes out
+    with pytest.raises(outbound.CircuitOpen):
+        breaker.admit("p")  # one probe at a time
+    breaker.record(False)
+    assert breaker.opened_at is not None and breaker.failures == 3
+
+
+def test_throttled_when_no_slot_fits_the_budget():
+    async def run():
+        client, seen = fake_server([(200, {})])
+        scheduler, source = outbound.Scheduler(), provider("strict", rate=1)
+        async with client:
+            await scheduler.call(source, {"q": 1}, fetcher(client), 5)
+            started = time.monotonic()
+            with pytest.raises(outbound.Throttled):
+                await scheduler.call(source, {"q": 2}, fetcher(client), 0.5)
+        return time.monotonic() - started, len(seen), scheduler.stats()["strict"]
+
+    elapsed, calls, stats = asyncio.run(run())
+    assert elapsed < 0.1 and calls == 1 and stats["throttled"] == 1
@@ -0,0 +1,71 @@
+import sqlite3
+
+import migrations
+import result_cache
+import storage
+
+
+def remembered(profile):
+    cache = result_cache.ResultCache()
+    with storage.transaction() as conn:
+        search_id = storage.save_searches(conn, [("LLM quantization", "llm quantization", "2026-01-01", None, [])])[0]
+        cache.remember(conn, "LLM quantization", "llm quantization", search_id, profile)
+    return cache, search_id
+
+
+def test_answers_are_kept_apart_by_engine_settings():
+    migrations.ensure_schema()
+    blend = result_cache.profile("python", "blend", True)
+    cache, search_id = remembered(blend)
+    with storage.connection() as conn:
+        assert cache.lookup(conn, "llm quantization!", blend) == search_id
+        assert cache.lookup(conn, "llm quantization") is None  # n8n
+        assert cache.lookup(conn, "llm quantization", result_cache.profile("python")) is None
+        assert cache.lookup(conn, "llm quantization", result_cache.profile("python", "blend")) is None
+
+
+def test_profiles():
+    assert result_cache.profile() == result_cache.profile("n8n", "blend", True) == "n8n"
+    assert result_cache.profile(None) == "n8n"
+    assert result_cache.profile("python") == "python:live"
+    assert result_cache.profile("python", "blend", True) == "python:blend+semantic"
+
+
+def last_used(search_id):
+    with storage.connection() as conn:
+        return conn.execute("SELECT MAX(last_used) FROM result_cache WHERE search_id = ?", (search_id,)).fetchone()[0]
+
+
+def test_lookup_only_reads_and_touch_writes_the_stamps():
+    migrations.ensure_schema()
+    profile = result_cache.profile("python", "local")
+    cache, search_id = remembered(profile)
+    stamped = last_used(search_id)
+    reader = sqlite3.connect(f"file:{storage.DB_PATH}?mode=ro", uri=True)
+    try:
+        assert cache.lookup(reader, "LLM quantization", profile) == search_id
+        assert cache.lookup(reader, "llm quantization", profile) == search_id
+    finally:
+        reader.close()
+    assert last_used(search_id) == stamped and cache.stats()["hits"] == 2
+    with storage.transaction() as conn:
+        cache.touch(conn)
+        cache.touch(conn)  # nothing left to write
+    assert last_used(search_id) > stamped
+
+
+def test_pending_hits_are_stamped_before_eviction():
+    migrations.ensure_schema()
+    profile = result_cache.profile("python", "blend")
+    cache = result_cache.ResultCache(max_entries=2)
+    with storage.transaction() as conn:
+        cache.clear(conn)
+        ids = storage.save_searches(conn, [(q, None, "2026-01-01", None, []) for q in ("old", "new", "newest")])
+        cache.remember(conn, "old", None, ids[0], profile)
+        cache.remember(conn, "new", None, ids[1], profile)
+    with storage.connection() as conn:
+        assert cache.lookup(conn, "old", profile) == ids[0]
+    with storage.transaction() as conn:
+        cache.remember(conn, "newest", None, ids[2], profile)
+    with storage.connection() as conn:
+        assert [cache.lookup(conn, q, profile) for q in ("old", "new", "newest")] == [ids[0], None, ids[2]]
@@ -0,0 +1,106 @@
+import math
+import random
+
+import pytest
+
+import engine
+import scoring
+
+VOCAB = ("graph neural network attention transformer sparse survey quantization aware training diffusion "
+         "protein folding retrieval language model benchmark graphite networking").split()
+
+
+def candidates(n, query, seed=0):
+    """n reproducible papers, about half on the query, with the edge cases of real results.
+
+    Edge cases: empty titles and years, no citation count, non-ASCII
+    punctuation, and words that only contain a query word ("graphite").
+    """
+    rng = random.Random(seed)
+    words = [w for w in query.lower().split() if w.isalpha()] or ["research"]
+    papers = []
+    for i in range(n):
+        topical = i % 2 == 0
+        title = rng.sample(VOCAB, 4) + (rng.sample(words, min(len(words), 2)) if topical else [])
+        rng.shuffle(title)
+        abstract = (" ".join(words) + " " if topical else "") + " ".join(rng.choice(VOCAB) for _ in range(30))
+        papers.append({
+            "title": (" ".join(title).title() if i % 50 else "") + (" — Graph—Neural “Networks” für Ärzte" if i % 13 == 0 else ""),
+            "snippet": abstract + (" paragraphs of graphite" if i % 7 == 0 else ""),
+            "year": str(rng.randint(2015, 2026)) if i % 11 else "",
+            "cited_by": None if i % 3 == 0 else rng.randint(0, 5000),
+        })
+    return papers
+
+
+def blend(content, paper, has_year, max_cite):
+    if not has_year and paper.get("cited_by") is not None and content > 0:
+        return 0.85 * content + 0.15 * math.log1p(paper["cited_by"]) / math.log1p(max_cite)
+    return content
+
+
+def reference_scores(papers, search_query, has_year, requested_year):
+    """The node's loop, per paper (substring matching, engine.smart_score)."""
+    words = engine.query_words(search_query)
+    max_cite = max([p.get("cited_by") or 0 for p in papers] + [1])
+    out = []
+    for p in papers:
+        content = engine.smart_score(words, p, requested_year)
+        out.append((content, blend(content, p, has_year, max_cite)))
+    return out
+
+
+def token_reference(papers, search_query, has_year, requested_year):
+    """Same formula with whole-token matching, one paper at a time."""
+    words = scoring.scoring_words(search_query, "token")
+    max_cite = max([p.get("cited_by") or 0 for p in papers] + [1])
+    phrase = f" {' '.join(words)} "
+    out = []
+    for p in papers:
+        title = scoring.normalize_text(p.get("title"))
+        abstract = scoring.normalize_text(p.get("snippet") or p.get("abstract"))
+        t = sum(1 for w in words if f" {w} " in title)
+        a = sum(1 for w in words if f" {w} " in abstract)
+        content = 0.0
+        if words and (t + a) / (len(words) * 2) >= 0.5:
+            content = (t * 3 + a + (0.5 if phrase in title else 0) + (0.2 if phrase in abstract else 0)) / (len(words) * 4)
+            if requested_year and p.get("year") and requested_year in str(p["year"]):
+                content *= 1.5
+        out.append((content, blend(content, p, has_year, max_cite)))
+    return out
+
+
+def batch(papers, query, has_year, year, match):
+    content = scoring.content_scores(papers, scoring.scoring_words(query, match), year, match)
+    return content, scoring.final_scores(papers, content, has_year)
+
+CASES = [
+    ("graph neural networks", False, None),
+    ("graph neural networks 2024", True, "2024"),
+    ("sparse attention transformer survey", False, None),
+    ("quantization-aware training", False, None),
+    ("an of to", False, None),  # no scoring words at all
+]
+
+
+@pytest.mark.parametrize("match, reference", [("substring", reference_scores), ("token", token_reference)])
+@pytest.mark.parametrize("query, has_year, year", CASES)
+def test_batch_scores_match_the_scalar_loop(query, has_year, year, match, reference):
+    # Substring mode is the node's smartScore; token mode a whole-token reference
+    papers = candidates(2000, query, seed=len(query))
+    content, final = batch(papers, query, has_year, year, match)
+    expected = reference(papers, query, has_year, year)
+    mismatches = [
+        i for i, ((ec, ef), c, f) in enumerate(zip(expected, content, final))
+        if not (math.isclose(ec, c, abs_tol=1e-12) and math.isclose(ef, f, abs_tol=1e-12))
+    ]
+    assert not mismatches
+
+
+def test_score_papers_applies_the_year_filter():
+    papers = candidates(500, "graph neural", seed=1)
+    scored = engine.score_papers(papers, "graph neural 2020", True, "2020", match="substring")
+    kept = [p for p in papers if p["year"] == "2020"]
+    expected = reference_scores(kept, "graph neural 2020", True, "2020")
+    assert len(scored) == len(kept)
+    assert all(math.isclose(p["final_score"], f, abs_tol=1e-12) for p, (_, f) in zip(scored, expected))
@@ -0,0 +1,99 @@
+import random
+
+import pytest
+
+import sources
+
+FEED = """<?xml version="1.0" encoding="UTF-8"?>
+<feed xmlns="http://www.w3.org/2005/Atom" xmlns:arxiv="http://arxiv.org/schemas/atom">
+  <title type="html">ArXiv Query: search_query=all:graph attention</title>
+  <entry>
+    <id>http://arxiv.org/abs/1710.10903v3</id>
+    <published>2017-10-30T17:59:59Z</published>
+    <title>Graph Attention
+      Networks</title>
+    <summary>  We present graph attention networks (GATs), novel neural network
+      architectures that operate on graph-structured data.</summary>
+    <author><name>Petar Veličković</name></author>
+    <author><name>Guillem Cucurull</name></author>
+    <arxiv:doi>10.17863/CAM.48429</arxiv:doi>
+    <link href="http://arxiv.org/abs/1710.10903v3" rel="alternate" type="text/html"/>
+    <arxiv:primary_category term="stat.ML"/>
+    <category term="stat.ML"/>
+    <category term="cs.LG"/>
+  </entry>
+  <entry>
+    <id>http://arxiv.org/abs/2105.14491v1</id>
+    <published>2021-05-30T08:00:00Z</published>
+    <title>How Attentive are Graph Attention Networks? — „GATv2“</title>
+    <summary>Dynamic attention für Graphen.</summary>
+    <author><name>Shaked Brody</name></author>
+    <link title="doi" href="http://dx.doi.org/10.48550/arXiv.2105.14491" rel="related"/>
+    <category term="cs.LG"/>
+  </entry>
+  <entry>
+    <id>http://arxiv.org/abs/hep-th/9901001v1</id>
+    <title></title>
+  </entry>
+</feed>
+""".encode("utf-8")
+
+
+def parse_in_chunks(data, cuts):
+    parser = sources.ArxivFeedParser()
+    papers, start = [], 0
+    for cut in sorted(cuts) + [len(data)]:
+        papers.extend(parser.feed(data[start:cut]))
+        start = cut
+    return papers + parser.close()
+
+
+def test_one_shot_parse():
+    papers = sources.parse_arxiv(FEED)
+    assert [p["arxiv_id"] for p in papers] == ["1710.10903", "2105.14491", "hep-th/9901001"]
+    gat = papers[0]
+    assert gat["title"] == "Graph Attention Networks" and gat["year"] == "2017" and gat["date"] == "2017-10-30"
+    assert gat["authors_venue_year"] == "Petar Veličković, Guillem Cucurull"
+    assert gat["snippet"].startswith("We present graph attention networks (GATs), novel")
+    assert gat["doi"] == "10.17863/CAM.48429" and gat["primary_category"] == "stat.ML"
+    assert gat["categories"] == ["stat.ML", "cs.LG"]
+    assert papers[1]["doi"] == "10.48550/arXiv.2105.14491" and papers[1]["primary_category"] == "cs.LG"
+    assert papers[2]["title"] == "No title" and papers[2]["year"] == "" and "doi" not in papers[2]
+    assert sources.parse_arxiv(FEED.decode("utf-8")) == papers
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_chunked_feeding_equals_one_shot(seed):
+    # Cuts at arbitrary bytes, inside tags and multi-byte characters alike
+    rng = random.Random(seed)
+    cuts = rng.sample(range(1, len(FEED)), rng.randint(1, 60))
+    assert parse_in_chunks(FEED, cuts) == sources.parse_arxiv(FEED)
+
+
+def test_byte_by_byte_feeding_equals_one_shot():
+    assert parse_in_chunks(FEED, list(range(1, len(FEED)))) == sources.parse_arxiv(FEED)
+
+
+def test_entries_are_returned_as_soon_as_they_end():
+    parser = sources.ArxivFeedParser()
+    end = FEED.index(b"</entry>") + len(b"</entry>")
+    assert [p["arxiv_id"] for p in parser.feed(FEED[:end])] == ["1710.10903"]
+    assert len(parser.feed(FEED[end:]) + parser.close()) == 2
+
+
+@pytest.mark.parametrize("data", [
+    b"<feed><entry></feed>",  # mismatched tag
+    b"<feed xmlns='http://www.w3.org/2005/Atom'><entry>",  # truncated
+    b"not xml at all",
+    b"",
+])
+def test_malformed_feed_raises_value_error(data):
+    with pytest.raises(ValueError, match="malformed arXiv feed"):
+        sources.parse_arxiv(data)
+
+
+def test_malformed_feed_raises_value_error_while_streaming():
+    parser = sources.ArxivFeedParser()
+    parser.feed(FEED[:200])
+    with pytest.raises(ValueError, match="malformed arXiv feed"):
+        parser.feed(b"</summary></feed>")
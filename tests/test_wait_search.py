@@ -0,0 +1,31 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi.testclient import TestClient
+
+import memory_api
+
+WAITERS = 60  # more than the threadpool's 40 workers
+
+
+def test_waiters_do_not_hold_worker_threads():
+    with TestClient(memory_api.app) as client, ThreadPoolExecutor(WAITERS + 1) as pool:
+        polls = [pool.submit(client.get, f"/wait_search/req_wait_{i}", params={"timeout": 20}) for i in range(WAITERS)]
+        time.sleep(0.5)  # every long-poll is parked
+        started = time.perf_counter()
+        for i in range(WAITERS):
+            logged = client.post("/log_search", json={
+                "query": f"wait {i}", "search_query": f"wait {i}", "top_results": [], "request_id": f"req_wait_{i}",
+            })
+            assert logged.status_code == 200
+        answers = [p.result(timeout=10) for p in polls]
+        assert time.perf_counter() - started < 10
+    assert [a.status_code for a in answers] == [200] * WAITERS
+    assert [a.json()["query"] for a in answers] == [f"wait {i}" for i in range(WAITERS)]
+
+
+def test_wait_times_out_and_finds_earlier_searches():
+    with TestClient(memory_api.app) as client:
+        assert client.get("/wait_search/req_never", params={"timeout": 0.1}).status_code == 408
+        client.post("/log_search", json={"query": "early", "search_query": "early", "request_id": "req_early"})
+        assert client.get("/wait_search/req_early", params={"timeout": 0}).json()["query"] == "early"